@@ -0,0 +1,77 @@
+import os
+import sqlalchemy
+from discord.ext import commands
+
+from core.commands import Bot
+from core.templates import Help
+from core.storage import configure_storage
+from core.outbound import configure_outbound
+from core.purge import configure_purge
+from core.sqlstats import instrument_engine
+from core.prefixes import get_cached_prefix
+
+__version__ = "0.3.1"
+
+# Основные константы
+DEV_MODE = os.environ.get("DEV_MODE") == "True"
+DEFAULT_PREFIX = "." if not DEV_MODE else ">"
+SAVE_LOGS = os.environ.get("SAVE_LOGS") == "True"
+LOG_JSON = os.environ.get("LOG_JSON") == "True"  # сохранять логи в формате JSON
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))  # размер файла логов до начала нового
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))  # количество хранимых старых файлов логов
+PRINT_LOG_TIME = os.environ.get("PRINT_LOG_TIME") == "True"
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))  # порт HTTP-сервера с метриками Prometheus (0 - выключен)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")  # адрес HTTP-сервера с метриками
+XP_FLUSH_INTERVAL = float(os.environ.get("XP_FLUSH_INTERVAL", 5))  # как часто записывать опыт в базу данных (сек.)
+XP_FLUSH_BATCH_SIZE = int(os.environ.get("XP_FLUSH_BATCH_SIZE", 500))  # максимум строк в одном запросе записи опыта
+XP_CACHE_SIZE = int(os.environ.get("XP_CACHE_SIZE", 100000))  # максимум участников, чей опыт хранится в памяти
+XP_COOLDOWN = 60  # задержка между получениями опыта участником (сек.)
+XP_COOLDOWN_MAX_SIZE = int(os.environ.get("XP_COOLDOWN_MAX_SIZE", 100000))  # максимум участников с задержкой в памяти
+LEVELUP_BATCH_WINDOW = float(os.environ.get("LEVELUP_BATCH_WINDOW", 3))  # время сбора оповещений в канал (сек.)
+LEVELUP_BATCH_SIZE = int(os.environ.get("LEVELUP_BATCH_SIZE", 10))  # максимум оповещений в одном сообщении
+LEVELUP_DM_CONCURRENCY = int(os.environ.get("LEVELUP_DM_CONCURRENCY", 5))  # максимум одновременных оповещений в ЛС
+RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", 500))  # участников за раз при выдаче ролей за уровни
+ROOM_POOL_SIZE = int(os.environ.get("ROOM_POOL_SIZE", 0))  # заранее созданные приватные комнаты на сервер (0 - нет)
+ROOM_EVENTS_CONCURRENCY = int(os.environ.get("ROOM_EVENTS_CONCURRENCY", 10))  # событий комнат одновременно
+ROOM_EVENTS_QUEUE_LIMIT = int(os.environ.get("ROOM_EVENTS_QUEUE_LIMIT", 100))  # максимум событий комнат сервера
+CLEANUP_INTERVAL = float(os.environ.get("CLEANUP_INTERVAL", 3600))  # как часто удалять ссылки на удалённое (сек.)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))  # количество соединений и потоков для запросов к базе данных
+DB_QUEUE_SIZE = int(os.environ.get("DB_QUEUE_SIZE", 100))  # максимум запросов к базе данных в очереди пула
+DB_HOLD_WARNING = float(os.environ.get("DB_HOLD_WARNING", 1))  # сессия, открытая дольше, пишется в лог (сек., dev)
+OUTBOUND_CONCURRENCY = int(os.environ.get("OUTBOUND_CONCURRENCY", 10))  # максимум одновременных запросов к Discord API
+OUTBOUND_ROUTE_LIMIT = int(os.environ.get("OUTBOUND_ROUTE_LIMIT", 20))  # очередь маршрута для отброса оповещений
+PURGE_BATCH_SIZE = int(os.environ.get("PURGE_BATCH_SIZE", 1000))  # максимум строк в одном запросе удаления данных
+PURGE_GRACE_PERIOD = float(os.environ.get("PURGE_GRACE_PERIOD", 259200))  # задержка удаления данных сервера (сек.)
+
+# База данных
+ENGINE_DB = sqlalchemy.create_engine(os.environ.get("DATABASE_URL"), pool_size=DB_POOL_SIZE)
+instrument_engine(ENGINE_DB)
+configure_storage(ENGINE_DB, DB_POOL_SIZE, DB_QUEUE_SIZE, DB_HOLD_WARNING if DEV_MODE else None)
+
+# Запросы к Discord API
+configure_outbound(OUTBOUND_CONCURRENCY, OUTBOUND_ROUTE_LIMIT)
+
+# Фоновое удаление данных серверов
+configure_purge(PURGE_BATCH_SIZE)
+
+
+def get_prefix(bot, message):
+    """
+    Возвращение префикса сервера из кэша или стандартного, а также префикс в виде упоминания бота
+
+    :param bot: класс бота
+    :param message: сообщение
+    :return: конечный префикс
+    """
+
+    prefix = DEFAULT_PREFIX
+
+    if message.guild:
+        prefix = get_cached_prefix(message.guild.id, DEFAULT_PREFIX)
+
+    return commands.when_mentioned_or(prefix)(bot, message)
+
+
+# Настройка бота
+client = Bot(command_prefix=get_prefix)
+client.help_command = Help()
@@ -1,5 +1,16 @@
+import functools
+import logging
+import time
 from discord.ext import commands
 
+from core.metrics import metrics
+from core.outbound import Priority, request
+from core.sqlstats import current_handler
+
+logger = logging.getLogger("ice_cube")
+
+SLOW_COMMAND = 1.0  # команда, выполнявшаяся дольше, пишется в лог с уровнем INFO (сек.)
+
 
 class Command(commands.Command):
     @property
@@ -34,3 +45,99 @@ class Group(commands.Group):
 class Cog(commands.Cog):
     def __init__(self, bot):
         self.client = bot
+
+    @classmethod
+    def listener(cls, name=None):
+        """
+        Слушатель событий, во время выполнения которого запросы к базе данных относятся к нему, а время выполнения
+        учитывается в метриках
+        """
+
+        decorator = super().listener(name)
+
+        def wrapper(func):
+            @functools.wraps(func)
+            async def listener(*args, **kwargs):
+                token = current_handler.set(f"listener {func.__qualname__}")
+                start = time.perf_counter()
+
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    metrics.observe_listener(func.__qualname__, time.perf_counter() - start)
+                    current_handler.reset(token)
+
+            return decorator(listener)
+
+        return wrapper
+
+
+class Context(commands.Context):
+    async def send(self, *args, **kwargs):
+        """
+        Отправка ответа на команду через планировщик запросов с наивысшим приоритетом
+        """
+
+        return await request(
+            ("channel", self.channel.id), Priority.reply, lambda: super(Context, self).send(*args, **kwargs)
+        )
+
+
+class Bot(commands.Bot):
+    async def get_context(self, message, *, cls=Context):
+        return await super().get_context(message, cls=cls)
+
+    async def invoke(self, ctx):
+        """
+        Выполнение команды. Запросы к базе данных во время её проверок и выполнения относятся к ней, а время
+        выполнения учитывается в метриках. Медленные команды и команды, завершившиеся ошибкой, пишутся в лог
+
+        :param ctx: контекст команды
+        """
+
+        name = ctx.command.qualified_name if ctx.command else ""
+        token = current_handler.set(f"command {name}")
+        start = time.perf_counter()
+        failed = True
+
+        try:
+            await super().invoke(ctx)
+            failed = ctx.command_failed
+        finally:
+            duration = time.perf_counter() - start
+
+            metrics.observe_command(name, duration, failed=failed)
+            current_handler.reset(token)
+
+            # успешные команды пишутся только в режиме отладки, чтобы не переполнять файлы логов
+            level = logging.INFO if failed or duration >= SLOW_COMMAND else logging.DEBUG
+            status = "завершилась ошибкой" if failed else "выполнена"
+
+            logger.log(level, f"Команда {name} {status} за {duration * 1000:.1f} мс", extra={
+                "guild_id": ctx.guild.id if ctx.guild else None,
+                "command": name,
+                "duration": round(duration, 6)
+            })
+
+    def dispatch(self, event_name, *args, **kwargs):
+        metrics.count_event(event_name)
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def process_commands(self, message):
+        """
+        Обработка сообщения. Контекст сообщения собирается один раз: если сообщение является командой, она
+        выполняется, иначе вызывается событие non_command_message с уже собранным контекстом, чтобы слушатели не
+        разбирали сообщение повторно
+
+        :param message: сообщение
+        """
+
+        if message.author.bot:
+            return
+
+        ctx = await self.get_context(message)
+
+        if ctx.valid:
+            await self.invoke(ctx)
+        else:
+            self.dispatch("non_command_message", ctx)
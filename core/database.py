@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, String, Integer, Boolean, Enum
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, DateTime, Enum, Index
 
 from core.templates import PermissionsForRoom
 
@@ -9,34 +9,34 @@ Base = declarative_base()
 class User(Base):
     __tablename__ = "users"
 
-    user_id = Column(String(32), primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
     bio = Column(String(512))
 
 
 class Server(Base):
     __tablename__ = "servers"
 
-    server_id = Column(String(32), primary_key=True)
+    server_id = Column(BigInteger, primary_key=True)
     prefix = Column(String(32), nullable=True)
 
 
 class ServerSettingsOfRooms(Base):
     __tablename__ = "servers_settings_of_rooms"
 
-    server_id = Column(String(32), primary_key=True)
-    channel_id_creates_rooms = Column(String(32), unique=True)
+    server_id = Column(BigInteger, primary_key=True)
+    channel_id_creates_rooms = Column(BigInteger, unique=True)
 
     @property
     def creator(self) -> int:
         """ID of voice channel that creates rooms"""
-        return int(self.channel_id_creates_rooms)
+        return self.channel_id_creates_rooms
 
 
 class UserSettingsOfRoom(Base):
     __tablename__ = "users_settings_of_room"
 
-    server_id = Column(String(32), primary_key=True)
-    owner_id = Column(String(32), primary_key=True)
+    server_id = Column(BigInteger, primary_key=True)
+    owner_id = Column(BigInteger, primary_key=True)
     name = Column(String(32), nullable=True, default=None)
     user_limit = Column(Integer, default=0, nullable=False)
     bitrate = Column(Integer, default=64, nullable=False)
@@ -56,59 +56,87 @@ class UserSettingsOfRoom(Base):
 class UserPermissionsOfRoom(Base):
     __tablename__ = "users_permissions_of_room"
 
-    server_id = Column(String(32), primary_key=True)
-    owner_id = Column(String(32), primary_key=True)
-    user_id = Column(String(32), primary_key=True)
+    server_id = Column(BigInteger, primary_key=True)
+    owner_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
     permissions = Column(Enum(PermissionsForRoom), nullable=False)
 
     @property
     def user(self):
-        return int(self.user_id)
+        return self.user_id
 
 
 class UserScoreToAnotherUser(Base):
     __tablename__ = "users_score_to_another_users"
 
-    user_id = Column(String(32), primary_key=True)
-    rated_user_id = Column(String(32), primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    rated_user_id = Column(BigInteger, primary_key=True)
     score = Column(Boolean, nullable=False)
 
+    __table_args__ = (
+        Index("ix_users_score_to_another_users_rated_user_id_score", "rated_user_id", "score"),
+    )
+
 
 class UserLevel(Base):
     __tablename__ = "users_level"
 
-    server_id = Column(String(32), primary_key=True)
-    user_id = Column(String(32), primary_key=True)
+    server_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
     experience = Column(Integer, default=0, nullable=False)
 
+    __table_args__ = (
+        Index("ix_users_level_server_id_experience", server_id, experience.desc()),
+    )
+
 
 class ServerSettingsOfLevels(Base):
     __tablename__ = "servers_setting_of_levels"
 
-    server_id = Column(String(32), primary_key=True)
+    server_id = Column(BigInteger, primary_key=True)
     notify_of_levelup = Column(Boolean, default=True, nullable=False)
     levelup_message_dm = Column(Boolean, default=False, nullable=False)
-    levelup_message_channel_id = Column(String(32), server_default=None)
+    levelup_message_channel_id = Column(BigInteger, server_default=None)
     levelup_message = Column(String(256), default=None)
 
 
 class ServerAwardOfLevels(Base):
     __tablename__ = "servers_awards_of_levels"
 
-    server_id = Column(String(32), primary_key=True)
-    role_id = Column(String(32), primary_key=True)
+    server_id = Column(BigInteger, primary_key=True)
+    role_id = Column(BigInteger, primary_key=True)
     level = Column(Integer)
 
+    __table_args__ = (
+        Index("ix_servers_awards_of_levels_server_id_level", "server_id", "level"),
+    )
+
 
 class ServerIgnoreChannelsListOfLevels(Base):
     __tablename__ = "servers_ignore_channels_lists_of_levels"
 
-    server_id = Column(String(32), primary_key=True)
-    channel_id = Column(String(32), primary_key=True)
+    server_id = Column(BigInteger, primary_key=True)
+    channel_id = Column(BigInteger, primary_key=True)
 
 
 class ServerIgnoreRolesListOfLevels(Base):
     __tablename__ = "servers_ignore_roles_lists_of_levels"
 
-    server_id = Column(String(32), primary_key=True)
-    role_id = Column(String(32), primary_key=True)
+    server_id = Column(BigInteger, primary_key=True)
+    role_id = Column(BigInteger, primary_key=True)
+
+
+class ServerAwardReconciliationOfLevels(Base):
+    __tablename__ = "servers_award_reconciliations_of_levels"
+
+    server_id = Column(BigInteger, primary_key=True)
+    last_user_id = Column(BigInteger, default=0, nullable=False)
+
+
+class ServerPurge(Base):
+    __tablename__ = "servers_purges"
+
+    server_id = Column(BigInteger, primary_key=True)
+    scope = Column(String(16), primary_key=True)  # "levels", "rooms" или "server"
+    not_before = Column(DateTime, nullable=False)  # время, раньше которого удаление не начинается (UTC)
+    deleted = Column(BigInteger, default=0, nullable=False)  # количество уже удалённых строк
@@ -0,0 +1,85 @@
+import copy
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+
+# дополнительные поля записи лога, которые передаются через extra
+STRUCTURED_FIELDS = ("guild_id", "command", "duration")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Запись лога в виде одной строки JSON: время, уровень, логгер, сообщение и дополнительные поля (ID сервера,
+    команда, время выполнения), если они переданы через extra
+    """
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+
+            if value is not None:
+                data[field] = value
+
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _QueueHandler(QueueHandler):
+    """Передача записи в очередь. Текст ошибки сохраняется отдельно от сообщения, чтобы JSON-формат мог его выделить"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+def setup_file_logging(loggers, filename, formatter, max_bytes, backup_count):
+    """
+    Запись логов в файл в отдельном потоке. Логгеры только кладут записи в очередь, поэтому цикл событий не ждёт
+    записи на диск. Файл разбивается на части при достижении размера
+
+    :param loggers: логгеры, записи которых сохраняются в файл
+    :param filename: путь к файлу
+    :type filename: str
+    :param formatter: формат записей
+    :type formatter: logging.Formatter
+    :param max_bytes: размер файла, после которого начинается новый файл (0 - без ограничения)
+    :type max_bytes: int
+    :param backup_count: количество хранимых старых файлов
+    :type backup_count: int
+    :return: запущенный поток записи, который нужно остановить при завершении работы
+    :rtype: QueueListener
+    """
+
+    file_handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(formatter)
+
+    queue = SimpleQueue()
+    listener = QueueListener(queue, file_handler, respect_handler_level=True)
+
+    queue_handler = _QueueHandler(queue)
+
+    for logger in loggers:
+        logger.addHandler(queue_handler)
+
+    listener.start()
+
+    return listener
@@ -0,0 +1,174 @@
+from bisect import bisect_left
+
+# границы корзин гистограмм времени выполнения (сек.)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """
+    Гистограмма значений с фиксированными границами корзин. Значения добавляются без блокировок: в цикле событий
+    это безопасно, а при добавлении из нескольких потоков редкие гонки допустимы для статистики
+
+    :param buckets: возрастающие верхние границы корзин. Значения больше последней границы попадают в корзину +Inf
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Добавление значения
+
+        :param value: значение
+        :type value: float
+        """
+
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Накопленное количество значений по корзинам
+
+        :return: список пар (верхняя граница, количество значений не больше неё), последняя граница - +Inf
+        :rtype: list
+        """
+
+        result = []
+        total = 0
+
+        for bound, count in zip(self.buckets + (float("inf"),), list(self.counts)):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+
+class Metrics:
+    """
+    Счётчики работы бота: события Discord, команды, слушатели событий, задержка цикла событий и обращения к кэшам
+    """
+
+    def __init__(self):
+        self.events = {}  # название события -> количество
+        self.commands = {}  # полное название команды -> Histogram времени выполнения
+        self.command_errors = {}  # полное название команды -> количество ошибок
+        self.listeners = {}  # слушатель событий -> Histogram времени выполнения
+        self.caches = {}  # название кэша -> [попадания, промахи]
+        self.loop_lag = Histogram()  # задержка цикла событий (сек.)
+        self.operations = {}  # название операции -> Histogram времени выполнения
+        self.counters = {}  # название счётчика -> значение
+        self.gauges = {}  # название показателя -> функция, возвращающая его текущее значение
+
+    def count_event(self, name):
+        """
+        Учёт события Discord
+
+        :param name: название события
+        :type name: str
+        """
+
+        self.events[name] = self.events.get(name, 0) + 1
+
+    def observe_command(self, name, duration, failed=False):
+        """
+        Учёт выполнения команды
+
+        :param name: полное название команды
+        :type name: str
+        :param duration: время выполнения (сек.)
+        :type duration: float
+        :param failed: завершилась ли команда ошибкой
+        :type failed: bool
+        """
+
+        histogram = self.commands.get(name)
+
+        if histogram is None:
+            histogram = self.commands[name] = Histogram()
+
+        histogram.observe(duration)
+
+        if failed:
+            self.command_errors[name] = self.command_errors.get(name, 0) + 1
+
+    def observe_listener(self, name, duration):
+        """
+        Учёт выполнения слушателя событий
+
+        :param name: слушатель событий
+        :type name: str
+        :param duration: время выполнения (сек.)
+        :type duration: float
+        """
+
+        histogram = self.listeners.get(name)
+
+        if histogram is None:
+            histogram = self.listeners[name] = Histogram()
+
+        histogram.observe(duration)
+
+    def observe_operation(self, name, duration):
+        """
+        Учёт времени выполнения операции, которая не является командой или слушателем
+
+        :param name: название операции
+        :type name: str
+        :param duration: время выполнения (сек.)
+        :type duration: float
+        """
+
+        histogram = self.operations.get(name)
+
+        if histogram is None:
+            histogram = self.operations[name] = Histogram()
+
+        histogram.observe(duration)
+
+    def increment(self, name, amount=1):
+        """
+        Увеличение счётчика
+
+        :param name: название счётчика
+        :type name: str
+        :param amount: на сколько увеличить
+        :type amount: int
+        """
+
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def register_gauge(self, name, function):
+        """
+        Добавление показателя, значение которого вычисляется при сборе метрик
+
+        :param name: название показателя
+        :type name: str
+        :param function: функция без аргументов, возвращающая значение
+        """
+
+        self.gauges[name] = function
+
+    def count_cache(self, name, hit):
+        """
+        Учёт обращения к кэшу
+
+        :param name: название кэша
+        :type name: str
+        :param hit: были ли данные в кэше
+        :type hit: bool
+        """
+
+        counts = self.caches.get(name)
+
+        if counts is None:
+            counts = self.caches[name] = [0, 0]
+
+        counts[0 if hit else 1] += 1
+
+
+metrics = Metrics()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from aiohttp import web
+
+from core.metrics import metrics
+from core.outbound import get_outbound
+from core.sqlstats import statement_stats
+from core.storage import get_storage
+
+logger = logging.getLogger("ice_cube")
+
+LAG_INTERVAL = 0.5  # как часто измеряется задержка цикла событий (сек.)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _bound(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class _Exposition:
+    """Сборка метрик в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, description, samples):
+        """
+        Добавление метрики с её образцами
+
+        :param name: название метрики
+        :param kind: тип: counter, gauge или histogram
+        :param description: описание
+        :param samples: для counter и gauge - список пар (метки, значение), для histogram - (метки, Histogram)
+        """
+
+        self.lines.append(f"# HELP {name} {description}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+        for labels, value in samples:
+            if kind == "histogram":
+                for bound, count in value.cumulative():
+                    self.lines.append(f"{name}_bucket{_labels(dict(labels, le=_bound(bound)))} {count}")
+
+                self.lines.append(f"{name}_sum{_labels(labels)} {value.sum}")
+                self.lines.append(f"{name}_count{_labels(labels)} {value.count}")
+            else:
+                self.lines.append(f"{name}{_labels(labels)} {value}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics():
+    """
+    Текущие метрики бота в текстовом формате Prometheus
+
+    :rtype: str
+    """
+
+    output = _Exposition()
+
+    output.metric(
+        "ice_cube_gateway_events_total", "counter", "Количество событий Discord по типам",
+        [({"event": name}, count) for name, count in list(metrics.events.items())]
+    )
+    output.metric(
+        "ice_cube_command_duration_seconds", "histogram", "Время выполнения команд",
+        [({"command": name}, histogram) for name, histogram in list(metrics.commands.items())]
+    )
+    output.metric(
+        "ice_cube_command_errors_total", "counter", "Количество команд, завершившихся ошибкой",
+        [({"command": name}, count) for name, count in list(metrics.command_errors.items())]
+    )
+    output.metric(
+        "ice_cube_listener_duration_seconds", "histogram", "Время выполнения слушателей событий",
+        [({"listener": name}, histogram) for name, histogram in list(metrics.listeners.items())]
+    )
+    output.metric(
+        "ice_cube_operation_duration_seconds", "histogram", "Время выполнения отдельных операций",
+        [({"operation": name}, histogram) for name, histogram in list(metrics.operations.items())]
+    )
+    output.metric(
+        "ice_cube_event_loop_lag_seconds", "histogram", "Задержка цикла событий",
+        [({}, metrics.loop_lag)]
+    )
+    output.metric(
+        "ice_cube_cache_requests_total", "counter", "Обращения к кэшам",
+        [({"cache": name, "result": result}, count) for name, counts in list(metrics.caches.items())
+         for result, count in zip(("hit", "miss"), counts)]
+    )
+    output.metric(
+        "ice_cube_db_statement_duration_seconds", "histogram", "Время выполнения SQL-запросов по командам и слушателям",
+        [({"handler": name}, histogram) for name, histogram in list(statement_stats.handlers.items())]
+    )
+
+    output.metric(
+        "ice_cube_counter_total", "counter", "Счётчики отдельных операций",
+        [({"counter": name}, value) for name, value in list(metrics.counters.items())]
+    )
+    output.metric(
+        "ice_cube_gauge", "gauge", "Текущие значения отдельных показателей",
+        [({"gauge": name}, function()) for name, function in list(metrics.gauges.items())]
+    )
+
+    storage = get_storage().stats()
+
+    for key, kind, description in (
+        ("pool_size", "gauge", "Количество потоков для запросов к базе данных"),
+        ("waiting", "gauge", "Запросы к базе данных, ожидающие места в очереди пула"),
+        ("queued", "gauge", "Запросы к базе данных в пуле потоков"),
+        ("checked_out", "gauge", "Соединения с базой данных, выданные из пула"),
+        ("checkouts", "counter", "Выдачи соединений с базой данных из пула"),
+        ("checkins", "counter", "Возвраты соединений с базой данных в пул"),
+        ("completed", "counter", "Выполненные запросы к базе данных"),
+        ("failed", "counter", "Запросы к базе данных, завершившиеся ошибкой")
+    ):
+        name = f"ice_cube_db_{key}_total" if kind == "counter" else f"ice_cube_db_{key}"
+        output.metric(name, kind, description, [({}, storage[key])])
+
+    outbound = get_outbound().stats()
+
+    output.metric(
+        "ice_cube_outbound_queued", "gauge", "Запросы к Discord API в очередях маршрутов по приоритетам",
+        [({"priority": priority}, count) for priority, count in outbound["queued"].items()]
+    )
+    output.metric(
+        "ice_cube_outbound_in_flight", "gauge", "Выполняющиеся запросы к Discord API",
+        [({}, outbound["in_flight"])]
+    )
+    output.metric(
+        "ice_cube_outbound_requests_total", "counter", "Запросы к Discord API по результату",
+        [({"result": result}, outbound[result]) for result in ("completed", "failed", "dropped", "coalesced")]
+    )
+
+    return output.render()
+
+
+async def _measure_loop_lag():
+    loop = asyncio.get_event_loop()
+
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        metrics.loop_lag.observe(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+async def _handle_metrics(request):
+    # версия 0.0.4 текстового формата Prometheus
+    return web.Response(text=render_metrics(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def start_metrics_server(host, port):
+    """
+    Запуск HTTP-сервера с метриками бота по адресу /metrics и измерения задержки цикла событий
+
+    :param host: адрес сервера
+    :type host: str
+    :param port: порт сервера
+    :type port: int
+    """
+
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    asyncio.ensure_future(_measure_loop_lag())
+
+    logger.info(f"Метрики доступны по адресу http://{host}:{port}/metrics")
@@ -0,0 +1,243 @@
+import asyncio
+import itertools
+import logging
+from enum import IntEnum
+from heapq import heappush, heappop
+
+logger = logging.getLogger("ice_cube")
+
+
+class RequestDropped(Exception):
+    """Запрос с низким приоритетом был отброшен из-за переполненной очереди маршрута"""
+
+
+class Priority(IntEnum):
+    """Приоритет запроса к Discord API. Чем меньше значение, тем раньше выполняется запрос"""
+
+    reply = 0  # ответы на команды
+    room = 1  # создание, перемещение и удаление приватных комнат
+    notification = 2  # оповещения о новом уровне
+    roles = 3  # выдача ролей за уровни
+    background = 4  # фоновая подготовка, например заранее созданные приватные комнаты
+
+
+class _Job:
+    __slots__ = ("priority", "factory", "key", "future")
+
+    def __init__(self, priority, factory, key, future):
+        self.priority = priority
+        self.factory = factory
+        self.key = key
+        self.future = future
+
+
+class OutboundScheduler:
+    """
+    Планировщик запросов к Discord API. Запросы одного маршрута (канала, сервера, пользователя) выполняются по очереди
+    в порядке приоритета, а общее количество одновременных запросов ограничено. Свободные места отдаются запросам
+    с наивысшим приоритетом
+
+    :param concurrency: максимальное количество одновременных запросов
+    :param route_limit: длина очереди маршрута, после которой запросы с низким приоритетом отбрасываются
+    """
+
+    def __init__(self, concurrency, route_limit):
+        self.concurrency = concurrency
+        self.route_limit = route_limit
+
+        self._routes = {}  # маршрут -> куча (приоритет, номер, запрос)
+        self._keys = {}  # ключ объединения -> ожидающий запрос
+        self._waiters = []  # куча (приоритет, номер, future) запросов, ожидающих свободного места
+        self._counter = itertools.count()
+        self._in_flight = 0
+
+        self.completed = 0  # выполненные запросы
+        self.failed = 0  # запросы, завершившиеся ошибкой
+        self.dropped = 0  # отброшенные запросы с низким приоритетом
+        self.coalesced = 0  # запросы, объединённые с уже ожидающими
+
+    def _submit(self, route, priority, factory, key):
+        if key is not None and key in self._keys:
+            self.coalesced += 1
+            return self._keys[key].future
+
+        queue = self._routes.get(route)
+
+        if queue is not None and priority >= Priority.notification and len(queue) >= self.route_limit:
+            self.dropped += 1
+            return None
+
+        job = _Job(priority, factory, key, asyncio.get_event_loop().create_future())
+
+        if key is not None:
+            self._keys[key] = job
+
+        if queue is None:
+            queue = self._routes[route] = []
+            heappush(queue, (priority, next(self._counter), job))
+            asyncio.ensure_future(self._work(route))
+        else:
+            heappush(queue, (priority, next(self._counter), job))
+
+        return job.future
+
+    async def _work(self, route):
+        queue = self._routes[route]
+
+        try:
+            while queue:
+                _, _, job = heappop(queue)
+
+                if job.key is not None:
+                    del self._keys[job.key]
+
+                await self._acquire(job.priority)
+
+                try:
+                    result = await job.factory()
+                except Exception as e:
+                    self.failed += 1
+                    job.future.set_exception(e)
+                else:
+                    self.completed += 1
+                    job.future.set_result(result)
+                finally:
+                    self._release()
+        finally:
+            del self._routes[route]
+
+    async def _acquire(self, priority):
+        if self._in_flight < self.concurrency and not self._waiters:
+            self._in_flight += 1
+            return
+
+        waiter = asyncio.get_event_loop().create_future()
+        heappush(self._waiters, (priority, next(self._counter), waiter))
+
+        # место передаётся от завершившегося запроса, поэтому счётчик не увеличивается
+        await waiter
+
+    def _release(self):
+        while self._waiters:
+            _, _, waiter = heappop(self._waiters)
+
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._in_flight -= 1
+
+    async def request(self, route, priority, factory, key=None):
+        """
+        Выполнение запроса с ожиданием результата
+
+        :param route: маршрут запроса, например ("channel", ID канала)
+        :param priority: приоритет запроса
+        :type priority: Priority
+        :param factory: функция без аргументов, возвращающая корутину запроса
+        :param key: ключ объединения: запрос с таким же ключом, ещё ожидающий выполнения, не дублируется
+        :return: результат запроса
+        :raises RequestDropped: если запрос с низким приоритетом был отброшен
+        """
+
+        future = self._submit(route, priority, factory, key)
+
+        if future is None:
+            raise RequestDropped(route)
+
+        return await asyncio.shield(future)
+
+    def schedule(self, route, priority, factory, key=None):
+        """
+        Постановка запроса в очередь без ожидания результата. Ошибки запроса записываются в лог
+
+        :param route: маршрут запроса, например ("channel", ID канала)
+        :param priority: приоритет запроса
+        :type priority: Priority
+        :param factory: функция без аргументов, возвращающая корутину запроса
+        :param key: ключ объединения: запрос с таким же ключом, ещё ожидающий выполнения, не дублируется
+        :return: был ли запрос принят
+        :rtype: bool
+        """
+
+        future = self._submit(route, priority, factory, key)
+
+        if future is None:
+            return False
+
+        future.add_done_callback(_log_failure)
+
+        return True
+
+    def stats(self):
+        """
+        Состояние очередей запросов
+
+        :return: словарь с глубиной очередей по приоритетам и количеством запросов
+        :rtype: dict
+        """
+
+        depth = {priority.name: 0 for priority in Priority}
+
+        for queue in self._routes.values():
+            for priority, _, _ in queue:
+                depth[Priority(priority).name] += 1
+
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "routes": len(self._routes),
+            "queued": depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced
+        }
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Не удалось выполнить запрос к Discord API", exc_info=future.exception())
+
+
+_outbound = None
+
+
+def configure_outbound(concurrency, route_limit):
+    """
+    Настройка планировщика запросов к Discord API
+
+    :param concurrency: максимальное количество одновременных запросов
+    :param route_limit: длина очереди маршрута, после которой запросы с низким приоритетом отбрасываются
+    """
+
+    global _outbound
+
+    _outbound = OutboundScheduler(concurrency, route_limit)
+
+
+def get_outbound():
+    """
+    Получение настроенного планировщика запросов к Discord API
+
+    :rtype: OutboundScheduler
+    """
+
+    return _outbound
+
+
+async def request(route, priority, factory, key=None):
+    """
+    Выполнение запроса к Discord API с ожиданием результата. Подробнее: OutboundScheduler.request
+    """
+
+    return await _outbound.request(route, priority, factory, key)
+
+
+def schedule(route, priority, factory, key=None):
+    """
+    Постановка запроса к Discord API в очередь без ожидания результата. Подробнее: OutboundScheduler.schedule
+    """
+
+    return _outbound.schedule(route, priority, factory, key)
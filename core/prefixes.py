@@ -0,0 +1,57 @@
+from core.database import Server
+
+# Кэш префиксов серверов: ID сервера -> префикс. Хранятся только сервера с собственным префиксом
+_prefixes = {}
+
+
+def load_prefixes(session):
+    """
+    Загрузка всех префиксов серверов из базы данных одним запросом
+
+    :param session: сессия базы данных
+    """
+
+    global _prefixes
+
+    servers = session.query(Server.server_id, Server.prefix).filter(Server.prefix.isnot(None)).all()
+
+    _prefixes = dict(servers)
+
+
+def get_cached_prefix(server_id, default):
+    """
+    Получение префикса сервера из кэша
+
+    :param server_id: ID сервера
+    :type server_id: int
+    :param default: префикс, если у сервера нет собственного
+    :return: префикс сервера
+    """
+
+    return _prefixes.get(server_id, default)
+
+
+def set_cached_prefix(server_id, prefix):
+    """
+    Обновление префикса сервера в кэше
+
+    :param server_id: ID сервера
+    :type server_id: int
+    :param prefix: новый префикс (None, если сервер использует стандартный префикс)
+    """
+
+    if prefix is None:
+        _prefixes.pop(server_id, None)
+    else:
+        _prefixes[server_id] = prefix
+
+
+def remove_cached_prefix(server_id):
+    """
+    Удаление префикса сервера из кэша
+
+    :param server_id: ID сервера
+    :type server_id: int
+    """
+
+    _prefixes.pop(server_id, None)
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_
+
+from core.storage import run
+from core.database import (Server, ServerSettingsOfRooms, UserSettingsOfRoom, UserPermissionsOfRoom, UserLevel,
+                           ServerSettingsOfLevels, ServerAwardOfLevels, ServerIgnoreChannelsListOfLevels,
+                           ServerIgnoreRolesListOfLevels, ServerAwardReconciliationOfLevels, ServerPurge)
+
+logger = logging.getLogger("ice_cube")
+
+# область удаления -> таблицы в порядке удаления. Настройки удаляются первыми, чтобы система сразу считалась выключенной
+LEVELS_TABLES = (ServerSettingsOfLevels, ServerAwardReconciliationOfLevels, ServerAwardOfLevels,
+                 ServerIgnoreChannelsListOfLevels, ServerIgnoreRolesListOfLevels, UserLevel)
+ROOMS_TABLES = (ServerSettingsOfRooms, UserPermissionsOfRoom, UserSettingsOfRoom)
+PURGE_SCOPES = {
+    "levels": LEVELS_TABLES,
+    "rooms": ROOMS_TABLES,
+    "server": (Server,) + LEVELS_TABLES + ROOMS_TABLES
+}
+
+
+def delete_batch(session, model, server_id, scope, limit):
+    """
+    Удаление пачки строк сервера из таблицы с сохранением прогресса в той же транзакции
+
+    :param session: сессия базы данных
+    :param model: модель таблицы
+    :param server_id: ID сервера
+    :type server_id: int
+    :param scope: область удаления
+    :type scope: str
+    :param limit: максимальное количество удаляемых строк
+    :type limit: int
+    :return: количество удалённых строк
+    :rtype: int
+    """
+
+    primary_key = list(model.__table__.primary_key.columns)
+    rows = session.query(*primary_key).filter(model.server_id == server_id).limit(limit).all()
+
+    if rows:
+        session.query(model).filter(tuple_(*primary_key).in_(rows)).delete(synchronize_session=False)
+        session.query(ServerPurge).filter_by(server_id=server_id, scope=scope).update(
+            {"deleted": ServerPurge.deleted + len(rows)}, synchronize_session=False
+        )
+
+    return len(rows)
+
+
+class Purger:
+    """
+    Фоновое удаление данных сервера из базы данных пачками ограниченного размера, чтобы не держать долгие блокировки.
+    Запланированные удаления сохраняются в базе данных и продолжаются после перезапуска бота
+
+    :param batch_size: максимальное количество строк, удаляемых за один запрос
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+        self._client = None
+        self._queue = None
+        self._worker = None
+        self._pending = {}  # (ID сервера, область) -> количество удалённых строк
+        self._timers = {}  # (ID сервера, область) -> отложенное добавление в очередь
+
+        self.deleted = 0  # удалённые строки
+        self.completed = 0  # законченные удаления
+
+    def start(self, client):
+        """
+        Запуск обработки очереди удалений
+
+        :param client: бот
+        """
+
+        self._client = client
+
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._work())
+
+    def stop(self):
+        """
+        Остановка обработки очереди. Прогресс сохранён в базе данных
+        """
+
+        for timer in self._timers.values():
+            timer.cancel()
+
+        self._timers.clear()
+
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    async def resume(self):
+        """
+        Добавление в очередь удалений, которые не были закончены
+        """
+
+        purges = await run(lambda session: session.query(ServerPurge).all())
+
+        for purge in purges:
+            key = (purge.server_id, purge.scope)
+
+            if key not in self._pending:
+                self._pending[key] = purge.deleted
+                self._schedule(key, purge.not_before)
+
+    async def purge(self, server_id, scope, delay=0):
+        """
+        Планирование удаления данных сервера
+
+        :param server_id: ID сервера
+        :type server_id: int
+        :param scope: область удаления: "levels", "rooms" или "server"
+        :type scope: str
+        :param delay: через сколько секунд начать удаление
+        :type delay: float
+        """
+
+        key = (server_id, scope)
+        not_before = datetime.utcnow() + timedelta(seconds=delay)
+
+        if key in self._pending:
+            return
+
+        await run(lambda session: session.merge(ServerPurge(
+            server_id=server_id, scope=scope, not_before=not_before, deleted=0
+        )))
+
+        self._pending[key] = 0
+        self._schedule(key, not_before)
+
+    async def cancel(self, server_id, scope):
+        """
+        Отмена удаления данных сервера, которое ещё не началось
+
+        :param server_id: ID сервера
+        :type server_id: int
+        :param scope: область удаления
+        :type scope: str
+        :return: было ли удаление отменено
+        :rtype: bool
+        """
+
+        key = (server_id, scope)
+        timer = self._timers.pop(key, None)
+
+        if timer is None:
+            return False
+
+        timer.cancel()
+        del self._pending[key]
+
+        await run(lambda session: session.query(ServerPurge).filter_by(server_id=server_id, scope=scope).delete())
+
+        return True
+
+    def progress(self, server_id, scope):
+        """
+        Прогресс удаления данных сервера
+
+        :param server_id: ID сервера
+        :type server_id: int
+        :param scope: область удаления
+        :type scope: str
+        :return: количество удалённых строк или None, если удаление не запланировано
+        :rtype: int or None
+        """
+
+        return self._pending.get((server_id, scope))
+
+    def _schedule(self, key, not_before):
+        delay = (not_before - datetime.utcnow()).total_seconds()
+
+        if delay > 0:
+            self._timers[key] = asyncio.get_event_loop().call_later(delay, self._enqueue, key)
+        else:
+            self._enqueue(key)
+
+    def _enqueue(self, key):
+        self._timers.pop(key, None)
+        self._queue.put_nowait(key)
+
+    async def _work(self):
+        while True:
+            key = await self._queue.get()
+
+            try:
+                await self._purge(*key)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # удаление продолжится после перезапуска бота
+                logger.exception(f"Не удалось удалить данные сервера {key[0]} ({key[1]})")
+
+    async def _purge(self, server_id, scope):
+        key = (server_id, scope)
+
+        # бот вернулся на сервер, пока удаление ожидало своей очереди
+        if scope == "server" and self._client.get_guild(server_id) is not None:
+            logger.info(f"Удаление данных сервера {server_id} отменено: бот снова на сервере")
+        else:
+            logger.info(f"Начато удаление данных сервера {server_id} ({scope})")
+
+            for model in PURGE_SCOPES[scope]:
+                while True:
+                    deleted = await run(delete_batch, model, server_id, scope, self.batch_size)
+
+                    self._pending[key] += deleted
+                    self.deleted += deleted
+
+                    if deleted < self.batch_size:
+                        break
+
+            logger.info(f"Закончено удаление данных сервера {server_id} ({scope}): удалено {self._pending[key]} строк")
+
+        await run(lambda session: session.query(ServerPurge).filter_by(server_id=server_id, scope=scope).delete())
+
+        del self._pending[key]
+        self.completed += 1
+
+    def stats(self):
+        """
+        Состояние удаления данных серверов
+
+        :return: словарь с количеством запланированных удалений и удалённых строк
+        :rtype: dict
+        """
+
+        return {
+            "pending": len(self._pending),
+            "delayed": len(self._timers),
+            "deleted": self.deleted,
+            "completed": self.completed
+        }
+
+
+_purger = None
+
+
+def configure_purge(batch_size):
+    """
+    Настройка фонового удаления данных серверов
+
+    :param batch_size: максимальное количество строк, удаляемых за один запрос
+    """
+
+    global _purger
+
+    _purger = Purger(batch_size)
+
+
+def get_purger():
+    """
+    Получение настроенного фонового удаления данных серверов
+
+    :rtype: Purger
+    """
+
+    return _purger
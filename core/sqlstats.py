@@ -0,0 +1,143 @@
+import heapq
+import re
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+
+from core.metrics import Histogram
+
+# команда или слушатель событий, который сейчас выполняется. Запросы вне них относятся к "other"
+current_handler = ContextVar("current_handler", default="other")
+
+SLOWEST_LIMIT = 10  # сколько самых медленных запросов хранится
+STATEMENT_LENGTH = 300  # максимальная длина сохраняемого текста запроса
+
+
+def redact_parameters(parameters):
+    """
+    Скрытие значений параметров запроса: остаются только их имена или количество
+
+    :param parameters: параметры запроса (словарь, последовательность или список наборов для executemany)
+    :return: параметры, где каждое значение заменено на "?"
+    """
+
+    if isinstance(parameters, dict):
+        return {key: "?" for key in parameters}
+    elif isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} наборов параметров>"
+
+        return ["?"] * len(parameters)
+    else:
+        return parameters
+
+
+class StatementStats:
+    """
+    Количество и время выполнения SQL-запросов по командам и слушателям событий, а также самые медленные запросы
+    """
+
+    def __init__(self):
+        self.handlers = {}  # команда или слушатель -> Histogram времени выполнения запросов
+        self._slowest = []  # куча (время, номер, запрос, скрытые параметры, команда или слушатель)
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def observe(self, handler, duration, statement, parameters):
+        """
+        Учёт выполненного запроса
+
+        :param handler: команда или слушатель событий
+        :type handler: str
+        :param duration: время выполнения (сек.)
+        :type duration: float
+        :param statement: текст запроса
+        :type statement: str
+        :param parameters: параметры запроса
+        """
+
+        histogram = self.handlers.get(handler)
+
+        if histogram is None:
+            with self._lock:
+                histogram = self.handlers.setdefault(handler, Histogram())
+
+        histogram.observe(duration)
+
+        # большинство запросов быстрее самых медленных, и для них блокировка не нужна
+        slowest = self._slowest
+
+        if len(slowest) >= SLOWEST_LIMIT and duration <= slowest[0][0]:
+            return
+
+        with self._lock:
+            if len(self._slowest) >= SLOWEST_LIMIT and duration <= self._slowest[0][0]:
+                return
+
+            self._counter += 1
+            statement = re.sub(r"\s+", " ", statement).strip()[:STATEMENT_LENGTH]
+            item = (duration, self._counter, statement, redact_parameters(parameters), handler)
+
+            if len(self._slowest) >= SLOWEST_LIMIT:
+                heapq.heapreplace(self._slowest, item)
+            else:
+                heapq.heappush(self._slowest, item)
+
+    def top_handlers(self, limit):
+        """
+        Команды и слушатели событий с наибольшим суммарным временем запросов
+
+        :param limit: количество
+        :type limit: int
+        :return: список (команда или слушатель, количество запросов, суммарное время)
+        :rtype: list
+        """
+
+        handlers = [(name, histogram.count, histogram.sum) for name, histogram in list(self.handlers.items())]
+
+        return sorted(handlers, key=lambda h: h[2], reverse=True)[:limit]
+
+    def slowest(self):
+        """
+        Самые медленные запросы
+
+        :return: список (время, запрос, скрытые параметры, команда или слушатель) по убыванию времени
+        :rtype: list
+        """
+
+        with self._lock:
+            items = sorted(self._slowest, reverse=True)
+
+        return [(duration, statement, parameters, handler) for duration, _, statement, parameters, handler in items]
+
+    def reset(self):
+        """
+        Сброс собранной статистики
+        """
+
+        with self._lock:
+            self.handlers = {}
+            self._slowest = []
+
+
+statement_stats = StatementStats()
+
+
+def instrument_engine(engine):
+    """
+    Подключение учёта SQL-запросов к движку базы данных
+
+    :param engine: движок базы данных
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # время хранится в контексте выполнения, который создаётся заново для каждого запроса
+        context.query_start_time = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context.query_start_time
+
+        statement_stats.observe(current_handler.get(), duration, statement, parameters)
@@ -0,0 +1,263 @@
+import asyncio
+import contextvars
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger("ice_cube")
+
+
+class UnitOfWork:
+    """
+    Одна сессия базы данных для нескольких запросов, между которыми выполняются другие действия бота. Изменения
+    сохраняются один раз при выходе из блока `async with`, а при ошибке отменяются. Сессия закрывается в любом случае
+
+    :param storage: доступ к базе данных
+    :type storage: Storage
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._session = None
+        self._opened_at = None
+        self._stack = None
+
+    async def __aenter__(self):
+        self._session = self._storage._sessionmaker()
+        self._opened_at = time.monotonic()
+
+        if self._storage.hold_warning is not None:
+            # место открытия сессии нужно только для отчёта о долгой сессии
+            self._stack = "".join(traceback.format_stack(limit=6)[:-1])
+
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        session = self._session
+        self._session = None
+
+        def finish():
+            try:
+                if exc_type is None:
+                    session.commit()
+                else:
+                    session.rollback()
+            finally:
+                session.close()
+
+        try:
+            await self._storage.run_in_pool(finish)
+        finally:
+            held = time.monotonic() - self._opened_at
+
+            if self._storage.hold_warning is not None and held > self._storage.hold_warning:
+                self._storage.long_sessions += 1
+                logger.warning(f"Сессия базы данных была открыта {held:.2f} сек. Открыта здесь:\n{self._stack}")
+
+        return False
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Выполнение функции с сессией этого блока в пуле потоков. Изменения не сохраняются до выхода из блока
+
+        :param function: функция, первым аргументом которой передаётся сессия
+        :param args: аргументы функции
+        :param kwargs: именованные аргументы функции
+        :return: результат функции
+        """
+
+        return await self._storage.run_in_pool(function, self._session, *args, **kwargs)
+
+
+class Storage:
+    """
+    Асинхронный доступ к базе данных. Запросы выполняются в ограниченном пуле потоков, чтобы не блокировать цикл
+    событий бота
+
+    :param engine: движок базы данных
+    :param pool_size: количество потоков, выполняющих запросы
+    :param queue_size: максимальное количество запросов, переданных в пул потоков. Остальные запросы ожидают своей
+                       очереди, не занимая пул
+    :param hold_warning: время (сек.), после которого открытая сессия UnitOfWork записывается в лог. None - не следить
+    """
+
+    def __init__(self, engine, pool_size, queue_size, hold_warning=None):
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.hold_warning = hold_warning
+
+        # объекты остаются доступными после закрытия сессии, так как они передаются обратно в цикл событий
+        self._sessionmaker = sessionmaker(bind=engine, expire_on_commit=False)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="storage")
+        self._slots = None
+
+        self.waiting = 0  # запросы, ожидающие места в очереди пула
+        self.queued = 0  # запросы, переданные в пул (выполняющиеся и ожидающие свободного потока)
+        self.completed = 0  # выполненные запросы
+        self.failed = 0  # запросы, завершившиеся ошибкой
+        self.long_sessions = 0  # сессии UnitOfWork, открытые дольше hold_warning
+
+        # выдача соединений из пула движка и их возврат
+        self._pool = engine.pool
+        self.checkouts = 0
+        self.checkins = 0
+
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.checkins += 1
+
+    def _execute(self, function, args, kwargs):
+        session = self._sessionmaker()
+
+        try:
+            result = function(session, *args, **kwargs)
+            session.commit()
+
+            return result
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Выполнение функции с новой сессией базы данных в пуле потоков. После выполнения функции изменения
+        сохраняются, а сессия закрывается
+
+        :param function: функция, первым аргументом которой передаётся сессия
+        :param args: аргументы функции
+        :param kwargs: именованные аргументы функции
+        :return: результат функции
+        """
+
+        return await self.run_in_pool(self._execute, function, args, kwargs)
+
+    def unit_of_work(self):
+        """
+        Блок `async with` с одной сессией для нескольких запросов. Подробнее: UnitOfWork
+
+        :rtype: UnitOfWork
+        """
+
+        return UnitOfWork(self)
+
+    async def run_in_pool(self, function, *args, **kwargs):
+        """
+        Выполнение функции в пуле потоков с учётом ограничения очереди
+
+        :param function: функция
+        :param args: аргументы функции
+        :param kwargs: именованные аргументы функции
+        :return: результат функции
+        """
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_size)
+
+        self.waiting += 1
+
+        async with self._slots:
+            self.waiting -= 1
+            self.queued += 1
+
+            try:
+                # контекст передаётся в поток, чтобы запросы относились к текущей команде или слушателю
+                context = contextvars.copy_context()
+                result = await asyncio.get_event_loop().run_in_executor(
+                    self._executor, lambda: context.run(function, *args, **kwargs)
+                )
+            except Exception:
+                self.failed += 1
+                raise
+            else:
+                self.completed += 1
+            finally:
+                self.queued -= 1
+
+        return result
+
+    def stats(self):
+        """
+        Состояние пула запросов
+
+        :return: словарь с размером пула, очереди, количеством запросов и соединений
+        :rtype: dict
+        """
+
+        return {
+            "pool_size": self.pool_size,
+            "queue_size": self.queue_size,
+            "waiting": self.waiting,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "long_sessions": self.long_sessions,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "checked_out": self._pool.checkedout()
+        }
+
+    def shutdown(self):
+        """
+        Ожидание выполнения всех запросов и остановка пула потоков
+        """
+
+        self._executor.shutdown(wait=True)
+
+
+_storage = None
+
+
+def configure_storage(engine, pool_size, queue_size, hold_warning=None):
+    """
+    Настройка доступа к базе данных
+
+    :param engine: движок базы данных
+    :param pool_size: количество потоков, выполняющих запросы
+    :param queue_size: максимальное количество запросов, переданных в пул потоков
+    :param hold_warning: время (сек.), после которого открытая сессия UnitOfWork записывается в лог
+    """
+
+    global _storage
+
+    _storage = Storage(engine, pool_size, queue_size, hold_warning)
+
+
+def get_storage():
+    """
+    Получение настроенного доступа к базе данных
+
+    :rtype: Storage
+    """
+
+    return _storage
+
+
+async def run(function, *args, **kwargs):
+    """
+    Выполнение функции с новой сессией базы данных, не блокируя цикл событий. Подробнее: Storage.run
+
+    :param function: функция, первым аргументом которой передаётся сессия
+    :return: результат функции
+    """
+
+    return await _storage.run(function, *args, **kwargs)
+
+
+def unit_of_work():
+    """
+    Блок `async with` с одной сессией базы данных для нескольких запросов. Подробнее: UnitOfWork
+
+    :rtype: UnitOfWork
+    """
+
+    return _storage.unit_of_work()
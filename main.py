@@ -1,26 +1,17 @@
+import argparse
 import discord
 import logging
-import sqlalchemy
 import os
-from discord.ext import commands
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
-from core.templates import Help
-from core.database import Base, Server
-
-__version__ = "0.3.1"
-
-# Основные константы
-DEV_MODE = os.environ.get("DEV_MODE") == "True"
-DEFAULT_PREFIX = "." if not DEV_MODE else ">"
-SAVE_LOGS = os.environ.get("SAVE_LOGS") == "True"
-PRINT_LOG_TIME = os.environ.get("PRINT_LOG_TIME") == "True"
-
-# База данных
-ENGINE_DB = sqlalchemy.create_engine(os.environ.get("DATABASE_URL"))
-Session = sessionmaker(bind=ENGINE_DB)
-Base.metadata.create_all(bind=ENGINE_DB)
+from core.app import (client, DEV_MODE, DEFAULT_PREFIX, SAVE_LOGS, PRINT_LOG_TIME, ENGINE_DB, PURGE_GRACE_PERIOD,
+                      METRICS_HOST, METRICS_PORT, LOG_JSON, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+from core.database import Base
+from core.storage import run
+from core.purge import get_purger
+from core.logs import JsonFormatter, setup_file_logging
+from core.monitoring import start_metrics_server
+from core.prefixes import load_prefixes, remove_cached_prefix
 
 # Конфигурация логирования
 if PRINT_LOG_TIME:
@@ -45,48 +36,26 @@ logger.setLevel(logging.INFO)
 discord_logger = logging.getLogger("discord")
 discord_logger.setLevel(logging.INFO)
 
+# файл записывается в отдельном потоке, чтобы не блокировать цикл событий
+log_listener = None
+
 if SAVE_LOGS:
-    handler = logging.FileHandler(
-        filename=f"logs/{datetime.now().strftime('%d-%m-%Y-%H-%M-%S')}.log",
-        encoding="utf-8",
-        mode="w"
+    log_listener = setup_file_logging(
+        [logger, discord_logger],
+        filename=f"logs/{datetime.now().strftime('%d-%m-%Y-%H-%M-%S')}.{'jsonl' if LOG_JSON else 'log'}",
+        formatter=JsonFormatter(datefmt=date_format) if LOG_JSON else logging.Formatter(output_log_format, date_format),
+        max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT
     )
-    handler.setFormatter(logging.Formatter(output_log_format, date_format))
-    logger.addHandler(handler)
-    discord_logger.addHandler(handler)
-
-
-def get_prefix(bot, message):
-    """
-    Возвращение префикса из базы данных или стандартного, а также префикс в виде упоминания бота
-
-    :param bot: класс бота
-    :param message: сообщение
-    :return: конечный префикс
-    """
-
-    prefix = DEFAULT_PREFIX
-
-    if message.guild:
-        session = Session()
-
-        server_from_db = session.query(Server).filter_by(server_id=str(message.guild.id)).first()
-
-        if server_from_db is not None and server_from_db.prefix is not None:
-            prefix = server_from_db.prefix
-
-        session.close()
-
-    return commands.when_mentioned_or(prefix)(bot, message)
-
-
-# Настройка бота
-client = commands.Bot(command_prefix=get_prefix)
-client.help_command = Help()
 
 
 @client.event
 async def on_ready():
+    await run(load_prefixes)
+
+    get_purger().start(client)
+    await get_purger().resume()
+
     logger.info(f"Бот {client.user.name} запущен")
 
     if DEV_MODE:
@@ -100,12 +69,41 @@ async def on_ready():
         await client.change_presence(activity=discord.Streaming(name=".help", url="https://twitch.tv/volkovik/"))
 
 
+@client.event
+async def on_guild_remove(guild):
+    remove_cached_prefix(guild.id)
+
+    # данные удаляются не сразу, чтобы их не потерять, если бота вернут на сервер
+    await get_purger().purge(guild.id, "server", PURGE_GRACE_PERIOD)
+
+
+@client.event
+async def on_guild_join(guild):
+    await get_purger().cancel(guild.id, "server")
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Запуск бота Ice Cube")
+    parser.add_argument(
+        "--create-tables", action="store_true",
+        help="создать недостающие таблицы в базе данных перед запуском (без миграций)"
+    )
+    args = parser.parse_args()
+
+    if args.create_tables:
+        Base.metadata.create_all(bind=ENGINE_DB)
+
     plugins_path = "plugins"
-    plugins = ["levels", "rooms", "settings", "error", "fun", "information", ]
+    plugins = ["levels", "rooms", "settings", "error", "fun", "information", "debug", ]
 
     for plugin in plugins:
         client.load_extension(f"{plugins_path}.{plugin}")
         logging.info(f"\"{plugin}\" плагин загружен")
 
+    if METRICS_PORT:
+        client.loop.run_until_complete(start_metrics_server(METRICS_HOST, METRICS_PORT))
+
     client.run(os.environ.get("BOT_TOKEN"))
+
+    if log_listener is not None:
+        log_listener.stop()
@@ -0,0 +1,113 @@
+"""initial schema
+
+Revision ID: 5a1f3c2e9b40
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1f3c2e9b40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('user_id', sa.String(length=32), nullable=False),
+        sa.Column('bio', sa.String(length=512), nullable=True),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table(
+        'servers',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('prefix', sa.String(length=32), nullable=True),
+        sa.PrimaryKeyConstraint('server_id')
+    )
+    op.create_table(
+        'servers_settings_of_rooms',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('channel_id_creates_rooms', sa.String(length=32), nullable=True),
+        sa.PrimaryKeyConstraint('server_id'),
+        sa.UniqueConstraint('channel_id_creates_rooms')
+    )
+    op.create_table(
+        'users_settings_of_room',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('owner_id', sa.String(length=32), nullable=False),
+        sa.Column('name', sa.String(length=32), nullable=True),
+        sa.Column('user_limit', sa.Integer(), nullable=False),
+        sa.Column('bitrate', sa.Integer(), nullable=False),
+        sa.Column('is_locked', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('server_id', 'owner_id')
+    )
+    op.create_table(
+        'users_permissions_of_room',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('owner_id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.String(length=32), nullable=False),
+        sa.Column('permissions', sa.Enum('banned', 'default', 'allowed', name='permissionsforroom'), nullable=False),
+        sa.PrimaryKeyConstraint('server_id', 'owner_id', 'user_id')
+    )
+    op.create_table(
+        'users_score_to_another_users',
+        sa.Column('user_id', sa.String(length=32), nullable=False),
+        sa.Column('rated_user_id', sa.String(length=32), nullable=False),
+        sa.Column('score', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'rated_user_id')
+    )
+    op.create_table(
+        'users_level',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.String(length=32), nullable=False),
+        sa.Column('experience', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('server_id', 'user_id')
+    )
+    op.create_table(
+        'servers_setting_of_levels',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('notify_of_levelup', sa.Boolean(), nullable=False),
+        sa.Column('levelup_message_dm', sa.Boolean(), nullable=False),
+        sa.Column('levelup_message_channel_id', sa.String(length=32), nullable=True),
+        sa.Column('levelup_message', sa.String(length=256), nullable=True),
+        sa.PrimaryKeyConstraint('server_id')
+    )
+    op.create_table(
+        'servers_awards_of_levels',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('role_id', sa.String(length=32), nullable=False),
+        sa.Column('level', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('server_id', 'role_id')
+    )
+    op.create_table(
+        'servers_ignore_channels_lists_of_levels',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('channel_id', sa.String(length=32), nullable=False),
+        sa.PrimaryKeyConstraint('server_id', 'channel_id')
+    )
+    op.create_table(
+        'servers_ignore_roles_lists_of_levels',
+        sa.Column('server_id', sa.String(length=32), nullable=False),
+        sa.Column('role_id', sa.String(length=32), nullable=False),
+        sa.PrimaryKeyConstraint('server_id', 'role_id')
+    )
+
+
+def downgrade():
+    op.drop_table('servers_ignore_roles_lists_of_levels')
+    op.drop_table('servers_ignore_channels_lists_of_levels')
+    op.drop_table('servers_awards_of_levels')
+    op.drop_table('servers_setting_of_levels')
+    op.drop_table('users_level')
+    op.drop_table('users_score_to_another_users')
+    op.drop_table('users_permissions_of_room')
+    op.drop_table('users_settings_of_room')
+    op.drop_table('servers_settings_of_rooms')
+    op.drop_table('servers')
+    op.drop_table('users')
+    sa.Enum(name='permissionsforroom').drop(op.get_bind(), checkfirst=True)
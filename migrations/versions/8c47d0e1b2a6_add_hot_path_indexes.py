@@ -0,0 +1,52 @@
+"""add hot path indexes
+
+Revision ID: 8c47d0e1b2a6
+Revises: 5a1f3c2e9b40
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c47d0e1b2a6'
+down_revision = '5a1f3c2e9b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_level_server_id_experience', 'users_level',
+            ['server_id', sa.text('experience DESC')],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_users_score_to_another_users_rated_user_id_score', 'users_score_to_another_users',
+            ['rated_user_id', 'score'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_servers_awards_of_levels_server_id_level', 'servers_awards_of_levels',
+            ['server_id', 'level'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_servers_awards_of_levels_server_id_level', table_name='servers_awards_of_levels',
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_users_score_to_another_users_rated_user_id_score', table_name='users_score_to_another_users',
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_users_level_server_id_experience', table_name='users_level',
+            postgresql_concurrently=True
+        )
@@ -0,0 +1,46 @@
+"""snowflakes to bigint
+
+Revision ID: b93e2d7f4c18
+Revises: 8c47d0e1b2a6
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b93e2d7f4c18'
+down_revision = '8c47d0e1b2a6'
+branch_labels = None
+depends_on = None
+
+# table -> columns with Discord IDs
+SNOWFLAKE_COLUMNS = {
+    'users': ['user_id'],
+    'servers': ['server_id'],
+    'servers_settings_of_rooms': ['server_id', 'channel_id_creates_rooms'],
+    'users_settings_of_room': ['server_id', 'owner_id'],
+    'users_permissions_of_room': ['server_id', 'owner_id', 'user_id'],
+    'users_score_to_another_users': ['user_id', 'rated_user_id'],
+    'users_level': ['server_id', 'user_id'],
+    'servers_setting_of_levels': ['server_id', 'levelup_message_channel_id'],
+    'servers_awards_of_levels': ['server_id', 'role_id'],
+    'servers_ignore_channels_lists_of_levels': ['server_id', 'channel_id'],
+    'servers_ignore_roles_lists_of_levels': ['server_id', 'role_id'],
+}
+
+
+def alter_columns(type_, cast):
+    # all columns of a table are changed in one statement, so the table and its indexes are rewritten only once
+    for table, columns in SNOWFLAKE_COLUMNS.items():
+        op.execute('ALTER TABLE {} {}'.format(table, ', '.join(
+            'ALTER COLUMN {0} TYPE {1} USING {0}::{2}'.format(column, type_, cast) for column in columns
+        )))
+
+
+def upgrade():
+    alter_columns('BIGINT', 'bigint')
+
+
+def downgrade():
+    alter_columns('VARCHAR(32)', 'varchar')
@@ -0,0 +1,29 @@
+"""add award reconciliations
+
+Revision ID: d1f6a8c3e5b7
+Revises: b93e2d7f4c18
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1f6a8c3e5b7'
+down_revision = 'b93e2d7f4c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'servers_award_reconciliations_of_levels',
+        sa.Column('server_id', sa.BigInteger(), nullable=False),
+        sa.Column('last_user_id', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('server_id')
+    )
+
+
+def downgrade():
+    op.drop_table('servers_award_reconciliations_of_levels')
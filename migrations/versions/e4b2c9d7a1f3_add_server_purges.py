@@ -0,0 +1,31 @@
+"""add server purges
+
+Revision ID: e4b2c9d7a1f3
+Revises: d1f6a8c3e5b7
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b2c9d7a1f3'
+down_revision = 'd1f6a8c3e5b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'servers_purges',
+        sa.Column('server_id', sa.BigInteger(), nullable=False),
+        sa.Column('scope', sa.String(length=16), nullable=False),
+        sa.Column('not_before', sa.DateTime(), nullable=False),
+        sa.Column('deleted', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('server_id', 'scope')
+    )
+
+
+def downgrade():
+    op.drop_table('servers_purges')
@@ -0,0 +1,61 @@
+from discord.ext import commands
+
+from core.commands import Cog, Command
+from core.sqlstats import statement_stats
+from core.templates import SuccessfulMessage, DefaultEmbed as Embed
+
+TOP_HANDLERS = 10  # количество команд и слушателей в статистике запросов
+FIELD_LIMIT = 1024  # максимальная длина поля Embed
+
+
+class Debug(Cog, name="Отладка"):
+    @commands.group(name="sqlstats", hidden=True, invoke_without_command=True)
+    @commands.is_owner()
+    async def sql_stats(self, ctx):
+        """
+        Команды и слушатели событий с наибольшим временем запросов к базе данных и самые медленные запросы
+        """
+
+        handlers = statement_stats.top_handlers(TOP_HANDLERS)
+
+        if handlers:
+            handlers_text = "\n".join(
+                f"`{name}`: {count} запр., {total * 1000:.1f} мс, в среднем {total / count * 1000:.2f} мс"
+                for name, count, total in handlers
+            )
+        else:
+            handlers_text = "**Здесь ничего нет**"
+
+        embed = Embed(
+            title="Запросы к базе данных",
+            description=handlers_text
+        )
+
+        for duration, statement, parameters, handler in statement_stats.slowest()[:5]:
+            value = f"`{handler}`, параметры: `{parameters}`\n```sql\n{statement}\n```"
+
+            if len(value) > FIELD_LIMIT:
+                value = value[:FIELD_LIMIT - 4] + "\n```"
+
+            embed.add_field(
+                name=f"{duration * 1000:.1f} мс",
+                value=value,
+                inline=False
+            )
+
+        await ctx.send(embed=embed)
+
+    @sql_stats.command(cls=Command, name="reset", hidden=True)
+    @commands.is_owner()
+    async def reset_sql_stats(self, ctx):
+        """
+        Сбросить статистику запросов к базе данных
+        """
+
+        statement_stats.reset()
+
+        await ctx.send(embed=SuccessfulMessage("Я сбросил статистику запросов к базе данных"))
+
+
+def setup(bot):
+    bot.add_cog(Debug(bot))
@@ -3,13 +3,29 @@ from discord import Status
 from discord.ext import commands
 from discord.ext.commands import CommandError
 
-from main import Session, __version__
+from core.app import __version__
 from core.database import User, UserScoreToAnotherUser
+from core.storage import run
 from core.commands import Cog, Group, Command
 from core.templates import SuccessfulMessage, DefaultEmbed as Embed, send_message_with_reaction_choice
 from core.converts import convert_status, convert_activity_type, convert_voice_region, convert_verification_level
 
 
+def get_score(session, user_id, rated_user_id):
+    """Получение оценки, которую пользователь поставил другому пользователю"""
+    return session.query(UserScoreToAnotherUser).filter_by(user_id=user_id, rated_user_id=rated_user_id).first()
+
+
+def set_score(session, user_id, rated_user_id, score):
+    """Добавление или изменение оценки, которую пользователь поставил другому пользователю"""
+    session.merge(UserScoreToAnotherUser(user_id=user_id, rated_user_id=rated_user_id, score=score))
+
+
+def remove_score(session, user_id, rated_user_id):
+    """Удаление оценки, которую пользователь поставил другому пользователю"""
+    return session.query(UserScoreToAnotherUser).filter_by(user_id=user_id, rated_user_id=rated_user_id).delete()
+
+
 class Information(Cog, name="Информация"):
     @commands.command(
         cls=Command, name="user",
@@ -36,19 +52,17 @@ class Information(Cog, name="Информация"):
             activity = f"**{convert_activity_type(user.activity.type)}** " \
                        f"{user.activity.name}\n" if user.activity else ""
 
-        session = Session()
+        def get_profile(session):
+            user_from_db = session.query(User).filter_by(user_id=user.id).first()
 
-        user_from_db = session.query(User).filter_by(user_id=str(user.id)).first()
-        bio = user_from_db.bio if user_from_db is not None else None
+            up = session.query(UserScoreToAnotherUser).filter_by(rated_user_id=user.id, score=True).count()
+            down = session.query(UserScoreToAnotherUser).filter_by(rated_user_id=user.id, score=False).count()
 
-        up_score = session.query(UserScoreToAnotherUser).filter_by(rated_user_id=str(user.id), score=True).count()
-        down_score = session.query(UserScoreToAnotherUser).filter_by(rated_user_id=str(user.id), score=False).count()
+            return user_from_db.bio if user_from_db is not None else None, up - down
 
-        user_score = up_score - down_score
+        bio, user_score = await run(get_profile)
         user_score = str(user_score) if user_score <= 0 else f"+{user_score}"
 
-        session.close()
-
         if bio is None:
             if user == ctx.author:
                 bio = "Вы можете вести свою информацию здесь с помощью команды `.bio`"
@@ -85,14 +99,8 @@ class Information(Cog, name="Информация"):
         Редактирование описания в профиле
         """
 
-        session = Session()
-
-        user_from_db = session.query(User).filter_by(user_id=str(ctx.author.id)).first()
-        if user_from_db is None:
-            user_from_db = User(user_id=str(ctx.author.id))
-            session.add(user_from_db)
-
-        previous_bio = user_from_db.bio
+        user_from_db = await run(lambda session: session.query(User).filter_by(user_id=ctx.author.id).first())
+        previous_bio = user_from_db.bio if user_from_db is not None else None
 
         if text is not None:
             if len(text) > 512:
@@ -100,20 +108,16 @@ class Information(Cog, name="Информация"):
             elif text == previous_bio:
                 raise CommandError("Введёный текст идентичен вашему описанию в профиле")
             else:
-                user_from_db.bio = text
                 message = SuccessfulMessage("Я изменил описание в вашем профиле")
         else:
             if previous_bio is None:
                 raise CommandError("Вы не ввели текст")
             else:
-                user_from_db.bio = None
-
                 message = SuccessfulMessage("Я удалил описание в вашем профиле")
 
-        await ctx.send(embed=message)
+        await run(lambda session: session.merge(User(user_id=ctx.author.id, bio=text)))
 
-        session.commit()
-        session.close()
+        await ctx.send(embed=message)
 
     @commands.group(
         cls=Group, name="rep", aliases=["rate"], invoke_without_command=True,
@@ -129,14 +133,12 @@ class Information(Cog, name="Информация"):
         elif user.bot:
             raise CommandError("Вы не можете оценить бота")
 
-        session = Session()
-
         db_kwargs = {
-            "user_id": str(ctx.author.id),
-            "rated_user_id": str(user.id)
+            "user_id": ctx.author.id,
+            "rated_user_id": user.id
         }
 
-        user_score_from_db = session.query(UserScoreToAnotherUser).filter_by(**db_kwargs).first()
+        user_score_from_db = await run(get_score, **db_kwargs)
 
         emojis = {
             "up": "⬆️",
@@ -154,13 +156,11 @@ class Information(Cog, name="Информация"):
             message, answer = await send_message_with_reaction_choice(self.client, ctx, embed, emojis)
 
             if answer == "up":
-                session.add(UserScoreToAnotherUser(**db_kwargs, score=True))
-                session.commit()
+                await run(set_score, **db_kwargs, score=True)
                 await message.edit(embed=SuccessfulMessage(f"Вы поставили положительную оценку "
                                                            f"`{user.display_name}`"))
             elif answer == "down":
-                session.add(UserScoreToAnotherUser(**db_kwargs, score=False))
-                session.commit()
+                await run(set_score, **db_kwargs, score=False)
                 await message.edit(embed=SuccessfulMessage(f"Вы поставили отрицательную оценку "
                                                            f"`{user.display_name}`"))
             elif answer == "cancel":
@@ -193,13 +193,11 @@ class Information(Cog, name="Информация"):
                 message, answer = await send_message_with_reaction_choice(self.client, ctx, embed, emojis)
 
                 if answer == "down":
-                    user_score_from_db.score = False
-                    session.commit()
+                    await run(set_score, **db_kwargs, score=False)
                     await message.edit(embed=SuccessfulMessage(f"Вы изменили вашу оценку на отрицательную "
                                                                f"`{user.display_name}`"))
                 elif answer == "remove":
-                    session.delete(user_score_from_db)
-                    session.commit()
+                    await run(remove_score, **db_kwargs)
                     await message.edit(embed=SuccessfulMessage(f"Вы удалили оценку `{user.display_name}`"))
                 elif answer == "cancel":
                     await message.edit(embed=cancelled_message)
@@ -217,19 +215,15 @@ class Information(Cog, name="Информация"):
                 message, answer = await send_message_with_reaction_choice(self.client, ctx, embed, emojis)
 
                 if answer == "up":
-                    user_score_from_db.score = True
-                    session.commit()
+                    await run(set_score, **db_kwargs, score=True)
                     await message.edit(embed=SuccessfulMessage(f"Вы изменили вашу оценку на положительную "
                                                                f"`{user.display_name}`"))
                 elif answer == "remove":
-                    session.delete(user_score_from_db)
-                    session.commit()
+                    await run(remove_score, **db_kwargs)
                     await message.edit(embed=SuccessfulMessage(f"Вы удалили оценку `{user.display_name}`"))
                 elif answer == "cancel":
                     await message.edit(embed=cancelled_message)
 
-        session.close()
-
     @set_reputation_for_user.command(
         cls=Command, name="+", aliases=["up"],
         usage={"пользователь": ("упоминание или ID участника сервера, чтобы посмотреть его профиль", True)}
@@ -244,30 +238,24 @@ class Information(Cog, name="Информация"):
         elif user.bot:
             raise CommandError("Вы не можете оценить бота")
 
-        session = Session()
-
         db_kwargs = {
-            "user_id": str(ctx.author.id),
-            "rated_user_id": str(user.id)
+            "user_id": ctx.author.id,
+            "rated_user_id": user.id
         }
 
-        score_from_db = session.query(UserScoreToAnotherUser).filter_by(**db_kwargs).first()
+        score_from_db = await run(get_score, **db_kwargs)
 
         if score_from_db is None:
-            session.add(UserScoreToAnotherUser(**db_kwargs, score=True))
             embed = SuccessfulMessage(f"Вы поставили положительную оценку `{user.display_name}`")
         else:
             if score_from_db.score is True:
-                session.close()
                 raise CommandError("Вы уже поставили положительную оценку пользователю")
             else:
-                score_from_db.score = True
                 embed = SuccessfulMessage(f"Вы изменили вашу оценку на положительную `{user.display_name}`")
 
-        await ctx.send(embed=embed)
+        await run(set_score, **db_kwargs, score=True)
 
-        session.commit()
-        session.close()
+        await ctx.send(embed=embed)
 
     @set_reputation_for_user.command(
         cls=Command, name="-", aliases=["down"],
@@ -283,30 +271,24 @@ class Information(Cog, name="Информация"):
         elif user.bot:
             raise CommandError("Вы не можете оценить бота")
 
-        session = Session()
-
         db_kwargs = {
-            "user_id": str(ctx.author.id),
-            "rated_user_id": str(user.id)
+            "user_id": ctx.author.id,
+            "rated_user_id": user.id
         }
 
-        score_from_db = session.query(UserScoreToAnotherUser).filter_by(**db_kwargs).first()
+        score_from_db = await run(get_score, **db_kwargs)
 
         if score_from_db is None:
-            session.add(UserScoreToAnotherUser(**db_kwargs, score=False))
             embed = SuccessfulMessage(f"Вы поставили отрицательную оценку `{user.display_name}`")
         else:
             if score_from_db.score is False:
-                session.close()
                 raise CommandError("Вы уже поставили отрицательную оценку пользователю")
             else:
-                score_from_db.score = False
-                session.commit()
                 embed = SuccessfulMessage(f"Вы изменили вашу оценку на отрицательную `{user.display_name}`")
 
-        await ctx.send(embed=embed)
+        await run(set_score, **db_kwargs, score=False)
 
-        session.close()
+        await ctx.send(embed=embed)
 
     @set_reputation_for_user.command(
         cls=Command, name="remove",
@@ -322,27 +304,20 @@ class Information(Cog, name="Информация"):
         elif user.bot:
             raise CommandError("Вы не можете удалить оценку у бота")
 
-        session = Session()
-
         db_kwargs = {
-            "user_id": str(ctx.author.id),
-            "rated_user_id": str(user.id)
+            "user_id": ctx.author.id,
+            "rated_user_id": user.id
         }
 
-        score_from_db = session.query(UserScoreToAnotherUser).filter_by(**db_kwargs)
+        deleted = await run(remove_score, **db_kwargs)
 
-        if score_from_db is None:
-            session.close()
+        if not deleted:
             raise CommandError("Вы не ставили этому пользователю оценку")
         else:
-            score_from_db.delete()
-            session.commit()
             embed = SuccessfulMessage(f"Вы удалили оценку `{user.display_name}`")
 
             await ctx.send(embed=embed)
 
-        session.close()
-
     @commands.command(cls=Command, name="server")
     async def server_information(self, ctx):
         """
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from sqlalchemy.dialects.postgresql import insert
+
+from core.app import XP_FLUSH_BATCH_SIZE, XP_CACHE_SIZE
+from core.database import UserLevel
+from core.metrics import metrics
+from core.storage import run
+
+logger = logging.getLogger("ice_cube")
+
+
+class ExperienceAccumulator:
+    """
+    Накопитель опыта участников. Опыт копится в памяти и записывается в базу данных пачками. Текущий опыт хранится
+    не больше чем для cache_size участников: давно не встречавшиеся участники без незаписанного опыта удаляются из
+    памяти и при следующем обращении загружаются из базы данных
+
+    :param batch_size: максимальное количество строк в одном запросе записи
+    :param cache_size: максимальное количество участников, чей опыт хранится в памяти
+    """
+
+    def __init__(self, batch_size, cache_size):
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._pending = {}  # ID сервера -> {ID пользователя -> опыт, который ещё не записан в базу данных}
+        self._flushing = {}  # ID сервера -> множество ID пользователей, чей опыт сейчас записывается
+        self._totals = OrderedDict()  # ID сервера -> OrderedDict {ID пользователя -> текущее количество опыта}
+        self._size = 0  # количество участников в _totals
+        self._lock = None  # не даёт записи накопленного опыта и прямой записи опыта выполняться одновременно
+
+    def _get_lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        return self._lock
+
+    def _touch(self, server_id, user_id):
+        # сервер и участник переносятся в конец очереди на удаление из памяти
+        self._totals.move_to_end(server_id)
+        self._totals[server_id].move_to_end(user_id)
+
+    def _store(self, server_id, user_id, experience):
+        users = self._totals.get(server_id)
+
+        if users is None:
+            users = self._totals[server_id] = OrderedDict()
+
+        if user_id not in users:
+            self._size += 1
+
+        users[user_id] = experience
+        self._touch(server_id, user_id)
+        self._evict()
+
+    def _is_pinned(self, server_id, user_id):
+        # опыт участника ещё не записан или записывается: загруженное из базы данных значение было бы неверным
+        return user_id in self._pending.get(server_id, ()) or user_id in self._flushing.get(server_id, ())
+
+    def _evict(self):
+        # удаляются давно не встречавшиеся участники, кроме участников с незаписанным опытом
+        for server_id in list(self._totals):
+            excess = self._size - self.cache_size
+
+            if excess <= 0:
+                return
+
+            users = self._totals[server_id]
+            victims = []
+
+            for user_id in users:
+                if len(victims) == excess:
+                    break
+
+                if not self._is_pinned(server_id, user_id):
+                    victims.append(user_id)
+
+            for user_id in victims:
+                del users[user_id]
+
+            self._size -= len(victims)
+
+            if not users:
+                del self._totals[server_id]
+
+    async def get_experience(self, server_id, user_id):
+        """
+        Получение текущего количества опыта пользователя с учётом ещё не записанного опыта
+
+        :param server_id: ID сервера
+        :type server_id: int
+        :param user_id: ID пользователя
+        :type user_id: int
+        :return: количество опыта или None, если пользователь ещё не числится в рейтинге
+        :rtype: int or None
+        """
+
+        users = self._totals.get(server_id)
+        hit = users is not None and user_id in users
+
+        metrics.count_cache("experience", hit=hit)
+
+        if hit:
+            self._touch(server_id, user_id)
+            return users[user_id]
+
+        user_db = await run(lambda session: session.query(UserLevel.experience).filter_by(
+            server_id=server_id, user_id=user_id
+        ).first())
+
+        # пока шёл запрос, опыт пользователя мог быть уже загружен или изменён
+        users = self._totals.get(server_id)
+
+        if users is not None and user_id in users:
+            return users[user_id]
+
+        experience = user_db.experience if user_db is not None else None
+        self._store(server_id, user_id, experience)
+
+        return experience
+
+    async def add_experience(self, server_id, user_id, experience):
+        """
+        Добавление опыта пользователю
+
+        :param server_id: ID сервера
+        :type server_id: int
+        :param user_id: ID пользователя
+        :type user_id: int
+        :param experience: добавляемое количество опыта
+        :type experience: int
+        :return: количество опыта до и после добавления
+        :rtype: tuple
+        """
+
+        before = await self.get_experience(server_id, user_id) or 0
+
+        pending = self._pending.setdefault(server_id, {})
+        pending[user_id] = pending.get(user_id, 0) + experience
+        self._store(server_id, user_id, before + experience)
+
+        return before, before + experience
+
+    async def set_experience(self, server_id, user_id, experience):
+        """
+        Запись опыта пользователя в базу данных напрямую. Незаписанный опыт пользователя отбрасывается, а запись
+        накопленного опыта не выполняется одновременно с этой записью, поэтому она не перезапишет новое значение
+
+        :param server_id: ID сервера
+        :type server_id: int
+        :param user_id: ID пользователя
+        :type user_id: int
+        :param experience: количество опыта
+        :type experience: int
+        """
+
+        async with self._get_lock():
+            self._pending.get(server_id, {}).pop(user_id, None)
+
+            await run(lambda session: session.merge(
+                UserLevel(server_id=server_id, user_id=user_id, experience=experience)
+            ))
+
+            # опыт, полученный во время записи, будет записан вместе с остальным накопленным опытом
+            self._store(server_id, user_id, experience + self._pending.get(server_id, {}).get(user_id, 0))
+
+    def forget_server(self, server_id):
+        """
+        Удаление всего накопленного опыта сервера
+
+        :param server_id: ID сервера
+        :type server_id: int
+        """
+
+        self._pending.pop(server_id, None)
+        self._flushing.pop(server_id, None)
+        users = self._totals.pop(server_id, None)
+
+        if users is not None:
+            self._size -= len(users)
+
+    def _write(self, session, pending):
+        for i in range(0, len(pending), self.batch_size):
+            statement = insert(UserLevel).values([
+                {"server_id": server_id, "user_id": user_id, "experience": experience}
+                for server_id, user_id, experience in pending[i:i + self.batch_size]
+            ])
+            statement = statement.on_conflict_do_update(
+                index_elements=[UserLevel.server_id, UserLevel.user_id],
+                set_={"experience": UserLevel.experience + statement.excluded.experience}
+            )
+
+            session.execute(statement)
+
+    async def flush(self):
+        """
+        Запись накопленного опыта в базу данных
+        """
+
+        async with self._get_lock():
+            if not self._pending:
+                return
+
+            pending = [
+                (server_id, user_id, experience)
+                for server_id, users in self._pending.items() for user_id, experience in users.items()
+            ]
+            # пока запись не завершится, эти участники не удаляются из памяти
+            for server_id, users in self._pending.items():
+                self._flushing[server_id] = set(users)
+
+            self._pending.clear()
+
+            try:
+                await run(self._write, pending)
+            except Exception:
+                # возвращаем опыт обратно, чтобы записать его при следующей попытке
+                for server_id, user_id, experience in pending:
+                    users = self._pending.setdefault(server_id, {})
+                    users[user_id] = users.get(user_id, 0) + experience
+
+                logger.exception("Не удалось записать накопленный опыт в базу данных")
+                return
+            finally:
+                self._flushing.clear()
+
+        logger.debug(f"Записан опыт {len(pending)} пользователей")
+
+
+experience_accumulator = ExperienceAccumulator(XP_FLUSH_BATCH_SIZE, XP_CACHE_SIZE)
@@ -0,0 +1,119 @@
+import asyncio
+import discord
+import logging
+
+from core.outbound import Priority, RequestDropped, schedule, request
+
+logger = logging.getLogger("ice_cube")
+
+MESSAGE_LIMIT = 2000  # максимальная длина сообщения в Discord
+
+
+class LevelupAnnouncer:
+    """
+    Отправка оповещений о новом уровне. Оповещения в один канал собираются в течение короткого времени и отправляются
+    одним сообщением, а оповещения в ЛС отправляются по отдельности с ограничением одновременных отправок
+
+    :param window: время сбора оповещений для одного канала (сек.)
+    :param batch_size: максимальное количество оповещений в одном сообщении
+    :param dm_concurrency: максимальное количество одновременных отправок в ЛС
+    """
+
+    def __init__(self, window, batch_size, dm_concurrency):
+        self.window = window
+        self.batch_size = batch_size
+        self.dm_concurrency = dm_concurrency
+
+        self._batches = {}  # ID канала -> (канал, список оповещений)
+        self._timers = {}  # ID канала -> задача, отправляющая оповещения по истечении времени сбора
+        self._dm_slots = None
+
+    def announce(self, channel, text):
+        """
+        Добавление оповещения для текстового канала
+
+        :param channel: текстовый канал
+        :type channel: discord.TextChannel
+        :param text: текст оповещения
+        :type text: str
+        """
+
+        _, texts = self._batches.setdefault(channel.id, (channel, []))
+        texts.append(text)
+
+        if len(texts) >= self.batch_size:
+            self._flush(channel.id)
+        elif channel.id not in self._timers:
+            self._timers[channel.id] = asyncio.ensure_future(self._flush_later(channel.id))
+
+    def announce_dm(self, user, text):
+        """
+        Отправка оповещения в ЛС пользователю
+
+        :param user: пользователь
+        :type user: discord.Member
+        :param text: текст оповещения
+        :type text: str
+        """
+
+        if self._dm_slots is None:
+            self._dm_slots = asyncio.Semaphore(self.dm_concurrency)
+
+        asyncio.ensure_future(self._send_dm(user, text))
+
+    async def _send_dm(self, user, text):
+        async with self._dm_slots:
+            try:
+                await request(("user", user.id), Priority.notification, lambda: user.send(text))
+            except (discord.Forbidden, RequestDropped):
+                # пользователь закрыл ЛС или оповещение отброшено из-за нагрузки
+                pass
+            except Exception:
+                logger.exception("Не удалось отправить оповещение о новом уровне в ЛС")
+
+    async def _flush_later(self, channel_id):
+        await asyncio.sleep(self.window)
+
+        self._timers.pop(channel_id, None)
+        self._flush(channel_id)
+
+    def _flush(self, channel_id):
+        timer = self._timers.pop(channel_id, None)
+
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._batches.pop(channel_id, None)
+
+        if batch is None:
+            return
+
+        channel, texts = batch
+
+        for content in _split_messages(texts):
+            schedule(("channel", channel_id), Priority.notification, lambda content=content: channel.send(content))
+
+    def flush_all(self):
+        """
+        Отправка всех собранных оповещений, не дожидаясь окончания времени сбора
+        """
+
+        for channel_id in list(self._batches):
+            self._flush(channel_id)
+
+
+def _split_messages(texts):
+    """Объединение оповещений в сообщения, не превышающие ограничение длины"""
+    content = ""
+
+    for text in texts:
+        text = text[:MESSAGE_LIMIT]
+
+        if content and len(content) + 1 + len(text) > MESSAGE_LIMIT:
+            yield content
+            content = text
+        else:
+            content = f"{content}\n{text}" if content else text
+
+    if content:
+        yield content
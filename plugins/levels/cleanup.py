@@ -0,0 +1,77 @@
+from core.storage import run
+from core.database import (ServerSettingsOfLevels, ServerAwardOfLevels, ServerIgnoreChannelsListOfLevels,
+                           ServerIgnoreRolesListOfLevels)
+
+from .config import get_levels_config, update_levels_config
+
+
+def remove_references(session, server_id, role_ids, channel_ids):
+    """
+    Удаление из настроек рейтинга ссылок на удалённые роли и каналы. Для каждой таблицы выполняется один запрос
+
+    :param session: сессия базы данных
+    :param server_id: ID сервера
+    :type server_id: int
+    :param role_ids: ID удалённых ролей
+    :type role_ids: set
+    :param channel_ids: ID удалённых каналов
+    :type channel_ids: set
+    """
+
+    if role_ids:
+        session.query(ServerAwardOfLevels).filter(
+            ServerAwardOfLevels.server_id == server_id,
+            ServerAwardOfLevels.role_id.in_(role_ids)
+        ).delete(synchronize_session=False)
+        session.query(ServerIgnoreRolesListOfLevels).filter(
+            ServerIgnoreRolesListOfLevels.server_id == server_id,
+            ServerIgnoreRolesListOfLevels.role_id.in_(role_ids)
+        ).delete(synchronize_session=False)
+
+    if channel_ids:
+        session.query(ServerIgnoreChannelsListOfLevels).filter(
+            ServerIgnoreChannelsListOfLevels.server_id == server_id,
+            ServerIgnoreChannelsListOfLevels.channel_id.in_(channel_ids)
+        ).delete(synchronize_session=False)
+        session.query(ServerSettingsOfLevels).filter(
+            ServerSettingsOfLevels.server_id == server_id,
+            ServerSettingsOfLevels.levelup_message_channel_id.in_(channel_ids)
+        ).update({"levelup_message_channel_id": None}, synchronize_session=False)
+
+
+async def remove_stale_references(server):
+    """
+    Поиск и удаление ссылок на роли и каналы, которых больше нет на сервере. Ссылки ищутся по кэшу настроек, поэтому
+    к базе данных обращение происходит только при их наличии
+
+    :param server: сервер
+    :type server: discord.Guild
+    :return: были ли удалены ссылки
+    :rtype: bool
+    """
+
+    config = await get_levels_config(server.id)
+
+    if config is None:
+        return False
+
+    role_ids = set(config.ignored_roles)
+
+    for award_role_ids in config.awards.values():
+        role_ids.update(award_role_ids)
+
+    channel_ids = set(config.ignored_channels)
+
+    if config.levelup_message_channel_id is not None:
+        channel_ids.add(config.levelup_message_channel_id)
+
+    stale_role_ids = {role_id for role_id in role_ids if server.get_role(role_id) is None}
+    stale_channel_ids = {channel_id for channel_id in channel_ids if server.get_channel(channel_id) is None}
+
+    if not stale_role_ids and not stale_channel_ids:
+        return False
+
+    await run(remove_references, server.id, stale_role_ids, stale_channel_ids)
+    await update_levels_config(server.id)
+
+    return True
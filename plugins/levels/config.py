@@ -0,0 +1,140 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+from core.metrics import metrics
+from core.storage import run
+from core.database import (ServerSettingsOfLevels, ServerAwardOfLevels, ServerIgnoreChannelsListOfLevels,
+                           ServerIgnoreRolesListOfLevels)
+
+from .message import LevelupMessage, DEFAULT_LEVELUP_TEMPLATE_FOR_SERVER, DEFAULT_LEVELUP_TEMPLATE_FOR_DM
+
+# Неизменяемый снимок настроек рейтинга участников на сервере
+LevelsConfig = namedtuple("LevelsConfig", [
+    "notify_of_levelup",  # оповещать ли о новом уровне
+    "levelup_message_dm",  # присылать ли оповещение в ЛС
+    "levelup_message_channel_id",  # ID канала для оповещений (None - канал, где был получен уровень)
+    "levelup_message",  # текст оповещения (None - стандартный текст)
+    "levelup_template",  # разобранный текст оповещения (LevelupMessage), с учётом стандартного текста
+    "ignored_channels",  # frozenset ID текстовых каналов из чёрного списка
+    "ignored_roles",  # frozenset ID ролей из чёрного списка
+    "awards"  # уровень -> frozenset ID ролей, которые выдаются за этот уровень
+])
+
+
+def get_levelup_template(text, dm):
+    """
+    Получение разобранного текста оповещения о новом уровне
+
+    :param text: текст оповещения (None - стандартный текст)
+    :type text: str or None
+    :param dm: присылается ли оповещение в ЛС
+    :type dm: bool
+    :rtype: LevelupMessage
+    """
+
+    if text is not None:
+        # текст проверяется при изменении, поэтому старые тексты с неизвестными ключевыми словами не вызывают ошибок
+        return LevelupMessage(text, strict=False)
+    elif dm:
+        return DEFAULT_LEVELUP_TEMPLATE_FOR_DM
+    else:
+        return DEFAULT_LEVELUP_TEMPLATE_FOR_SERVER
+
+
+# Кэш настроек: ID сервера -> LevelsConfig или None, если на сервере нет рейтинга участников
+_configs = {}
+
+
+def load_levels_config(session, server_id):
+    """
+    Загрузка настроек рейтинга участников сервера из базы данных
+
+    :param session: сессия базы данных
+    :param server_id: ID сервера
+    :type server_id: int
+    :return: настройки рейтинга или None, если на сервере нет рейтинга участников
+    :rtype: LevelsConfig or None
+    """
+
+    settings = session.query(ServerSettingsOfLevels).filter_by(server_id=server_id).first()
+
+    if settings is None:
+        return None
+
+    ignored_channels = session.query(ServerIgnoreChannelsListOfLevels.channel_id).filter_by(
+        server_id=server_id
+    ).all()
+    ignored_roles = session.query(ServerIgnoreRolesListOfLevels.role_id).filter_by(server_id=server_id).all()
+    awards_from_db = session.query(ServerAwardOfLevels.level, ServerAwardOfLevels.role_id).filter_by(
+        server_id=server_id
+    ).all()
+
+    awards = {}
+
+    for level, role_id in awards_from_db:
+        awards.setdefault(level, set()).add(role_id)
+
+    return LevelsConfig(
+        notify_of_levelup=settings.notify_of_levelup,
+        levelup_message_dm=settings.levelup_message_dm,
+        levelup_message_channel_id=settings.levelup_message_channel_id,
+        levelup_message=settings.levelup_message,
+        levelup_template=get_levelup_template(settings.levelup_message, settings.levelup_message_dm),
+        ignored_channels=frozenset(i.channel_id for i in ignored_channels),
+        ignored_roles=frozenset(i.role_id for i in ignored_roles),
+        awards=MappingProxyType({level: frozenset(roles) for level, roles in awards.items()})
+    )
+
+
+async def get_levels_config(server_id):
+    """
+    Получение настроек рейтинга участников сервера из кэша. Если их нет в кэше, они загружаются из базы данных
+
+    :param server_id: ID сервера
+    :type server_id: int
+    :return: настройки рейтинга или None, если на сервере нет рейтинга участников
+    :rtype: LevelsConfig or None
+    """
+
+    if server_id not in _configs:
+        metrics.count_cache("levels_config", hit=False)
+        await update_levels_config(server_id)
+    else:
+        metrics.count_cache("levels_config", hit=True)
+
+    return _configs[server_id]
+
+
+async def update_levels_config(server_id):
+    """
+    Пересоздание настроек рейтинга участников сервера в кэше. Вызывается после каждого изменения настроек
+
+    :param server_id: ID сервера
+    :type server_id: int
+    """
+
+    _configs[server_id] = await run(load_levels_config, server_id)
+
+
+async def edit_levels_settings(server_id, **values):
+    """
+    Изменение настроек рейтинга участников сервера в базе данных и обновление их в кэше
+
+    :param server_id: ID сервера
+    :type server_id: int
+    :param values: новые значения столбцов ServerSettingsOfLevels
+    """
+
+    await run(lambda session: session.query(ServerSettingsOfLevels).filter_by(server_id=server_id).update(values))
+    await update_levels_config(server_id)
+
+
+def remove_levels_config(server_id):
+    """
+    Удаление настроек рейтинга участников сервера из кэша
+
+    :param server_id: ID сервера
+    :type server_id: int
+    """
+
+    _configs.pop(server_id, None)
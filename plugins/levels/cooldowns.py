@@ -0,0 +1,103 @@
+import sys
+import time
+from collections import OrderedDict
+
+
+class ExperienceCooldowns:
+    """
+    Задержка между получениями опыта. Хранит только время последнего получения опыта для каждого участника
+
+    :param per: задержка в секундах
+    :param max_size: максимальное количество хранимых участников
+    """
+
+    def __init__(self, per, max_size):
+        self.per = per
+        self.max_size = max_size
+        # (ID сервера << 64) | ID пользователя -> время последнего получения опыта. Словарь упорядочен по времени, так
+        # как ключ переносится в конец только при получении опыта
+        self._last = OrderedDict()
+
+        self.swept = 0  # удалено записей с истёкшей задержкой
+        self.evicted = 0  # вытеснено записей из-за ограничения размера
+
+    @staticmethod
+    def _key(server_id, user_id):
+        return (server_id << 64) | user_id
+
+    def try_acquire(self, server_id, user_id, now=None):
+        """
+        Проверка задержки участника. Если задержка истекла, она начинается заново
+
+        :param server_id: ID сервера
+        :type server_id: int
+        :param user_id: ID пользователя
+        :type user_id: int
+        :param now: текущее время (time.monotonic)
+        :type now: float
+        :return: может ли участник получить опыт
+        :rtype: bool
+        """
+
+        if now is None:
+            now = time.monotonic()
+
+        key = self._key(server_id, user_id)
+        last = self._last.get(key)
+
+        if last is not None:
+            if now - last < self.per:
+                return False
+
+            self._last.move_to_end(key)
+        elif len(self._last) >= self.max_size:
+            self.sweep(now)
+
+            while len(self._last) >= self.max_size:
+                self._last.popitem(last=False)
+                self.evicted += 1
+
+        self._last[key] = now
+
+        return True
+
+    def sweep(self, now=None):
+        """
+        Удаление записей с истёкшей задержкой
+
+        :param now: текущее время (time.monotonic)
+        :type now: float
+        :return: количество удалённых записей
+        :rtype: int
+        """
+
+        if now is None:
+            now = time.monotonic()
+
+        removed = 0
+
+        # самые старые записи находятся в начале словаря
+        while self._last and now - next(iter(self._last.values())) >= self.per:
+            self._last.popitem(last=False)
+            removed += 1
+
+        self.swept += removed
+
+        return removed
+
+    def stats(self):
+        """
+        Состояние хранилища задержек
+
+        :return: словарь с количеством записей и примерным объёмом памяти
+        :rtype: dict
+        """
+
+        return {
+            "entries": len(self._last),
+            "max_size": self.max_size,
+            "swept": self.swept,
+            "evicted": self.evicted,
+            # словарь и ключи со значениями (ключ - 128-битное число, значение - float)
+            "memory_bytes": sys.getsizeof(self._last) + len(self._last) * (sys.getsizeof(1 << 127) + sys.getsizeof(0.0))
+        }
@@ -0,0 +1,67 @@
+import math
+from bisect import bisect_right
+
+MAX_LEVEL = 1000  # максимальный уровень, который можно поставить командой editlevel
+
+
+def _experience_for(level):
+    return 80 * level ** 2 + 20 * level
+
+
+# THRESHOLDS[n] - количество опыта, необходимого для получения n уровня
+THRESHOLDS = tuple(_experience_for(level) for level in range(MAX_LEVEL + 1))
+
+
+def get_experience(level):
+    """
+    Выдаёт количество опыта, необходимого для получения n уровня
+
+    :param level: n уровень
+    :type level: int
+    :return: кол-во опыта
+    :rtype: int
+    """
+
+    if level <= 0:
+        return 0
+    elif level <= MAX_LEVEL:
+        return THRESHOLDS[level]
+    else:
+        return _experience_for(level)
+
+
+def get_level(exp):
+    """
+    Выдаёт достигнутый уровень по количеству опыта
+
+    :param exp: количество опыта
+    :type exp: int
+    :return: уровень
+    :rtype: int
+    """
+
+    if exp < THRESHOLDS[-1]:
+        return max(bisect_right(THRESHOLDS, exp) - 1, 0)
+
+    # выше таблицы уровень вычисляется по формуле и уточняется целочисленной проверкой
+    level = int((math.sqrt(400 + 320 * exp) - 20) / 160)
+
+    while _experience_for(level + 1) <= exp:
+        level += 1
+    while _experience_for(level) > exp:
+        level -= 1
+
+    return level
+
+
+def get_levels(experiences):
+    """
+    Выдаёт достигнутые уровни для нескольких значений опыта
+
+    :param experiences: значения опыта
+    :type experiences: iterable
+    :return: уровни в том же порядке
+    :rtype: list
+    """
+
+    return [get_level(exp) for exp in experiences]
@@ -0,0 +1,87 @@
+from string import Template
+
+DEFAULT_LEVELUP_MESSAGE_FOR_SERVER = "$member_mention получил `$level уровень`"
+DEFAULT_LEVELUP_MESSAGE_FOR_DM = "Вы получили `$level уровень` на **$server_name**"
+
+# ключевое слово -> функция, вычисляющая его значение по данным о сообщении и достигнутому уровню
+PLACEHOLDERS = {
+    "member_name": lambda ctx, level: ctx.author.display_name,
+    "member_mention": lambda ctx, level: ctx.author.mention,
+    "server_name": lambda ctx, level: ctx.guild.name,
+    "level": lambda ctx, level: str(level)
+}
+
+
+class LevelupMessageError(ValueError):
+    """Ошибка в тексте сообщения о новом уровне"""
+
+
+class LevelupMessage:
+    """
+    Разобранный текст сообщения о новом уровне. Текст разбивается на части один раз, а при отправке вычисляются только
+    используемые ключевые слова
+
+    :param text: текст сообщения
+    :type text: str
+    :param strict: выдавать ли ошибку при неизвестных ключевых словах. Иначе они остаются в тексте как есть
+    :type strict: bool
+    :raises LevelupMessageError: если в тексте есть неизвестное ключевое слово
+    """
+
+    def __init__(self, text, strict=True):
+        self.text = text
+        self.segments = []  # части текста: строка или (ключевое слово,)
+
+        position = 0
+
+        for match in Template.pattern.finditer(text):
+            literal = text[position:match.start()]
+            position = match.end()
+
+            name = match.group("named") or match.group("braced")
+
+            if match.group("escaped") is not None or match.group("invalid") is not None:
+                # "$$" и одиночный "$" остаются в тексте знаком доллара
+                literal += "$"
+            elif name in PLACEHOLDERS:
+                self._add_literal(literal)
+                self.segments.append((name,))
+                continue
+            elif strict:
+                raise LevelupMessageError(f"Неизвестное ключевое слово: `{match.group()}`")
+            else:
+                literal += match.group()
+
+            self._add_literal(literal)
+
+        self._add_literal(text[position:])
+
+        self.placeholders = frozenset(s[0] for s in self.segments if isinstance(s, tuple))
+
+    def _add_literal(self, literal):
+        if not literal:
+            return
+
+        if self.segments and isinstance(self.segments[-1], str):
+            self.segments[-1] += literal
+        else:
+            self.segments.append(literal)
+
+    def render(self, ctx, level):
+        """
+        Форматировать сообщение
+
+        :param ctx: данные о сообщении (discord.Message или commands.Context)
+        :param level: достигнутый уровень
+        :type level: int
+        :return: форматированное сообщение
+        :rtype: str
+        """
+
+        values = {name: PLACEHOLDERS[name](ctx, level) for name in self.placeholders}
+
+        return "".join(s if isinstance(s, str) else values[s[0]] for s in self.segments)
+
+
+DEFAULT_LEVELUP_TEMPLATE_FOR_SERVER = LevelupMessage(DEFAULT_LEVELUP_MESSAGE_FOR_SERVER)
+DEFAULT_LEVELUP_TEMPLATE_FOR_DM = LevelupMessage(DEFAULT_LEVELUP_MESSAGE_FOR_DM)
@@ -1,145 +1,196 @@
 import discord
 import asyncio
-import datetime
+import logging
 import random
 import sqlalchemy
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import CommandError
-from discord.ext.commands import CooldownMapping, Cooldown
 
-from main import Session
+from core.app import (XP_FLUSH_INTERVAL, XP_COOLDOWN, XP_COOLDOWN_MAX_SIZE, LEVELUP_BATCH_WINDOW, LEVELUP_BATCH_SIZE,
+                      LEVELUP_DM_CONCURRENCY, CLEANUP_INTERVAL)
 from core.commands import Cog, Command
-from core.templates import ErrorMessage, SuccessfulMessage, DefaultEmbed as Embed
-from core.database import (UserLevel, ServerSettingsOfLevels, ServerAwardOfLevels, ServerIgnoreChannelsListOfLevels,
-                           ServerIgnoreRolesListOfLevels)
-
-from .utils import (level_system_is_on, get_level, get_experience, format_levelup_message,
-                    DEFAULT_LEVELUP_MESSAGE_FOR_SERVER, DEFAULT_LEVELUP_MESSAGE_FOR_DM)
+from core.metrics import metrics
+from core.storage import run
+from core.outbound import Priority, schedule
+from core.templates import SuccessfulMessage, DefaultEmbed as Embed
+from core.database import UserLevel, ServerAwardOfLevels
+
+from .accumulator import experience_accumulator
+from .announcements import LevelupAnnouncer
+from .cleanup import remove_stale_references
+from .cooldowns import ExperienceCooldowns
+from .config import get_levels_config, remove_levels_config
+from .reconcile import award_reconciler
+from .curve import MAX_LEVEL, get_level, get_levels, get_experience
+from .utils import level_system_is_on
+
+logger = logging.getLogger("ice_cube")
+
+TOP_PAGE_SIZE = 10  # количество участников на одной странице топа
+TOP_OVERFETCH = 5  # сколько строк запрашивается сверх страницы на случай, если участники покинули сервер
+
+
+def get_leaders(session, server_id, offset, limit):
+    """
+    Получение строк рейтинга сервера, отсортированных по убыванию опыта. Строки идут в порядке индекса
+    (server_id, experience DESC), поэтому запрос читает только offset + limit строк
+
+    :param session: сессия базы данных
+    :param server_id: ID сервера
+    :type server_id: int
+    :param offset: сколько строк пропустить с начала рейтинга
+    :type offset: int
+    :param limit: максимальное количество строк
+    :type limit: int
+    :return: список пар (ID пользователя, опыт)
+    :rtype: list
+    """
+
+    return session.query(UserLevel.user_id, UserLevel.experience).filter_by(
+        server_id=server_id
+    ).order_by(sqlalchemy.desc(UserLevel.experience), UserLevel.user_id).offset(offset).limit(limit).all()
+
+
+def get_position(session, server_id, experience):
+    """
+    Получение места в рейтинге сервера по количеству опыта. Подсчёт идёт по индексу (server_id, experience DESC)
+
+    :param session: сессия базы данных
+    :param server_id: ID сервера
+    :type server_id: int
+    :param experience: количество опыта
+    :type experience: int
+    :return: место в рейтинге, начиная с 1
+    :rtype: int
+    """
+
+    return session.query(sqlalchemy.func.count()).select_from(UserLevel).filter(
+        UserLevel.server_id == server_id,
+        UserLevel.experience > experience
+    ).scalar() + 1
 
 
 class Levels(Cog, name="Уровни"):
     def __init__(self, bot):
-        self._buckets = CooldownMapping(Cooldown(1, 60, commands.BucketType.member))
+        self.cooldowns = ExperienceCooldowns(XP_COOLDOWN, XP_COOLDOWN_MAX_SIZE)
+        self.announcer = LevelupAnnouncer(LEVELUP_BATCH_WINDOW, LEVELUP_BATCH_SIZE, LEVELUP_DM_CONCURRENCY)
         super().__init__(bot)
 
-    @commands.Cog.listener(name="on_message")
-    async def when_message(self, message):
-        context = await self.client.get_context(message)
-
-        if context.valid:
-            return
-
+        # размер хранилища задержек и количество удалённых записей попадают в экспорт метрик
+        for name in ("entries", "memory_bytes", "swept", "evicted"):
+            metrics.register_gauge(f"xp_cooldowns_{name}", lambda name=name: self.cooldowns.stats()[name])
+
+        self.flush_experience.start()
+        self.sweep_cooldowns.start()
+        self.sweep_stale_references.start()
+        award_reconciler.start(bot)
+
+    def cog_unload(self):
+        self.flush_experience.cancel()
+        self.sweep_cooldowns.cancel()
+        self.sweep_stale_references.cancel()
+        self.announcer.flush_all()
+        award_reconciler.stop()
+
+    @tasks.loop(seconds=XP_COOLDOWN)
+    async def sweep_cooldowns(self):
+        """Удаление истёкших задержек получения опыта"""
+        self.cooldowns.sweep()
+        logger.debug(f"Задержки получения опыта: {self.cooldowns.stats()}")
+
+    @tasks.loop(seconds=XP_FLUSH_INTERVAL)
+    async def flush_experience(self):
+        """Запись накопленного опыта участников в базу данных"""
+        await experience_accumulator.flush()
+
+    @flush_experience.after_loop
+    async def flush_experience_on_stop(self):
+        await experience_accumulator.flush()
+
+    @tasks.loop(seconds=CLEANUP_INTERVAL)
+    async def sweep_stale_references(self):
+        """Удаление из настроек рейтинга ссылок на роли и каналы, удалённые, пока бот был недоступен"""
+        for server in self.client.guilds:
+            try:
+                await remove_stale_references(server)
+            except Exception:
+                logger.exception(f"Не удалось удалить устаревшие настройки рейтинга на сервере {server.id}")
+
+    @sweep_stale_references.before_loop
+    async def wait_for_guilds(self):
+        await self.client.wait_until_ready()
+
+    @Cog.listener(name="on_guild_role_delete")
+    async def forget_deleted_role(self, role):
+        await remove_stale_references(role.guild)
+
+    @Cog.listener(name="on_guild_channel_delete")
+    async def forget_deleted_channel(self, channel):
+        await remove_stale_references(channel.guild)
+
+    @Cog.listener(name="on_ready")
+    async def resume_award_reconciliation(self):
+        await award_reconciler.resume()
+
+    @Cog.listener(name="on_guild_remove")
+    async def forget_server_config(self, server):
+        remove_levels_config(server.id)
+
+    @Cog.listener(name="on_non_command_message")
+    async def when_message(self, ctx):
+        message = ctx.message
         user = message.author
 
-        if user.bot or message.channel.type is discord.ChannelType.private:
+        if message.channel.type is discord.ChannelType.private:
             return
 
         server = message.guild
+        server_settings = await get_levels_config(server.id)
 
-        session = Session()
-        server_settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(server.id)).first()
-
-        if server_settings is not None:
-            ignored_channels = session.query(ServerIgnoreChannelsListOfLevels).filter_by(server_id=str(server.id)).all()
-
-            for ignored in ignored_channels:
-                channel = server.get_channel(int(ignored.channel_id))
+        if server_settings is None:
+            return
 
-                if channel is not None:
-                    if message.channel == channel:
-                        session.close()
-                        return
-                else:
-                    session.delete(ignored)
-                    session.commit()
+        if message.channel.id in server_settings.ignored_channels:
+            return
 
-            ignored_roles = session.query(ServerIgnoreRolesListOfLevels).filter_by(server_id=str(server.id)).all()
+        if any(role.id in server_settings.ignored_roles for role in user.roles):
+            return
 
-            for ignored in ignored_roles:
-                role = server.get_role(int(ignored.role_id))
+        if self.cooldowns.try_acquire(server.id, user.id):
+            add_exp = random.randint(15, 25)
+            before_exp, after_exp = await experience_accumulator.add_experience(server.id, user.id, add_exp)
 
-                if role is not None:
-                    if role in user.roles:
-                        session.close()
-                        return
-                else:
-                    session.delete(ignored)
-                    session.commit()
+            next_level = get_level(before_exp) + 1
 
-            if self._buckets.valid:
-                current = message.created_at.replace(tzinfo=datetime.timezone.utc).timestamp()
-                bucket = self._buckets.get_bucket(message, current)
-                retry_after = bucket.update_rate_limit(current)
+            if get_experience(next_level) <= after_exp and server_settings.notify_of_levelup:
+                roles = []
+                higher_bot_role = server.me.roles[-1]
 
-                if retry_after:
-                    session.close()
-                    return
+                # ссылки на удалённые роли и каналы удаляются при событиях их удаления, здесь они пропускаются
+                for role_id in server_settings.awards.get(next_level, ()):
+                    role = server.get_role(role_id)
 
-                db_kwargs = {
-                    "server_id": str(server.id),
-                    "user_id": str(user.id)
-                }
+                    if role is not None and role < higher_bot_role:
+                        roles.append(role)
 
-                user_db = session.query(UserLevel).filter_by(**db_kwargs).first()
+                if roles:
+                    schedule(("guild", server.id), Priority.roles, lambda: user.add_roles(*roles),
+                             key=("roles", server.id, user.id, next_level))
 
-                add_exp = random.randint(15, 25)
+                text = server_settings.levelup_template.render(message, next_level)
 
-                if user_db is None:
-                    user_db = UserLevel(**db_kwargs, experience=add_exp)
-                    before_exp = 0
-                    session.add(user_db)
+                if server_settings.levelup_message_dm:
+                    self.announcer.announce_dm(user, text)
                 else:
-                    before_exp = user_db.experience
-                    user_db.experience += add_exp
-                session.commit()
-
-                next_level = get_level(before_exp) + 1
-
-                if get_experience(next_level) <= user_db.experience and server_settings.notify_of_levelup:
-                    del db_kwargs["user_id"]
-                    awards = session.query(ServerAwardOfLevels).filter_by(**db_kwargs, level=next_level).all()
+                    channel = None
 
-                    roles = []
+                    if server_settings.levelup_message_channel_id is not None:
+                        channel = message.guild.get_channel(server_settings.levelup_message_channel_id)
 
-                    if awards is not None:
-                        higher_bot_role = server.me.roles[-1]
+                    if channel is None:
+                        channel = message.channel
 
-                        for award in awards:
-                            role = server.get_role(int(award.role_id))
-
-                            if role is None:
-                                session.delete(award)
-                                session.commit()
-                            elif role < higher_bot_role:
-                                roles.append(role)
-
-                    await user.add_roles(*roles)
-
-                    if server_settings.levelup_message is not None:
-                        text = server_settings.levelup_message
-                    else:
-                        if server_settings.levelup_message_dm:
-                            text = DEFAULT_LEVELUP_MESSAGE_FOR_DM
-                        else:
-                            text = DEFAULT_LEVELUP_MESSAGE_FOR_SERVER
-
-                    if server_settings.levelup_message_dm:
-                        channel = user
-                    else:
-                        if server_settings.levelup_message_channel_id is None:
-                            channel = message.channel
-                        else:
-                            channel = message.guild.get_channel(int(server_settings.levelup_message_channel_id))
-
-                            if channel is None:
-                                server_settings.levelup_message_channel_id = None
-                                session.commit()
-
-                                channel = message.channel
-
-                    await channel.send(format_levelup_message(text, message, next_level))
-
-        session.close()
+                    self.announcer.announce(channel, text)
 
     @commands.command(
         cls=Command, name="rank",
@@ -156,20 +207,25 @@ class Levels(Cog, name="Уровни"):
 
         server = ctx.guild
 
-        session = Session()
-        user_db = session.query(UserLevel).filter_by(server_id=str(server.id), user_id=str(user.id)).first()
-        session.close()
+        experience = await experience_accumulator.get_experience(server.id, user.id)
 
-        if user_db is None:
+        if experience is None:
             if user == ctx.author:
                 raise CommandError("Вы ещё не числитесь в рейтинге участников")
             else:
                 raise CommandError("Этот пользователь ещё не числится в рейтинге участников")
 
-        experience = user_db.experience
         level = get_level(experience)
 
+        # накопленный опыт записывается в базу данных, чтобы место в рейтинге было актуальным
+        await experience_accumulator.flush()
+        position = await run(get_position, server.id, experience)
+
         message = Embed()
+        message.add_field(
+            name="Место",
+            value=f"#{position}"
+        )
         message.add_field(
             name="Уровень",
             value=str(level)
@@ -199,68 +255,109 @@ class Levels(Cog, name="Уровни"):
 
         server = ctx.guild
 
-        session = Session()
-        users = session.query(UserLevel).filter_by(
-            server_id=str(server.id)
-        ).order_by(sqlalchemy.desc(UserLevel.experience)).all()
-        session.close()
+        await experience_accumulator.flush()
 
-        top = []
+        # страница -> строка рейтинга, с которой она начинается. Участники, покинувшие сервер, пропускаются,
+        # поэтому следующая страница начинается там, где закончилась предыдущая
+        page_offsets = {page: TOP_PAGE_SIZE * (page - 1)} if page > 1 else {1: 0}
 
-        for user_from_db in users:
-            user = server.get_member(int(user_from_db.user_id))
+        # участники страницы (место, участник, опыт) и есть ли участники после неё
+        async def get_page(number):
+            offset = page_offsets.get(number)
 
-            if user is None:
-                continue
-            else:
-                top.append((user, user_from_db.experience))
+            if offset is None:
+                offset = max(page_offsets[number + 1] - TOP_PAGE_SIZE, 0)
+                page_offsets[number] = offset
 
-        if not top:
-            raise CommandError("Никто из пользователь на сервере ещё не получил опыт")
-        else:
-            top = list(enumerate(top, 1))
+            rows = []  # все прочитанные строки, включая покинувших сервер, нужны для подсчёта мест
+            leaders = []
+            has_next = False
+
+            while True:
+                limit = TOP_PAGE_SIZE + 1 - len(leaders) + TOP_OVERFETCH
+                batch = await run(get_leaders, server.id, offset + len(rows), limit)
 
-        max_page = len(top) // 10 + (1 if len(top) % 10 > 0 else 0)
+                for user_id, experience in batch:
+                    user = server.get_member(user_id)
 
-        if page > max_page:
-            current_page = 1
-        else:
-            current_page = page
+                    if user is None:
+                        rows.append(experience)
+                        continue
+
+                    # первый участник после страницы показывает, что следующая страница есть
+                    if len(leaders) == TOP_PAGE_SIZE:
+                        has_next = True
+                        page_offsets[number + 1] = offset + len(rows)
+                        break
+
+                    leaders.append((user, experience))
+                    rows.append(experience)
+
+                if has_next or len(batch) < limit:
+                    break
+
+            if not leaders:
+                return [], False
+
+            # место - количество строк с большим опытом: до страницы считается по индексу, на странице - по строкам
+            above = await run(get_position, server.id, rows[0]) - 1
+            first_with = {}
 
-        def get_page():
+            for index, experience in enumerate(rows):
+                first_with.setdefault(experience, index)
+
+            return [
+                (above + first_with[experience] + 1, user, experience) for user, experience in leaders
+            ], has_next
+
+        def render(leaders):
             template = "**#{}:** `{}`\nУровень: {} | Опыт: {}"
 
-            return "\n".join(map(
-                lambda u: template.format(u[0], u[1][0].display_name, get_level(u[1][1]), u[1][1]),
-                top[10 * (current_page - 1):10 * current_page]
-            ))
+            levels = get_levels(experience for _, _, experience in leaders)
+
+            return "\n".join(
+                template.format(position, user.display_name, level, experience)
+                for (position, user, experience), level in zip(leaders, levels)
+            )
+
+        current_page = page if page > 1 else 1
+        leaders, has_next = await get_page(current_page)
+
+        # если указанной страницы нет, показывается первая
+        if not leaders and current_page != 1:
+            current_page = 1
+            page_offsets = {1: 0}
+            leaders, has_next = await get_page(current_page)
+
+        if not leaders:
+            raise CommandError("Никто из пользователь на сервере ещё не получил опыт")
 
         embed = Embed(
             title="Топ пользователей на сервере",
-            description=get_page()
+            description=render(leaders)
         )
-        if max_page > 1:
-            embed.set_footer(text=f"Стр. {current_page} из {max_page}")
+
+        if current_page > 1 or has_next:
+            embed.set_footer(text=f"Стр. {current_page}")
 
         message = await ctx.send(embed=embed)
-        
-        if max_page > 1:
+
+        if current_page > 1 or has_next:
             emojis = {
                 "previous": "⬅️",
                 "next": "➡️"
             }
-    
+
             for e in emojis.values():
                 await message.add_reaction(e)
-    
+
             def check(react, user):
-                if max_page <= current_page and 1 < current_page:
-                    return ctx.author == user and str(react) == emojis["previous"]
-                elif 1 >= current_page and max_page > current_page:
-                    return ctx.author == user and str(react) == emojis["next"]
-                elif 1 < current_page < max_page:
-                    return ctx.author == user and str(react) in emojis.values()
-    
+                if ctx.author != user:
+                    return False
+
+                return str(react) == emojis["previous"] and current_page > 1 or \
+                    str(react) == emojis["next"] and has_next
+
             while True:
                 try:
                     reaction, _ = await self.client.wait_for('reaction_add', timeout=60.0, check=check)
@@ -268,16 +365,21 @@ class Levels(Cog, name="Уровни"):
                     await message.clear_reactions()
                     return
                 else:
-                    if str(reaction) == emojis["next"]:
-                        await message.remove_reaction(reaction, ctx.author)
-                        current_page += 1
-                    elif str(reaction) == emojis["previous"]:
-                        await message.remove_reaction(reaction, ctx.author)
-                        current_page -= 1
-    
-                    embed.description = get_page()
-                    embed.set_footer(text=f"Стр. {current_page} из {max_page}")
-    
+                    await message.remove_reaction(reaction, ctx.author)
+
+                    new_page = current_page + 1 if str(reaction) == emojis["next"] else current_page - 1
+                    new_leaders, new_has_next = await get_page(new_page)
+
+                    # участники следующей страницы могли покинуть сервер, тогда страница остаётся прежней
+                    if not new_leaders:
+                        has_next = False
+                        continue
+
+                    current_page, leaders, has_next = new_page, new_leaders, new_has_next
+
+                    embed.description = render(leaders)
+                    embed.set_footer(text=f"Стр. {current_page}")
+
                     await message.edit(embed=embed)
 
     @commands.command(
@@ -298,32 +400,21 @@ class Levels(Cog, name="Уровни"):
         if user is None:
             user = ctx.author
 
-        if level > 1000:
-            raise CommandError("Вы не можете поставить уровень больше 1000-го")
+        if level > MAX_LEVEL:
+            raise CommandError(f"Вы не можете поставить уровень больше {MAX_LEVEL}-го")
         elif level < 0:
             raise CommandError("Вы не можете поставить уровень меньше нуля")
 
         server = ctx.guild
 
-        session = Session()
-        db_kwargs = {
-            "server_id": str(server.id),
-            "user_id": str(user.id)
-        }
-        user_level = session.query(UserLevel).filter_by(**db_kwargs).first()
-
-        if user_level is None:
-            user_level = UserLevel(**db_kwargs)
-            session.add(user_level)
-
-        lvl_user = get_level(user_level.experience)
+        lvl_user = get_level(await experience_accumulator.get_experience(server.id, user.id) or 0)
 
         if lvl_user < level:
-            awards = session.query(ServerAwardOfLevels).filter(
-                ServerAwardOfLevels.server_id == str(server.id),
+            awards = await run(lambda session: session.query(ServerAwardOfLevels).filter(
+                ServerAwardOfLevels.server_id == server.id,
                 ServerAwardOfLevels.level < level,
                 ServerAwardOfLevels.level > lvl_user
-            ).all()
+            ).all())
 
             roles = []
 
@@ -331,21 +422,18 @@ class Levels(Cog, name="Уровни"):
                 higher_bot_role = server.me.roles[-1]
 
                 for award in awards:
-                    role = server.get_role(int(award.role_id))
+                    role = server.get_role(award.role_id)
 
-                    if role is None:
-                        session.delete(award)
-                        session.commit()
-                    elif role < higher_bot_role:
+                    if role is not None and role < higher_bot_role:
                         roles.append(role)
 
             await user.add_roles(*roles)
         else:
-            awards = session.query(ServerAwardOfLevels).filter(
-                ServerAwardOfLevels.server_id == str(server.id),
+            awards = await run(lambda session: session.query(ServerAwardOfLevels).filter(
+                ServerAwardOfLevels.server_id == server.id,
                 ServerAwardOfLevels.level > level,
                 ServerAwardOfLevels.level < lvl_user
-            ).all()
+            ).all())
 
             roles = []
 
@@ -353,19 +441,14 @@ class Levels(Cog, name="Уровни"):
                 higher_bot_role = server.me.roles[-1]
 
                 for award in awards:
-                    role = server.get_role(int(award.role_id))
+                    role = server.get_role(award.role_id)
 
-                    if role is None:
-                        session.delete(award)
-                        session.commit()
-                    elif role < higher_bot_role:
+                    if role is not None and role < higher_bot_role:
                         roles.append(role)
 
             await user.remove_roles(*roles)
 
-        user_level.experience = get_experience(level)
-        session.commit()
-        session.close()
+        await experience_accumulator.set_experience(server.id, user.id, get_experience(level))
 
         if user == ctx.author:
             await ctx.send(embed=SuccessfulMessage(f"Вы поставили себе `{level} уровень`"))
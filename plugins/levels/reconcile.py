@@ -0,0 +1,227 @@
+import asyncio
+import discord
+import logging
+
+from core.app import RECONCILE_BATCH_SIZE
+from core.database import UserLevel, ServerAwardReconciliationOfLevels
+from core.outbound import Priority, RequestDropped, request
+from core.storage import run
+
+from .accumulator import experience_accumulator
+from .config import get_levels_config
+from .curve import get_level
+
+logger = logging.getLogger("ice_cube")
+
+
+def get_members_batch(session, server_id, after_user_id, limit):
+    """
+    Получение участников рейтинга сервера по порядку ID
+
+    :param session: сессия базы данных
+    :param server_id: ID сервера
+    :type server_id: int
+    :param after_user_id: ID пользователя, после которого начинается выборка
+    :type after_user_id: int
+    :param limit: максимальное количество участников
+    :type limit: int
+    :return: список пар (ID пользователя, опыт)
+    :rtype: list
+    """
+
+    return session.query(UserLevel.user_id, UserLevel.experience).filter(
+        UserLevel.server_id == server_id,
+        UserLevel.user_id > after_user_id
+    ).order_by(UserLevel.user_id).limit(limit).all()
+
+
+class AwardReconciler:
+    """
+    Фоновая выдача ролей за уровни участникам, которые должны их иметь, но не имеют (например, после добавления новой
+    награды). Сервера обрабатываются по очереди пачками участников, а прогресс сохраняется в базе данных, чтобы
+    продолжить обработку после перезапуска бота
+
+    :param batch_size: количество участников, загружаемых из базы данных за раз
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+        self._client = None
+        self._queue = None
+        self._worker = None
+        self._queued = set()  # ID серверов в очереди
+        self._current = None  # ID обрабатываемого сервера
+        self._restarts = set()  # ID серверов, обработку которых нужно начать сначала
+
+        self.granted = 0  # выданные роли
+        self.failed = 0  # роли, которые не удалось выдать
+
+    def start(self, client):
+        """
+        Запуск обработки очереди серверов
+
+        :param client: бот
+        """
+
+        self._client = client
+
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._work())
+
+    def stop(self):
+        """
+        Остановка обработки очереди. Прогресс сохранён в базе данных
+        """
+
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    async def resume(self):
+        """
+        Добавление в очередь серверов, обработка которых не была закончена
+        """
+
+        server_ids = await run(lambda session: [
+            server_id for server_id, in session.query(ServerAwardReconciliationOfLevels.server_id).all()
+        ])
+
+        for server_id in server_ids:
+            self._enqueue(server_id)
+
+    async def reconcile(self, server_id):
+        """
+        Запуск обработки сервера с самого начала
+
+        :param server_id: ID сервера
+        :type server_id: int
+        """
+
+        await run(lambda session: session.merge(ServerAwardReconciliationOfLevels(server_id=server_id, last_user_id=0)))
+
+        if server_id == self._current:
+            self._restarts.add(server_id)
+        else:
+            self._enqueue(server_id)
+
+    def _enqueue(self, server_id):
+        if server_id not in self._queued and server_id != self._current:
+            self._queued.add(server_id)
+            self._queue.put_nowait(server_id)
+
+    async def _work(self):
+        while True:
+            server_id = await self._queue.get()
+            self._queued.discard(server_id)
+            self._current = server_id
+
+            try:
+                await self._reconcile_server(server_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Не удалось выдать роли за уровни на сервере {server_id}")
+            finally:
+                self._current = None
+                self._restarts.discard(server_id)
+
+    async def _reconcile_server(self, server_id):
+        server = self._client.get_guild(server_id)
+        checkpoint = await run(lambda session: session.query(ServerAwardReconciliationOfLevels).get(server_id))
+
+        if server is not None and checkpoint is not None:
+            # опыт, накопленный в памяти, должен учитываться при выборке
+            await experience_accumulator.flush()
+
+            last_user_id = checkpoint.last_user_id
+
+            while True:
+                if server_id in self._restarts:
+                    self._restarts.discard(server_id)
+                    last_user_id = 0
+
+                config = await get_levels_config(server_id)
+
+                if config is None or not config.awards:
+                    break
+
+                rows = await run(get_members_batch, server_id, last_user_id, self.batch_size)
+
+                if not rows:
+                    break
+
+                higher_bot_role = server.me.roles[-1]
+                awards = []
+
+                for level, role_ids in config.awards.items():
+                    for role_id in role_ids:
+                        role = server.get_role(role_id)
+
+                        if role is not None and role < higher_bot_role:
+                            awards.append((level, role))
+
+                for user_id, experience in rows:
+                    member = server.get_member(user_id)
+
+                    if member is None:
+                        continue
+
+                    level = get_level(experience)
+                    held = {role.id for role in member.roles}
+                    missing = [role for award_level, role in awards if award_level <= level and role.id not in held]
+
+                    if missing:
+                        await self._grant(member, missing)
+
+                last_user_id = rows[-1].user_id
+
+                await run(lambda session: session.query(ServerAwardReconciliationOfLevels).filter_by(
+                    server_id=server_id
+                ).update({"last_user_id": last_user_id}))
+
+        # обработка сервера могла быть запрошена заново, пока шла текущая обработка
+        if server_id in self._restarts:
+            self._restarts.discard(server_id)
+            self._current = None
+            self._enqueue(server_id)
+        else:
+            await run(lambda session: session.query(ServerAwardReconciliationOfLevels).filter_by(
+                server_id=server_id
+            ).delete())
+
+    async def _grant(self, member, roles):
+        while True:
+            try:
+                await request(("guild", member.guild.id), Priority.roles, lambda: member.add_roles(*roles))
+            except RequestDropped:
+                # очередь сервера переполнена, ждём её освобождения
+                await asyncio.sleep(1)
+            except discord.HTTPException:
+                self.failed += len(roles)
+                logger.warning(f"Не удалось выдать роли за уровни участнику {member.id} на сервере {member.guild.id}")
+                return
+            else:
+                self.granted += len(roles)
+                return
+
+    def stats(self):
+        """
+        Состояние выдачи ролей за уровни
+
+        :return: словарь с количеством серверов в очереди и выданных ролей
+        :rtype: dict
+        """
+
+        return {
+            "queued": len(self._queued),
+            "current": self._current,
+            "granted": self.granted,
+            "failed": self.failed
+        }
+
+
+award_reconciler = AwardReconciler(RECONCILE_BATCH_SIZE)
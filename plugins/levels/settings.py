@@ -2,142 +2,102 @@ import random
 from discord.ext import commands
 from discord.ext.commands import CommandError
 
-from main import Session
 from core.commands import Cog, Group, Command
+from core.storage import run, unit_of_work
+from core.purge import get_purger
 from core.templates import SuccessfulMessage, DefaultEmbed as Embed, send_message_with_reaction_choice
-from core.database import (UserLevel, ServerSettingsOfLevels, ServerAwardOfLevels, ServerIgnoreChannelsListOfLevels,
+from core.database import (ServerSettingsOfLevels, ServerAwardOfLevels, ServerIgnoreChannelsListOfLevels,
                            ServerIgnoreRolesListOfLevels)
 
-from .utils import (format_levelup_message, level_system_is_enabled, level_system_is_on,
-                    DEFAULT_LEVELUP_MESSAGE_FOR_SERVER, DEFAULT_LEVELUP_MESSAGE_FOR_DM)
+from .accumulator import experience_accumulator
+from .config import get_levels_config, update_levels_config, edit_levels_settings
+from .reconcile import award_reconciler
+from .message import LevelupMessage, LevelupMessageError
+from .utils import level_system_is_enabled, level_system_is_on
 
 
 def level_system_is_off():
-    def predicate(ctx):
-        session = Session()
-        is_off = not level_system_is_enabled(session, ctx)
-        session.close()
-
-        return is_off
+    async def predicate(ctx):
+        return not await level_system_is_enabled(ctx)
 
     return commands.check(predicate)
 
 
-def notify_of_levelup_is_enabled(session, ctx):
-    settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
+async def notify_of_levelup_is_enabled(ctx):
+    config = await get_levels_config(ctx.guild.id)
 
-    return settings.notify_of_levelup if settings is not None else False
+    return config.notify_of_levelup if config is not None else False
 
 
 def notify_of_levelup_is_on():
-    def predicate(ctx):
-        session = Session()
-        if not level_system_is_enabled(session, ctx):
-            session.close()
-            return False
-        is_on = notify_of_levelup_is_enabled(session, ctx)
-        session.close()
-
-        return is_on
+    async def predicate(ctx):
+        return await notify_of_levelup_is_enabled(ctx)
 
     return commands.check(predicate)
 
 
 def notify_of_levelup_is_off():
-    def predicate(ctx):
-        session = Session()
-        if not level_system_is_enabled(session, ctx):
-            session.close()
-            return False
-        is_off = not notify_of_levelup_is_enabled(session, ctx)
-        session.close()
-
-        return is_off
+    async def predicate(ctx):
+        return await level_system_is_enabled(ctx) and not await notify_of_levelup_is_enabled(ctx)
 
     return commands.check(predicate)
 
 
 def levelup_message_is_custom():
-    def predicate(ctx):
-        session = Session()
-        if not (level_system_is_enabled(session, ctx) and notify_of_levelup_is_enabled(session, ctx)):
-            session.close()
+    async def predicate(ctx):
+        if not await notify_of_levelup_is_enabled(ctx):
             return False
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        session.close()
 
-        return settings.levelup_message is not None if settings is not None else False
+        return (await get_levels_config(ctx.guild.id)).levelup_message is not None
 
     return commands.check(predicate)
 
 
 def levelup_message_destination_is_not_dm():
-    def predicate(ctx):
-        session = Session()
-        if not (level_system_is_enabled(session, ctx) and notify_of_levelup_is_enabled(session, ctx)):
-            session.close()
+    async def predicate(ctx):
+        if not await notify_of_levelup_is_enabled(ctx):
             return False
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        session.close()
 
-        return not settings.levelup_message_dm if settings is not None else False
+        return not (await get_levels_config(ctx.guild.id)).levelup_message_dm
 
     return commands.check(predicate)
 
 
 def levelup_message_destination_is_not_current():
-    def predicate(ctx):
-        session = Session()
-        if not level_system_is_enabled(session, ctx) or not notify_of_levelup_is_enabled(session, ctx):
-            session.close()
+    async def predicate(ctx):
+        if not await notify_of_levelup_is_enabled(ctx):
             return False
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        session.close()
 
-        return settings.levelup_message_channel_id is not None or settings.levelup_message_dm \
-            if settings is not None else False
+        config = await get_levels_config(ctx.guild.id)
+
+        return config.levelup_message_channel_id is not None or config.levelup_message_dm
 
     return commands.check(predicate)
 
 
 def level_awards_exist():
-    def predicate(ctx):
-        session = Session()
-        if not level_system_is_enabled(session, ctx):
-            session.close()
-            return False
-        award = session.query(ServerAwardOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        session.close()
+    async def predicate(ctx):
+        config = await get_levels_config(ctx.guild.id)
 
-        return award is not None
+        return config is not None and len(config.awards) != 0
 
     return commands.check(predicate)
 
 
 def channels_in_ignore_list_exist():
-    def predicate(ctx):
-        session = Session()
-        if not level_system_is_enabled(session, ctx):
-            session.close()
-            return False
-        ignored = session.query(ServerIgnoreChannelsListOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        session.close()
+    async def predicate(ctx):
+        config = await get_levels_config(ctx.guild.id)
 
-        return ignored is not None
+        return config is not None and len(config.ignored_channels) != 0
 
     return commands.check(predicate)
 
 
 def roles_in_ignore_list_exist():
-    def predicate(ctx):
-        session = Session()
-        if not level_system_is_enabled(session, ctx):
-            session.close()
-            return False
-        ignored = session.query(ServerIgnoreRolesListOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        session.close()
+    async def predicate(ctx):
+        config = await get_levels_config(ctx.guild.id)
 
-        return ignored is not None
+        return config is not None and len(config.ignored_roles) != 0
 
     return commands.check(predicate)
 
@@ -154,15 +114,13 @@ class LevelsSettings(Cog, name="Настройки"):
             title="Настройка рейтинга участников",
         )
 
-        session = Session()
-        if level_system_is_enabled(session, ctx):
+        if await level_system_is_enabled(ctx):
             embed.description = f"**На сервере включён рейтинг участников**\n\n" \
                                 f"Используйте команду `{ctx.prefix}help setlevels`, чтобы узнать о настройках\n" \
                                 f"Если вы хотите выключить это, используйте команду `{ctx.prefix}setlevels disable`"
         else:
             embed.description = f"**На сервере нет рейтинга участников.**\n\n" \
                                 f"Чтобы включить это, используйте команду `{ctx.prefix}setlevels enable`"
-        session.close()
 
         await ctx.send(embed=embed)
 
@@ -174,10 +132,14 @@ class LevelsSettings(Cog, name="Настройки"):
         Включить рейтинг участников на сервере
         """
 
-        session = Session()
-        session.add(ServerSettingsOfLevels(server_id=str(ctx.guild.id)))
-        session.commit()
-        session.close()
+        deleted = get_purger().progress(ctx.guild.id, "levels")
+
+        if deleted is not None:
+            raise CommandError(f"Данные прошлого рейтинга участников ещё удаляются (удалено записей: {deleted}). "
+                               f"Попробуйте включить рейтинг позже")
+
+        await run(lambda session: session.add(ServerSettingsOfLevels(server_id=ctx.guild.id)))
+        await update_levels_config(ctx.guild.id)
 
         message = SuccessfulMessage(f"Вы включили рейтинг участников на сервере.\n"
                                     f"Используйте команду `{ctx.prefix}help setlevels`, чтобы узнать о "
@@ -195,12 +157,6 @@ class LevelsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        db_kwargs = {
-            "server_id": str(server.id)
-        }
-        server_settings = session.query(ServerSettingsOfLevels).filter_by(**db_kwargs).first()
-
         emojis = {
             "accept": "✅",
             "cancel": "🚫"
@@ -216,16 +172,17 @@ class LevelsSettings(Cog, name="Настройки"):
         message, answer = await send_message_with_reaction_choice(self.client, ctx, embed, emojis)
 
         if answer == "accept":
-            session.delete(server_settings)
-            session.query(UserLevel).filter_by(**db_kwargs).delete()
-            session.commit()
+            # рейтинг выключается сразу, а остальные данные удаляются в фоне
+            await run(lambda session: session.query(ServerSettingsOfLevels).filter_by(server_id=server.id).delete())
+            await get_purger().purge(server.id, "levels")
+
+            experience_accumulator.forget_server(server.id)
+            await update_levels_config(server.id)
 
             await message.edit(embed=SuccessfulMessage("Вы выключили рейтинг участников на сервере"))
         elif answer == "cancel":
             await message.edit(embed=SuccessfulMessage("Вы отменили выключение рейтинга участников"))
 
-        session.close()
-
     @levels_settings.group(name="message", invoke_without_command=True)
     @commands.has_permissions(administrator=True)
     @level_system_is_on()
@@ -235,10 +192,7 @@ class LevelsSettings(Cog, name="Настройки"):
         """
 
         server = ctx.guild
-
-        session = Session()
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(server.id)).first()
-        session.close()
+        settings = await get_levels_config(server.id)
 
         if not settings.notify_of_levelup:
             where_sends = "**Оповещение о новом уровне выключено**\n" \
@@ -250,12 +204,9 @@ class LevelsSettings(Cog, name="Настройки"):
                 if settings.levelup_message_channel_id is None:
                     channel = None
                 else:
-                    channel = server.get_channel(int(settings.levelup_message_channel_id))
+                    channel = server.get_channel(settings.levelup_message_channel_id)
 
                 if channel is None:
-                    settings.levelup_message_channel_id = None
-                    session.commit()
-
                     where_sends = f"**Данное сообщение присылается в том же канеле, где пользователь получил новый " \
                                   f"уровень**"
                 else:
@@ -267,14 +218,8 @@ class LevelsSettings(Cog, name="Настройки"):
                            f"`{ctx.prefix}help setlevels message send`\n"
 
         if settings.levelup_message is None:
-            if settings.levelup_message_dm:
-                text = DEFAULT_LEVELUP_MESSAGE_FOR_DM
-            else:
-                text = DEFAULT_LEVELUP_MESSAGE_FOR_SERVER
-
             edit_info = "Вы можете изменить это сообщение с помощью команды `>setlevels message edit`. "
         else:
-            text = settings.levelup_message
             edit_info = "Вы можете изменить это сообщение с помощью команды `>setlevels message edit` или " \
                         "сбросить на стандартное сообщение с помощью команды `>setlevels message edit default`. "
 
@@ -288,7 +233,7 @@ class LevelsSettings(Cog, name="Настройки"):
 
         embed = Embed(
             title="Сообщение при получении нового уровня",
-            description=format_levelup_message(text, ctx, random.randint(1, 50))
+            description=settings.levelup_template.render(ctx, random.randint(1, 50))
         )
         embed.add_field(
             name="Где отправляется это сообщение?",
@@ -310,11 +255,7 @@ class LevelsSettings(Cog, name="Настройки"):
         Включить оповещение о новом уровне пользователя
         """
 
-        session = Session()
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        settings.notify_of_levelup = True
-        session.commit()
-        session.close()
+        await edit_levels_settings(ctx.guild.id, notify_of_levelup=True)
 
         await ctx.send(embed=SuccessfulMessage("Вы включили оповещение о новом уровне пользователя"))
 
@@ -326,11 +267,7 @@ class LevelsSettings(Cog, name="Настройки"):
         Выключить оповещение о новом уровне пользователя
         """
 
-        session = Session()
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        settings.notify_of_levelup = False
-        session.commit()
-        session.close()
+        await edit_levels_settings(ctx.guild.id, notify_of_levelup=False)
 
         await ctx.send(embed=SuccessfulMessage("Вы выключили оповещение о новом уровне пользователя"))
 
@@ -345,18 +282,17 @@ class LevelsSettings(Cog, name="Настройки"):
         Редактировать текст сообщения
         """
 
-        session = Session()
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-
         if text is None:
             raise CommandError("Вы не ввели текст")
         elif len(text) > 256:
             raise CommandError("Вы не можете поставить текст больше 256 символов")
-        else:
-            settings.levelup_message = text
 
-        session.commit()
-        session.close()
+        try:
+            LevelupMessage(text)
+        except LevelupMessageError as e:
+            raise CommandError(str(e))
+
+        await edit_levels_settings(ctx.guild.id, levelup_message=text)
 
         await ctx.send(embed=SuccessfulMessage("Вы изменили текст сообщения"))
 
@@ -368,11 +304,7 @@ class LevelsSettings(Cog, name="Настройки"):
         Сбросить текст сообщения по умолчанию
         """
 
-        session = Session()
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(ctx.guild.id)).first()
-        settings.levelup_message = None
-        session.commit()
-        session.close()
+        await edit_levels_settings(ctx.guild.id, levelup_message=None)
 
         await ctx.send(embed=SuccessfulMessage("Вы сбросили текст сообщения"))
 
@@ -396,23 +328,16 @@ class LevelsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(server.id)).first()
+        settings = await get_levels_config(server.id)
 
-        if not settings.levelup_message_dm and settings.levelup_message_channel_id is not None and \
-                channel.id == int(settings.levelup_message_channel_id):
-            session.close()
+        if not settings.levelup_message_dm and channel.id == settings.levelup_message_channel_id:
             raise CommandError("В данном канале уже и так присылаются сообщения о новом уровне")
         else:
-            settings.levelup_message_dm = False
-            settings.levelup_message_channel_id = str(channel.id)
-            session.commit()
+            await edit_levels_settings(server.id, levelup_message_dm=False, levelup_message_channel_id=channel.id)
 
             await ctx.send(embed=SuccessfulMessage(f"Теперь сообщения о новом уровне будут присылаться в "
                                                    f"{channel.mention}"))
 
-        session.close()
-
     @edit_levelup_message_destination.command(name="dm")
     @commands.has_permissions(administrator=True)
     @levelup_message_destination_is_not_dm()
@@ -423,12 +348,7 @@ class LevelsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(server.id)).first()
-        settings.levelup_message_dm = True
-        settings.levelup_message_channel_id = None
-        session.commit()
-        session.close()
+        await edit_levels_settings(server.id, levelup_message_dm=True, levelup_message_channel_id=None)
 
         await ctx.send(embed=SuccessfulMessage("Теперь сообщения о новом уровне будут присылаться в ЛС "
                                                "пользователю"))
@@ -443,12 +363,7 @@ class LevelsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        settings = session.query(ServerSettingsOfLevels).filter_by(server_id=str(server.id)).first()
-        settings.levelup_message_dm = False
-        settings.levelup_message_channel_id = None
-        session.commit()
-        session.close()
+        await edit_levels_settings(server.id, levelup_message_dm=False, levelup_message_channel_id=None)
 
         await ctx.send(embed=SuccessfulMessage("Теперь сообщения о новом уровне будут присылаться в том же канале "
                                                "где пользователь достиг нового уровня"))
@@ -463,9 +378,7 @@ class LevelsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        awards = session.query(ServerAwardOfLevels).filter_by(server_id=str(server.id)).all()
-        session.close()
+        awards = await run(lambda session: session.query(ServerAwardOfLevels).filter_by(server_id=server.id).all())
 
         higher_bot_role = server.me.roles[-1]
 
@@ -473,11 +386,9 @@ class LevelsSettings(Cog, name="Настройки"):
         unavailable_awards = []
 
         for award in awards:
-            role = server.get_role(int(award.role_id))
+            role = server.get_role(award.role_id)
 
             if role is None:
-                session.delete(award)
-                session.commit()
                 continue
 
             if role > higher_bot_role:
@@ -536,35 +447,33 @@ class LevelsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
         db_kwargs = {
-            "server_id": str(server.id),
-            "role_id": str(role.id)
+            "server_id": server.id,
+            "role_id": role.id
         }
-        award = session.query(ServerAwardOfLevels).filter_by(**db_kwargs).first()
-
         higher_bot_role = server.me.roles[-1]
 
-        if award is not None:
-            session.close()
-            raise CommandError("Эта роль уже используется в качестве награды.\n"
-                               "Используйте `.setlevels award edit`, если вы хотите изменить её")
-        elif higher_bot_role < role:
-            session.close()
-            raise CommandError("Данная роль выше роли бота. Вы должны поставить роль бота выше, чем эта роль, чтобы "
-                               "бот смог выдавать эту роль другим пользователям")
-        else:
-            if level is None:
-                session.close()
+        # проверка и добавление награды выполняются в одной транзакции
+        async with unit_of_work() as uow:
+            award = await uow.run(lambda session: session.query(ServerAwardOfLevels).filter_by(**db_kwargs).first())
+
+            if award is not None:
+                raise CommandError("Эта роль уже используется в качестве награды.\n"
+                                   "Используйте `.setlevels award edit`, если вы хотите изменить её")
+            elif higher_bot_role < role:
+                raise CommandError("Данная роль выше роли бота. Вы должны поставить роль бота выше, чем эта роль, "
+                                   "чтобы бот смог выдавать эту роль другим пользователям")
+            elif level is None:
                 raise CommandError("Вы не ввели уровень")
 
-            award = ServerAwardOfLevels(**db_kwargs, level=level)
-            session.add(award)
-            session.commit()
-            session.close()
+            await uow.run(lambda session: session.add(ServerAwardOfLevels(**db_kwargs, level=level)))
+
+        await update_levels_config(ctx.guild.id)
+        await award_reconciler.reconcile(ctx.guild.id)
 
-            await ctx.send(embed=SuccessfulMessage(f"Вы добавили роль `{role.name}` в качестве награды по достижению "
-                                                   f"`{level} уровня`"))
+        await ctx.send(embed=SuccessfulMessage(f"Вы добавили роль `{role.name}` в качестве награды по достижению "
+                                               f"`{level} уровня`. Участники, которые уже достигли этого уровня, "
+                                               f"получат её в ближайшее время"))
 
     @awards_for_levels.command(
         cls=Command, name="edit",
@@ -590,20 +499,22 @@ class LevelsSettings(Cog, name="Настройки"):
         elif level < 0:
             raise CommandError("Вы не можете поставить уровень меньше нуля")
 
-        session = Session()
-        award = session.query(ServerAwardOfLevels).filter_by(server_id=str(ctx.guild.id), role_id=str(role.id)).first()
+        award = await run(lambda session: session.query(ServerAwardOfLevels).filter_by(
+            server_id=ctx.guild.id, role_id=role.id
+        ).first())
 
         if award is None:
-            session.close()
             raise CommandError("Этой роли нет в списке наград за уровень.\n"
                                "Используйте `.setlevels award add`, если вы хотите добавить её")
         elif level == award.level:
-            session.close()
             raise CommandError("Эту роль и так можно получить, достигнув введённого уровня")
         else:
-            award.level = level
-            session.commit()
-            session.close()
+            await run(lambda session: session.query(ServerAwardOfLevels).filter_by(
+                server_id=ctx.guild.id, role_id=role.id
+            ).update({"level": level}))
+
+            await update_levels_config(ctx.guild.id)
+            await award_reconciler.reconcile(ctx.guild.id)
 
             await ctx.send(embed=SuccessfulMessage(f"Теперь роль `{role.name}` можно получить по достижению `{level} "
                                                    f"уровня`"))
@@ -622,16 +533,16 @@ class LevelsSettings(Cog, name="Настройки"):
         if role is None:
             raise CommandError("Вы не ввели роль")
 
-        session = Session()
-        award = session.query(ServerAwardOfLevels).filter_by(server_id=str(ctx.guild.id), role_id=str(role.id)).first()
+        award = await run(lambda session: session.query(ServerAwardOfLevels).filter_by(
+            server_id=ctx.guild.id, role_id=role.id
+        ).first())
 
         if award is None:
-            session.close()
             raise CommandError("Этой роли нет в списке наград за уровень.")
         else:
-            session.delete(award)
-            session.commit()
-            session.close()
+            await run(lambda session: session.delete(award))
+
+            await update_levels_config(ctx.guild.id)
 
             await ctx.send(embed=SuccessfulMessage(f"Вы удалили роль `{role.name}` из списка наград за уровень"))
 
@@ -643,8 +554,6 @@ class LevelsSettings(Cog, name="Настройки"):
         Удалить все роли в качестве награды за уровень
         """
 
-        session = Session()
-
         emojis = {
             "accept": "✅",
             "cancel": "🚫"
@@ -660,16 +569,16 @@ class LevelsSettings(Cog, name="Настройки"):
         message, answer = await send_message_with_reaction_choice(self.client, ctx, embed, emojis)
 
         if answer == "accept":
-            session.query(ServerAwardOfLevels).filter_by(server_id=str(ctx.guild.id)).delete()
-            session.commit()
+            await run(lambda session: session.query(ServerAwardOfLevels).filter_by(
+                server_id=ctx.guild.id
+            ).delete())
+            await update_levels_config(ctx.guild.id)
 
             embed = SuccessfulMessage("Вы удалили все награды за уровень")
             await message.edit(embed=embed)
         elif answer == "cancel":
             await message.edit(embed=SuccessfulMessage("Вы отменили удаление всех наград"))
 
-        session.close()
-
     @levels_settings.group(name="ignore", invoke_without_command=True)
     @commands.has_permissions(administrator=True)
     @level_system_is_on()
@@ -680,34 +589,30 @@ class LevelsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        ignored_channels = session.query(ServerIgnoreChannelsListOfLevels).filter_by(server_id=str(server.id)).all()
-        ignored_roles = session.query(ServerIgnoreRolesListOfLevels).filter_by(server_id=str(server.id)).all()
+        def get_ignore_lists(session):
+            return (
+                session.query(ServerIgnoreChannelsListOfLevels).filter_by(server_id=server.id).all(),
+                session.query(ServerIgnoreRolesListOfLevels).filter_by(server_id=server.id).all()
+            )
+
+        ignored_channels, ignored_roles = await run(get_ignore_lists)
 
         verified_channels = []
         verified_roles = []
 
         if ignored_channels:
             for ignored in ignored_channels:
-                channel = server.get_channel(int(ignored.channel_id))
+                channel = server.get_channel(ignored.channel_id)
 
                 if channel is not None:
                     verified_channels.append(f"`{channel.name}`")
-                else:
-                    session.delete(ignored)
-                    session.commit()
 
         if ignored_roles:
             for ignored in ignored_roles:
-                role = server.get_role(int(ignored.role_id))
+                role = server.get_role(ignored.role_id)
 
                 if role is not None:
                     verified_roles.append(f"`{role.name}`")
-                else:
-                    session.delete(ignored)
-                    session.commit()
-
-        session.close()
 
         if verified_channels:
             channels_text = "\n".join(verified_channels)
@@ -766,21 +671,21 @@ class LevelsSettings(Cog, name="Настройки"):
         if channel is None:
             raise CommandError("Вы не ввели тектовый канал")
 
-        session = Session()
         db_kwargs = {
-            "server_id": str(ctx.guild.id),
-            "channel_id": str(channel.id)
+            "server_id": ctx.guild.id,
+            "channel_id": channel.id
         }
-        ignored_channel = session.query(ServerIgnoreChannelsListOfLevels).filter_by(**db_kwargs).first()
+        ignored_channel = await run(lambda session: session.query(ServerIgnoreChannelsListOfLevels).filter_by(
+            **db_kwargs
+        ).first())
 
         if ignored_channel is not None:
-            session.close()
             raise CommandError("Данный текстовый канал уже в чёрном списке")
         else:
             ignored_channel = ServerIgnoreChannelsListOfLevels(**db_kwargs)
-            session.add(ignored_channel)
-            session.commit()
-            session.close()
+            await run(lambda session: session.add(ignored_channel))
+
+            await update_levels_config(ctx.guild.id)
 
             await ctx.send(embed=SuccessfulMessage("Вы добавили текстовый канал в чёрный список"))
 
@@ -798,20 +703,20 @@ class LevelsSettings(Cog, name="Настройки"):
         if channel is None:
             raise CommandError("Вы не ввели тектовый канал")
 
-        session = Session()
         db_kwargs = {
-            "server_id": str(ctx.guild.id),
-            "channel_id": str(channel.id)
+            "server_id": ctx.guild.id,
+            "channel_id": channel.id
         }
-        ignored_channel = session.query(ServerIgnoreChannelsListOfLevels).filter_by(**db_kwargs).first()
+        ignored_channel = await run(lambda session: session.query(ServerIgnoreChannelsListOfLevels).filter_by(
+            **db_kwargs
+        ).first())
 
         if ignored_channel is None:
-            session.close()
             raise CommandError("Данного текстового канала нет в чёрном списке")
         else:
-            session.delete(ignored_channel)
-            session.commit()
-            session.close()
+            await run(lambda session: session.delete(ignored_channel))
+
+            await update_levels_config(ctx.guild.id)
 
             await ctx.send(embed=SuccessfulMessage("Вы удалили текстовый канал из чёрного списка"))
 
@@ -823,10 +728,11 @@ class LevelsSettings(Cog, name="Настройки"):
         Сбросить чёрный список для текстовых каналов
         """
 
-        session = Session()
-        session.query(ServerIgnoreChannelsListOfLevels).filter_by(server_id=str(ctx.guild.id)).delete()
-        session.commit()
-        session.close()
+        await run(lambda session: session.query(ServerIgnoreChannelsListOfLevels).filter_by(
+            server_id=ctx.guild.id
+        ).delete())
+
+        await update_levels_config(ctx.guild.id)
 
         await ctx.send(embed=SuccessfulMessage("Вы сбросили чёрный список для тектовых каналов"))
 
@@ -854,21 +760,21 @@ class LevelsSettings(Cog, name="Настройки"):
         if role is None:
             raise CommandError("Вы не ввели роль")
 
-        session = Session()
         db_kwargs = {
-            "server_id": str(ctx.guild.id),
-            "role_id": str(role.id)
+            "server_id": ctx.guild.id,
+            "role_id": role.id
         }
-        ignored_role = session.query(ServerIgnoreRolesListOfLevels).filter_by(**db_kwargs).first()
+        ignored_role = await run(lambda session: session.query(ServerIgnoreRolesListOfLevels).filter_by(
+            **db_kwargs
+        ).first())
 
         if ignored_role is not None:
-            session.close()
             raise CommandError("Данная роль уже в чёрном списке")
         else:
             ignored_role = ServerIgnoreRolesListOfLevels(**db_kwargs)
-            session.add(ignored_role)
-            session.commit()
-            session.close()
+            await run(lambda session: session.add(ignored_role))
+
+            await update_levels_config(ctx.guild.id)
 
             await ctx.send(embed=SuccessfulMessage("Вы добавили роль в чёрный список"))
 
@@ -886,20 +792,20 @@ class LevelsSettings(Cog, name="Настройки"):
         if role is None:
             raise CommandError("Вы не ввели роль")
 
-        session = Session()
         db_kwargs = {
-            "server_id": str(ctx.guild.id),
-            "role_id": str(role.id)
+            "server_id": ctx.guild.id,
+            "role_id": role.id
         }
-        ignored_role = session.query(ServerIgnoreRolesListOfLevels).filter_by(**db_kwargs).first()
+        ignored_role = await run(lambda session: session.query(ServerIgnoreRolesListOfLevels).filter_by(
+            **db_kwargs
+        ).first())
 
         if ignored_role is None:
-            session.close()
             raise CommandError("Данной роли нет в чёрном списке")
         else:
-            session.delete(ignored_role)
-            session.commit()
-            session.close()
+            await run(lambda session: session.delete(ignored_role))
+
+            await update_levels_config(ctx.guild.id)
 
             await ctx.send(embed=SuccessfulMessage("Вы удалили роль из чёрного списка"))
 
@@ -911,9 +817,10 @@ class LevelsSettings(Cog, name="Настройки"):
         Сбросить чёрный список для ролей
         """
 
-        session = Session()
-        session.query(ServerIgnoreRolesListOfLevels).filter_by(server_id=str(ctx.guild.id)).delete()
-        session.commit()
-        session.close()
+        await run(lambda session: session.query(ServerIgnoreRolesListOfLevels).filter_by(
+            server_id=ctx.guild.id
+        ).delete())
+
+        await update_levels_config(ctx.guild.id)
 
         await ctx.send(embed=SuccessfulMessage("Вы сбросили чёрный список для ролей"))
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+from core.app import ROOM_EVENTS_CONCURRENCY, ROOM_EVENTS_QUEUE_LIMIT
+from core.metrics import metrics
+from core.sqlstats import current_handler
+
+logger = logging.getLogger("ice_cube")
+
+
+class GuildEventQueue:
+    """
+    Processes events of every server one by one in order they came, so handlers of the same server don't race.
+    Servers are processed concurrently, but not more than `concurrency` events at once. Droppable events (users
+    joining voice channels) are dropped when a server has `max_length` waiting events, other events (leaves, deleted
+    and edited channels) are always queued, so empty rooms and settings of deleted channels are never left behind
+    """
+
+    def __init__(self, concurrency: int, max_length: int):
+        self.concurrency = concurrency
+        self.max_length = max_length
+
+        self._queues = {}  # server's ID -> deque of (name, factory, time of submitting)
+        self._slots = None
+
+        self.processed = 0  # processed events
+        self.dropped = 0  # events dropped because of a full queue
+        self.failed = 0  # events whose handlers raised an error
+
+    def submit(self, server_id: int, name: str, factory: Callable[[], Awaitable], droppable: bool = False) -> bool:
+        """
+        Put server's event to its queue, returns False if the event is droppable, the queue is full and the event
+        is dropped
+        """
+        queue = self._queues.get(server_id)
+
+        if queue is None:
+            queue = self._queues[server_id] = deque()
+            asyncio.ensure_future(self._work(server_id, queue))
+        elif droppable and len(queue) >= self.max_length:
+            self.dropped += 1
+            metrics.increment("room_events_dropped")
+            logger.warning(f"Очередь событий приватных комнат сервера {server_id} переполнена, "
+                           f"событие {name} отброшено")
+            return False
+
+        queue.append((name, factory, time.perf_counter()))
+
+        return True
+
+    async def _work(self, server_id: int, queue: deque):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+        try:
+            while queue:
+                name, factory, submitted = queue[0]
+
+                # the slot is released after every event, so other servers get their turn
+                async with self._slots:
+                    metrics.observe_operation("room_event_wait", time.perf_counter() - submitted)
+                    token = current_handler.set(f"listener {name}")
+
+                    try:
+                        await factory()
+                    except Exception:
+                        self.failed += 1
+                        logger.exception(f"Ошибка при обработке события {name} на сервере {server_id}")
+                    finally:
+                        current_handler.reset(token)
+
+                queue.popleft()
+                self.processed += 1
+                metrics.increment("room_events_processed")
+        finally:
+            del self._queues[server_id]
+
+    def stats(self) -> dict:
+        """State of the queues: number of servers and waiting events, processed and dropped events"""
+        return {
+            "servers": len(self._queues),
+            "queued": sum(len(q) for q in self._queues.values()),
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
+room_events = GuildEventQueue(ROOM_EVENTS_CONCURRENCY, ROOM_EVENTS_QUEUE_LIMIT)
+metrics.register_gauge("room_events_queued", lambda: room_events.stats()["queued"])
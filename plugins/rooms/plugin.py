@@ -2,22 +2,24 @@ from typing import Union
 
 import discord
 from discord import PermissionOverwrite as Permissions
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import CommandError
 
+from core.app import CLEANUP_INTERVAL
 from core.commands import Cog, Command
-from core.database import UserPermissionsOfRoom
+from core.outbound import Priority, request
 from core.templates import PermissionsForRoom, DefaultEmbed as Embed, SuccessfulMessage
-from main import Session
 
-from plugins.rooms.utils import get_server_settings, get_user_settings, add_user_settings, get_all_permissions, \
-    get_permissions, add_permissions
-
-# user's permissions for his room
-OWNER_PERMISSIONS = Permissions(manage_channels=True, connect=True, speak=True)
+from plugins.rooms.utils import remove_server_settings, get_rooms_system, forget_rooms_system, \
+    get_user_settings, edit_user_settings, get_all_permissions, get_permissions, set_permissions, \
+    remove_permissions, get_users_with_permissions, remove_permissions_of_users
+from plugins.rooms.events import room_events
+from plugins.rooms.registry import room_registry
+from plugins.rooms.provisioning import room_provisioner, OWNER_PERMISSIONS
 
 
 def get_owner(channel: discord.VoiceChannel) -> Union[discord.Member, None]:
+    """Finds room's owner by channel's overwrites, use room_registry for known rooms"""
     owner = [m for m, p in channel.overwrites.items() if p == OWNER_PERMISSIONS]
 
     if len(owner) == 0:
@@ -26,11 +28,19 @@ def get_owner(channel: discord.VoiceChannel) -> Union[discord.Member, None]:
         return owner[0]
 
 
-def room_is_locked_predicate(ctx: commands.Context):
+def get_own_room(member: discord.Member) -> Union[discord.VoiceChannel, None]:
+    """Returns member's room if the member is in it"""
+    if member.voice is None or member.voice.channel is None:
+        return None
+
+    room = member.voice.channel
+
+    return room if room.id == room_registry.get_room_id(member.guild, member) else None
+
+
+async def room_is_locked_predicate(ctx: commands.Context):
     """Returns user's room is locked"""
-    session = Session()
-    settings = get_user_settings(session, ctx.guild, ctx.author)
-    session.close()
+    settings = await get_user_settings(ctx.guild, ctx.author)
     return settings is not None and settings.is_locked
 
 
@@ -41,39 +51,104 @@ def room_is_locked():
 
 def room_is_not_locked():
     """Checks user's room isn't locked"""
-    def predicate(ctx):
-        return not room_is_locked_predicate(ctx)
+    async def predicate(ctx):
+        return not await room_is_locked_predicate(ctx)
 
     return commands.check(predicate)
 
 
 class Rooms(Cog, name="Приватные комнаты"):
-    @commands.Cog.listener("on_voice_state_update")
+    def __init__(self, bot):
+        super().__init__(bot)
+
+        self.sweep_left_users.start()
+
+    def cog_unload(self):
+        self.sweep_left_users.cancel()
+
+    @tasks.loop(seconds=CLEANUP_INTERVAL)
+    async def sweep_left_users(self):
+        """Deleting permissions of users who left servers while the bot was offline"""
+        for server in self.client.guilds:
+            # without the full list of members every user would look like a left one
+            if not server.chunked:
+                continue
+
+            left_users = {user_id for user_id in await get_users_with_permissions(server)
+                          if server.get_member(user_id) is None}
+
+            if left_users:
+                await remove_permissions_of_users(server, left_users)
+
+    @sweep_left_users.before_loop
+    async def wait_for_guilds(self):
+        await self.client.wait_until_ready()
+
+    @Cog.listener("on_member_remove")
+    async def forget_left_user(self, member):
+        """Deleting permissions of a left user in all rooms of the server"""
+        if await get_rooms_system(member.guild) is not None:
+            await remove_permissions_of_users(member.guild, [member.id])
+
+    @Cog.listener("on_ready")
+    async def rebuild_room_registry(self):
+        """Registering rooms that exist after bot's start"""
+        for server in self.client.guilds:
+            room_registry.forget_server(server)
+            rooms_system = await get_rooms_system(server)
+
+            if rooms_system is None:
+                continue
+
+            room_provisioner.forget_server(server)
+            category = server.get_channel(rooms_system.category_id)
+
+            # the category was deleted while the bot was disconnected
+            if category is None:
+                await remove_server_settings(server)
+                continue
+
+            for channel in category.voice_channels:
+                owner = get_owner(channel)
+
+                if isinstance(owner, discord.Member):
+                    room_registry.add(channel, owner)
+                elif channel.id != rooms_system.creator_id:
+                    room_provisioner.adopt(channel)
+
+            room_provisioner.refill(server, category)
+
+    @Cog.listener("on_voice_state_update")
     async def room_master(self, user, before, after):
+        """Queueing voice updates, events of a server are processed in order"""
+        # mute, deafen, stream and video toggles don't move the user
+        if before.channel == after.channel:
+            return
+
+        # only joins can be dropped when the server is flooded, a dropped leave would leave an empty room
+        room_events.submit(user.guild.id, "Rooms.room_master", lambda: self.process_voice_state(user, before, after),
+                           droppable=before.channel is None)
+
+    async def process_voice_state(self, user, before, after):
         """Creating rooms and deleting rooms without users"""
-        server = after.channel.guild if before.channel is None else before.channel.guild
+        server = user.guild
 
-        session = Session()
-        server_settings = get_server_settings(session, server)
+        rooms_system = await get_rooms_system(server)
 
-        if server_settings is None:
-            session.close()
+        if rooms_system is None:
             return
-        else:
-            # a voice channel that creates rooms
-            creator_rooms = server.get_channel(server_settings.creator)
-
-        # if the voice channel doesn't exist or it doesn't have category, delete server's settings from database
-        if creator_rooms is None or creator_rooms.category is None:
-            session.delete(server_settings)
-            session.commit()
-            session.close()
+
+        creator_rooms = server.get_channel(rooms_system.creator_id)  # a voice channel that creates rooms
+        rooms_category = server.get_channel(rooms_system.category_id)  # a category that will contain rooms
+
+        # if the voice channel or the category doesn't exist, delete server's settings from database
+        if creator_rooms is None or rooms_category is None:
+            await remove_server_settings(server)
             return
-        else:
-            rooms_category = creator_rooms.category  # a category that will contain rooms
 
-        if before.channel is not None and get_owner(before.channel) == user and after.channel == creator_rooms:
-            await user.move_to(before.channel)
+        if before.channel is not None and room_registry.get_owner_id(before.channel.id) == user.id and \
+                after.channel == creator_rooms:
+            await request(("guild", server.id), Priority.room, lambda: user.move_to(before.channel))
             return
 
         # when the user have leaved the voice channel
@@ -81,7 +156,8 @@ class Rooms(Cog, name="Приватные комнаты"):
             channel = before.channel
 
             if channel in rooms_category.voice_channels and channel != creator_rooms and len(channel.members) == 0:
-                await channel.delete()
+                await request(("channel", channel.id), Priority.room, lambda: channel.delete())
+                room_registry.remove(channel.id)
 
         # when the user have joined the voice channel
         if after.channel:
@@ -89,89 +165,64 @@ class Rooms(Cog, name="Приватные комнаты"):
 
             # if the voice channel that the user joined, create a room
             if creator_rooms == channel:
-                # user's settings from database
-                user_settings = get_user_settings(session, server, user)
-                everyone = server.default_role
-
-                # if user's settings dont't exist, create default settings and write them in database
-                if user_settings is None:
-                    user_settings = add_user_settings(session, server, user)
-                    session.commit()
-
-                # voice channel's permissions
-                permissions_for_room = {
-                    user: OWNER_PERMISSIONS,
-                    everyone: Permissions(connect=not user_settings.is_locked)
-                }
-
-                # voice channel's permissions from database
-                users_with_permissions = get_all_permissions(session, server, user)
-
-                for perms in users_with_permissions:
-                    user_with_perms = server.get_member(perms.user)
-
-                    # if user doesn't exist in the server, delete a permission from database
-                    if user_with_perms is None:
-                        session.delete(perms)
-                        session.commit()
-                    else:
-                        permissions_for_room[user_with_perms] = Permissions(connect=perms.permissions.value)
-
-                room = await server.create_voice_channel(
-                    name=user_settings.name if user_settings.name is not None else user.display_name,
-                    category=rooms_category,
-                    overwrites=permissions_for_room,
-                    user_limit=user_settings.user_limit,
-                    bitrate=user_settings.bitrate * 1000
-                )
+                await room_provisioner.provision(user, rooms_category)
 
-                await user.move_to(room)
-
-        session.close()
-
-    @commands.Cog.listener("on_guild_channel_delete")
+    @Cog.listener("on_guild_channel_delete")
     async def rooms_master_check_deleted_channels(self, channel):
+        """Queueing deleted channels, events of a server are processed in order"""
+        room_events.submit(channel.guild.id, "Rooms.rooms_master_check_deleted_channels",
+                           lambda: self.process_deleted_channel(channel))
+
+    async def process_deleted_channel(self, channel):
         """Checking if a deleted channel is a voice channel that creates rooms or it's a category that contains rooms"""
-        session = Session()
-        settings = get_server_settings(session, channel.guild)
+        room_registry.remove(channel.id)
+        room_provisioner.discard(channel)
 
-        if settings is not None and (settings.creator == channel.id or
-                                     channel.guild.get_channel(settings.creator).category is None):
-            session.delete(settings)
-            session.commit()
+        rooms_system = await get_rooms_system(channel.guild)
 
-        session.close()
+        if rooms_system is not None and channel.id in rooms_system:
+            await remove_server_settings(channel.guild)
 
-    @commands.Cog.listener("on_guild_channel_update")
+    @Cog.listener("on_guild_remove")
+    async def forget_server_rooms_system(self, server):
+        forget_rooms_system(server)
+        room_registry.forget_server(server)
+        room_provisioner.forget_server(server)
+
+    @Cog.listener("on_guild_channel_update")
     async def voice_master_checker_updated_channels(self, before, after):
+        """Queueing edited channels, events of a server are processed in order"""
+        room_events.submit(before.guild.id, "Rooms.voice_master_checker_updated_channels",
+                           lambda: self.process_updated_channel(before, after))
+
+    async def process_updated_channel(self, before, after):
         """Checking if a edited channel is a voice channel that creates rooms"""
         server = before.guild
 
-        session = Session()
-        server_settings = get_server_settings(session, server)
+        rooms_system = await get_rooms_system(server)
 
         # if the channel is a voice channel that creates room and this channel moved to another category, delete
         # settings from database
-        if before.id == server_settings.creator and before.category != after.category:
-            session.delete(server_settings)
-            session.commit()
+        if rooms_system is not None and before.id == rooms_system.creator_id and before.category != after.category:
+            await remove_server_settings(server)
         else:
-            # if the channel is a room, we will find special permissions for owner of this room
-            owner = get_owner(before)
+            # if the channel is a room, we will find its owner
+            owner_id = room_registry.get_owner_id(before.id)
+            owner = server.get_member(owner_id) if owner_id is not None else None
 
             # if the channel has special permissions, start check all changes
             if owner:
-                user_settings = get_user_settings(session, server, owner)
-
                 room = after
                 everyone = server.default_role
 
                 # set room's settings to database
-                user_settings.name = room.name if room.name != owner.display_name else None
-                user_settings.user_limit = room.user_limit
-                user_settings.bitrate = room.bitrate // 1000
-                user_settings.is_locked = room.overwrites_for(everyone) == Permissions(connect=False)
-                session.commit()
+                await edit_user_settings(
+                    server, owner,
+                    name=room.name if room.name != owner.display_name else None,
+                    user_limit=room.user_limit,
+                    bitrate=room.bitrate // 1000,
+                    is_locked=room.overwrites_for(everyone) == Permissions(connect=False)
+                )
 
                 # permissions from the room
                 def check(p):
@@ -184,13 +235,13 @@ class Rooms(Cog, name="Приватные комнаты"):
                 ))
 
                 # room's permissions from database
-                data_from_db = get_all_permissions(session, server, owner)
+                data_from_db = await get_all_permissions(server, owner)
 
                 # reformat view of permissions from database for comparing
                 permissions_from_db = {}
 
                 for user in data_from_db:
-                    member = server.get_member(int(user.user_id))
+                    member = server.get_member(user.user_id)
 
                     if member is not None:
                         permissions_from_db[member] = user.permissions
@@ -201,22 +252,11 @@ class Rooms(Cog, name="Приватные комнаты"):
                 modified = [(m, p) for m, p in permissions_from_voice.items()
                             if m in permissions_from_db and permissions_from_db[m] != permissions_from_voice[m]]
 
-                db_kwargs = {
-                    "server_id": str(server.id),
-                    "owner_id": str(owner.id)
-                }
-
                 # make changes in database
-                for member, perms in added:
-                    session.add(UserPermissionsOfRoom(**db_kwargs, user_id=str(member.id), permissions=perms))
-                for member, _ in deleted:
-                    session.query(UserPermissionsOfRoom).filter_by(**db_kwargs, user_id=str(member.id)).delete()
-                for member, perms in modified:
-                    session.query(UserPermissionsOfRoom).filter_by(**db_kwargs,
-                                                                   user_id=str(member.id)).first().permissions = perms
-                session.commit()
-
-        session.close()
+                for member, perms in added + modified:
+                    await set_permissions(server, owner, member, perms)
+                if deleted:
+                    await remove_permissions(server, owner, *(member for member, _ in deleted))
 
     @commands.group(name="room", aliases=["r"])
     async def room_settings(self, ctx):
@@ -224,19 +264,16 @@ class Rooms(Cog, name="Приватные комнаты"):
         user = ctx.author
         server = ctx.guild
 
-        session = Session()
-        server_settings = get_server_settings(session, server)
-        creator = server.get_channel(server_settings.creator)
-        # if a channel from database doesn't exist, ignore
+        rooms_system = await get_rooms_system(server)
+        creator = server.get_channel(rooms_system.creator_id) if rooms_system is not None else None
+        # if the server doesn't have rooms or a channel from database doesn't exist, ignore
         if creator is None:
-            session.close()
             return
 
-        user_settings = get_user_settings(session, server, user)
+        user_settings = await get_user_settings(server, user)
         # if the user haven't created a room in this server, notify that he must create room to make changes in database
         # before he can use this command
         if not user_settings:
-            session.close()
             raise CommandError(f"Вы не использовали до этого приватные комнаты на этом сервере. Чтобы пользоваться "
                                f"командой `{ctx.prefix}{ctx.command}`, создайте свою комнату, зайдя в голосовой канал "
                                f"`{creator}`")
@@ -248,20 +285,19 @@ class Rooms(Cog, name="Приватные комнаты"):
                                     f"{ctx.prefix}help {ctx.command}")
 
             # get settings from database
-            user_settings = get_user_settings(session, server, user)
             name = user_settings.name if user_settings.name is not None else user.display_name
             is_locked = user_settings.is_locked
             user_limit = user_settings.user_limit
             bitrate = user_settings.bitrate
 
             # room's permissions from database
-            data_from_db = get_all_permissions(session, server, user)
+            data_from_db = await get_all_permissions(server, user)
 
             # room's permissions as dict
             permissions = {}
 
             for perm in data_from_db:
-                member = server.get_member(int(perm.user_id))
+                member = server.get_member(perm.user_id)
 
                 if member is not None:
                     permissions[member] = perm.permissions.value
@@ -291,8 +327,6 @@ class Rooms(Cog, name="Приватные комнаты"):
 
             await ctx.send(embed=message)
 
-        session.close()
-
     @room_settings.command(cls=Command, name="lock")
     @room_is_not_locked()
     async def lock_room(self, ctx):
@@ -300,14 +334,12 @@ class Rooms(Cog, name="Приватные комнаты"):
         user = ctx.author
         server = ctx.guild
 
-        session = Session()
-        settings = get_user_settings(session, server, user)
-        settings.is_locked = True
-        session.commit()
-        session.close()
+        await edit_user_settings(server, user, is_locked=True)
 
-        if user.voice is not None and user.voice.channel.overwrites_for(user) == OWNER_PERMISSIONS:
-            await user.voice.channel.set_permissions(server.default_role, overwrite=Permissions(connect=False))
+        room = get_own_room(user)
+
+        if room is not None:
+            await room.set_permissions(server.default_role, overwrite=Permissions(connect=False))
 
         await ctx.send(embed=SuccessfulMessage("Я закрыл вашу комнату"))
 
@@ -318,14 +350,12 @@ class Rooms(Cog, name="Приватные комнаты"):
         user = ctx.author
         server = ctx.guild
 
-        session = Session()
-        settings = get_user_settings(session, server, user)
-        settings.is_locked = False
-        session.commit()
-        session.close()
+        await edit_user_settings(server, user, is_locked=False)
+
+        room = get_own_room(user)
 
-        if user.voice is not None and user.voice.channel.overwrites_for(user) == OWNER_PERMISSIONS:
-            await user.voice.channel.set_permissions(server.default_role, overwrite=Permissions(connect=True))
+        if room is not None:
+            await room.set_permissions(server.default_role, overwrite=Permissions(connect=True))
 
         await ctx.send(embed=SuccessfulMessage("Я открыл вашу комнату"))
 
@@ -339,21 +369,16 @@ class Rooms(Cog, name="Приватные комнаты"):
         user = ctx.author
         server = ctx.guild
 
-        session = Session()
-        settings = get_user_settings(session, server, user)
-
         if 0 > limit:
-            session.close()
             raise CommandError("Лимит не должен быть меньше 0")
         elif limit > 99:
-            session.close()
             raise CommandError("Лимит не должен быть больше 99")
 
+        settings = await get_user_settings(server, user)
+
         if settings.user_limit == limit == 0:
-            session.close()
             raise CommandError("Вы ещё не поставили лимит пользователей для комнаты, чтобы сбрасывать его")
         elif settings.user_limit == limit:
-            session.close()
             raise CommandError("Комната уже имеет такой лимит")
         else:
             if limit == 0:
@@ -361,12 +386,12 @@ class Rooms(Cog, name="Приватные комнаты"):
             else:
                 message = SuccessfulMessage("Я изменил лимит пользователей для вашей комнаты")
 
-            settings.user_limit = limit
-            session.commit()
-            session.close()
+            await edit_user_settings(server, user, user_limit=limit)
 
-            if user.voice is not None and user.voice.channel.overwrites_for(user) == OWNER_PERMISSIONS:
-                await user.voice.channel.edit(user_limit=limit)
+            room = get_own_room(user)
+
+            if room is not None:
+                await room.edit(user_limit=limit)
 
             await ctx.send(embed=message)
 
@@ -383,29 +408,25 @@ class Rooms(Cog, name="Приватные комнаты"):
         if name is not None and len(name) > 32:
             raise CommandError("Название канала не должно быть больше 32-ух символов")
 
-        session = Session()
-        settings = get_user_settings(session, server, user)
+        settings = await get_user_settings(server, user)
 
         if settings.name is None and name is None:
-            session.close()
             raise CommandError("Вы ещё не поставили название для комнаты, чтобы сбрасывать его")
         elif name == settings.name:
-            session.close()
             raise CommandError("Комната уже имеет такое название")
         else:
             if name is None:
                 message = SuccessfulMessage("Я сбросил название вашего канала")
+                await edit_user_settings(server, user, name=None)
                 name = user.display_name
-                settings.name = None
             else:
                 message = SuccessfulMessage("Я изменил название вашей комнаты")
-                settings.name = name
+                await edit_user_settings(server, user, name=name)
 
-            session.commit()
-            session.close()
+            room = get_own_room(user)
 
-            if user.voice is not None and user.voice.channel.overwrites_for(user) == OWNER_PERMISSIONS:
-                await user.voice.channel.edit(name=name)
+            if room is not None:
+                await room.edit(name=name)
 
             await ctx.send(embed=message)
 
@@ -425,14 +446,11 @@ class Rooms(Cog, name="Приватные комнаты"):
         elif bitrate > max_bitrate:
             raise CommandError(f"Битрейт не должен быть больше {max_bitrate}")
 
-        session = Session()
-        settings = get_user_settings(session, server, user)
+        settings = await get_user_settings(server, user)
 
         if settings.bitrate == bitrate == 64:
-            session.close()
             raise CommandError("Вы ещё не изменяли битрейт, чтобы сбрасывать его по умолчанию")
         elif settings.bitrate == bitrate:
-            session.close()
             raise CommandError("Комната уже имеет такой битрейт")
         else:
             if bitrate == 0:
@@ -440,12 +458,12 @@ class Rooms(Cog, name="Приватные комнаты"):
             else:
                 message = SuccessfulMessage("Я изменил битрейт в вашей комнате")
 
-            settings.bitrate = bitrate
-            session.commit()
-            session.close()
+            await edit_user_settings(server, user, bitrate=bitrate)
+
+            room = get_own_room(user)
 
-            if user.voice is not None and user.voice.channel.overwrites_for(user) == OWNER_PERMISSIONS:
-                await user.voice.channel.edit(bitrate=bitrate * 1000)
+            if room is not None:
+                await room.edit(bitrate=bitrate * 1000)
 
             await ctx.send(embed=message)
 
@@ -457,11 +475,13 @@ class Rooms(Cog, name="Приватные комнаты"):
         """Кикнуть пользователя из вашей комнаты"""
         author = ctx.author
 
-        if author.voice is not None and author.voice.channel.overwrites_for(author) == OWNER_PERMISSIONS:
+        room = get_own_room(author)
+
+        if room is not None:
             if user is None:
                 raise CommandError("Вы не ввели пользователя")
 
-            members = author.voice.channel.members
+            members = room.members
 
             if user not in members:
                 raise CommandError("В вашей комнате нет такого пользователя")
@@ -480,23 +500,18 @@ class Rooms(Cog, name="Приватные комнаты"):
         owner = ctx.author
         server = ctx.guild
 
-        session = Session()
-        permissions_from_db = get_permissions(session, server, owner, user)
+        permissions_from_db = await get_permissions(server, owner, user)
         perms = PermissionsForRoom.allowed
 
         if permissions_from_db is not None and permissions_from_db.permissions == perms:
-            session.close()
             raise CommandError("Этот участник уже имеет доступ к вашей комнате")
         else:
-            if permissions_from_db is None:
-                add_permissions(session, server, owner, user, perms)
-            else:
-                permissions_from_db.permissions = perms
-            session.commit()
-            session.close()
+            await set_permissions(server, owner, user, perms)
+
+            room = get_own_room(owner)
 
-            if owner.voice is not None and owner.voice.channel.overwrites_for(owner) == OWNER_PERMISSIONS:
-                await owner.voice.channel.set_permissions(user, overwrite=Permissions(connect=perms.value))
+            if room is not None:
+                await room.set_permissions(user, overwrite=Permissions(connect=perms.value))
 
             await ctx.send(embed=SuccessfulMessage(f"Я дал доступ `{user.display_name}` к вашей комнате"))
 
@@ -509,23 +524,18 @@ class Rooms(Cog, name="Приватные комнаты"):
         owner = ctx.author
         server = ctx.guild
 
-        session = Session()
-        permissions_from_db = get_permissions(session, server, owner, user)
+        permissions_from_db = await get_permissions(server, owner, user)
         perms = PermissionsForRoom.banned
 
         if permissions_from_db is not None and permissions_from_db.permissions == perms:
-            session.close()
             raise CommandError("У этого участника уже заблокирован доступ к вашей комнате")
         else:
-            if permissions_from_db is None:
-                add_permissions(session, server, owner, user, perms)
-            else:
-                permissions_from_db.permissions = perms
-            session.commit()
-            session.close()
+            await set_permissions(server, owner, user, perms)
 
-            if owner.voice is not None and owner.voice.channel.overwrites_for(owner) == OWNER_PERMISSIONS:
-                await owner.voice.channel.set_permissions(user, overwrite=Permissions(connect=perms.value))
+            room = get_own_room(owner)
+
+            if room is not None:
+                await room.set_permissions(user, overwrite=Permissions(connect=perms.value))
 
             await ctx.send(embed=SuccessfulMessage(f"Я заброкировал доступ у `{user.display_name}` к вашей комнате"))
 
@@ -538,19 +548,17 @@ class Rooms(Cog, name="Приватные комнаты"):
         owner = ctx.author
         server = ctx.guild
 
-        session = Session()
-        permissions_from_db = get_permissions(session, server, owner, user)
+        permissions_from_db = await get_permissions(server, owner, user)
 
         if permissions_from_db is None:
-            session.close()
             raise CommandError("Этот участник не имеет особых прав, чтобы сбрасывать их")
         else:
-            session.delete(permissions_from_db)
-            session.commit()
-            session.close()
+            await remove_permissions(server, owner, user)
+
+            room = get_own_room(owner)
 
-            if owner.voice is not None and owner.voice.channel.overwrites_for(owner) == OWNER_PERMISSIONS:
-                await owner.voice.channel.set_permissions(user, overwrite=Permissions(connect=None))
+            if room is not None:
+                await room.set_permissions(user, overwrite=Permissions(connect=None))
 
             await ctx.send(embed=SuccessfulMessage(f"Я сбросил права доступа у `{user.display_name}` к вашей комнате"))
 
@@ -561,13 +569,10 @@ class Rooms(Cog, name="Приватные комнаты"):
         server = ctx.guild
         everyone = server.default_role
 
-        session = Session()
-
-        settings = get_user_settings(session, server, owner)
-        permissions_from_db = get_all_permissions(session, server, owner)
+        settings = await get_user_settings(server, owner)
+        permissions_from_db = await get_all_permissions(server, owner)
 
-        voice_channel = owner.voice.channel if owner.voice is not None and \
-                                               owner.voice.channel.overwrites_for(owner) == OWNER_PERMISSIONS else None
+        voice_channel = get_own_room(owner)
 
         if voice_channel:
             permissions_from_voice = list(filter(
@@ -580,23 +585,11 @@ class Rooms(Cog, name="Приватные комнаты"):
         if settings.name is None and settings.user_limit == 0 and settings.bitrate == 64 and not settings.is_locked \
                 and (not len(permissions_from_db) and voice_channel is None or not len(permissions_from_voice) and
                      voice_channel is not None):
-            for i in permissions_from_db:
-                session.delete(i)
-            session.commit()
-            session.close()
+            await remove_permissions(server, owner)
             raise CommandError("Вы ещё не сделали каких-либо изменений для комнаты, чтобы сбрасывать его настройки")
         else:
-            settings.name = None
-            settings.user_limit = 0
-            settings.bitrate = 64
-            settings.is_locked = False
-            session.commit()
-            session.close()
-
-            for i in permissions_from_db:
-                session.delete(i)
-            session.commit()
-            session.close()
+            await edit_user_settings(server, owner, name=None, user_limit=0, bitrate=64, is_locked=False)
+            await remove_permissions(server, owner)
 
             if voice_channel:
                 await voice_channel.edit(name=owner.display_name, user_limit=0, bitrate=64000)
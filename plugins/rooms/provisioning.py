@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import discord
+from discord import PermissionOverwrite as Permissions
+
+from core.app import ROOM_POOL_SIZE
+from core.metrics import metrics
+from core.outbound import Priority, RequestDropped, request
+
+from plugins.rooms.registry import room_registry
+from plugins.rooms.utils import load_room_profile
+
+logger = logging.getLogger("ice_cube")
+
+# user's permissions for his room
+OWNER_PERMISSIONS = Permissions(manage_channels=True, connect=True, speak=True)
+
+# name of a pre-created room waiting for its owner
+POOL_ROOM_NAME = "Новая комната"
+
+
+class RoomProvisioner:
+    """
+    Creates rooms for users who joined the voice channel that creates rooms. User's settings are loaded while
+    Discord API requests are in flight, and if pool_size > 0, every server keeps a few pre-created hidden rooms
+    that are handed out at once and configured after the user is moved
+    """
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+
+        self._pools = {}  # server's ID -> list of IDs of pre-created rooms
+        self._creating = {}  # server's ID -> number of pre-created rooms that are being created
+
+    def adopt(self, channel: discord.VoiceChannel) -> bool:
+        """Put a pre-created room that exists after bot's start back to the pool"""
+        if self.pool_size == 0 or channel.name != POOL_ROOM_NAME or channel.members or channel.overwrites_for(
+                channel.guild.default_role).view_channel is not False:
+            return False
+
+        self._pools.setdefault(channel.guild.id, []).append(channel.id)
+
+        return True
+
+    def discard(self, channel: discord.abc.GuildChannel):
+        """Remove a deleted channel from the pool"""
+        pool = self._pools.get(channel.guild.id)
+
+        if pool is not None and channel.id in pool:
+            pool.remove(channel.id)
+
+    def forget_server(self, server: discord.Guild):
+        """Forget server's pool"""
+        self._pools.pop(server.id, None)
+
+    def _take(self, server: discord.Guild, category: discord.CategoryChannel) -> Optional[discord.VoiceChannel]:
+        pool = self._pools.get(server.id)
+
+        while pool:
+            room = server.get_channel(pool.pop())
+
+            if room is not None and room.category_id == category.id and not room.members:
+                return room
+
+        return None
+
+    def refill(self, server: discord.Guild, category: discord.CategoryChannel):
+        """Create missing pre-created rooms of the server in the background"""
+        missing = self.pool_size - len(self._pools.get(server.id, ())) - self._creating.get(server.id, 0)
+
+        for _ in range(missing):
+            self._creating[server.id] = self._creating.get(server.id, 0) + 1
+            asyncio.ensure_future(self._create_pooled(server, category))
+
+    async def _create_pooled(self, server: discord.Guild, category: discord.CategoryChannel):
+        overwrites = {
+            server.default_role: Permissions(view_channel=False, connect=False),
+            server.me: Permissions(view_channel=True, connect=True, manage_channels=True, move_members=True)
+        }
+
+        try:
+            room = await request(("guild", server.id), Priority.background, lambda: server.create_voice_channel(
+                name=POOL_ROOM_NAME, category=category, overwrites=overwrites
+            ))
+        except (RequestDropped, discord.HTTPException):
+            # the pool will be refilled when the next room is handed out
+            logger.debug(f"Не удалось заранее создать комнату на сервере {server.id}")
+        else:
+            self._pools.setdefault(server.id, []).append(room.id)
+        finally:
+            self._creating[server.id] -= 1
+
+    async def provision(self, user: discord.Member, category: discord.CategoryChannel) -> discord.VoiceChannel:
+        """Create or hand out a room for the user and move the user into it"""
+        server = user.guild
+        start = time.perf_counter()
+
+        # user's settings and permissions are loaded while the room is being requested
+        profile = asyncio.ensure_future(load_room_profile(server, user))
+        room = self._take(server, category)
+
+        try:
+            if room is not None:
+                room_registry.add(room, user)
+
+                # the user leaves the lobby at once, the room is configured after that
+                try:
+                    await request(("guild", server.id), Priority.room, lambda: user.move_to(room))
+                except Exception:
+                    room_registry.remove(room.id)
+                    self._pools.setdefault(server.id, []).append(room.id)
+                    raise
+
+                settings, permissions = await profile
+
+                await request(("channel", room.id), Priority.room, lambda: room.edit(
+                    overwrites=self._overwrites(user, settings, permissions), **self._options(user, settings)
+                ))
+
+                operation = "room_provision_pooled"
+            else:
+                # the room is created closed for everyone except its owner while the settings are being loaded,
+                # and is configured after the user is moved
+                created, loaded = await asyncio.gather(request(
+                    ("guild", server.id), Priority.room, lambda: server.create_voice_channel(
+                        name=user.display_name, category=category, overwrites={
+                            user: OWNER_PERMISSIONS, server.default_role: Permissions(connect=False)
+                        }
+                    )
+                ), profile, return_exceptions=True)
+
+                if isinstance(loaded, BaseException):
+                    if not isinstance(created, BaseException):
+                        await request(("channel", created.id), Priority.room, lambda: created.delete())
+
+                    raise loaded
+                elif isinstance(created, BaseException):
+                    raise created
+
+                room = created
+                settings, permissions = loaded
+
+                room_registry.add(room, user)
+
+                await request(("guild", server.id), Priority.room, lambda: user.move_to(room))
+                await request(("channel", room.id), Priority.room, lambda: room.edit(
+                    overwrites=self._overwrites(user, settings, permissions), **self._options(user, settings)
+                ))
+
+                operation = "room_provision_created"
+        finally:
+            if not profile.done():
+                profile.cancel()
+
+        metrics.observe_operation(operation, time.perf_counter() - start)
+
+        if self.pool_size:
+            self.refill(server, category)
+
+        return room
+
+    @staticmethod
+    def _options(user, settings):
+        return {
+            "name": settings.name if settings.name is not None else user.display_name,
+            "user_limit": settings.user_limit,
+            "bitrate": settings.bitrate * 1000
+        }
+
+    @staticmethod
+    def _overwrites(user, settings, permissions):
+        server = user.guild
+
+        overwrites = {
+            user: OWNER_PERMISSIONS,
+            server.default_role: Permissions(connect=not settings.is_locked)
+        }
+
+        # permissions of left users are deleted by Rooms.forget_left_user and Rooms.sweep_left_users
+        for perms in permissions:
+            member = server.get_member(perms.user)
+
+            if member is not None:
+                overwrites[member] = Permissions(connect=perms.permissions.value)
+
+        return overwrites
+
+
+room_provisioner = RoomProvisioner(ROOM_POOL_SIZE)
@@ -0,0 +1,40 @@
+from typing import Optional
+
+from discord import Guild, Member, VoiceChannel
+
+
+class RoomRegistry:
+    """Index of existing rooms: room's ID -> owner's ID and (server's ID, owner's ID) -> room's ID"""
+
+    def __init__(self):
+        self._owners = {}
+        self._rooms = {}
+
+    def add(self, room: VoiceChannel, owner: Member):
+        """Register a created room"""
+        self._owners[room.id] = (room.guild.id, owner.id)
+        self._rooms[(room.guild.id, owner.id)] = room.id
+
+    def remove(self, room_id: int):
+        """Unregister a deleted room"""
+        key = self._owners.pop(room_id, None)
+
+        if key is not None and self._rooms.get(key) == room_id:
+            del self._rooms[key]
+
+    def get_owner_id(self, room_id: int) -> Optional[int]:
+        """Returns ID of room's owner or None if the channel isn't a room"""
+        key = self._owners.get(room_id)
+        return key[1] if key is not None else None
+
+    def get_room_id(self, server: Guild, owner: Member) -> Optional[int]:
+        """Returns ID of user's room or None if the user doesn't have a room"""
+        return self._rooms.get((server.id, owner.id))
+
+    def forget_server(self, server: Guild):
+        """Unregister all rooms of the server"""
+        for room_id in [r for r, (s, _) in self._owners.items() if s == server.id]:
+            self.remove(room_id)
+
+
+room_registry = RoomRegistry()
@@ -2,11 +2,14 @@ import asyncio
 from discord.ext import commands
 from discord.ext.commands import CommandError
 
-from main import Session
 from core.database import ServerSettingsOfRooms
 from core.commands import Cog, Command
+from core.storage import run
+from core.purge import get_purger
 from core.templates import SuccessfulMessage, ErrorMessage, DefaultEmbed as Embed
 
+from plugins.rooms.utils import get_rooms_system, cache_rooms_system, remove_server_settings
+
 
 class RoomsSettings(Cog, name="Настройки"):
     @commands.group(name="setrooms", invoke_without_command=True)
@@ -18,18 +21,16 @@ class RoomsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        settings = session.query(ServerSettingsOfRooms).filter_by(server_id=str(server.id)).first()
+        rooms_system = await get_rooms_system(server)
 
-        if settings is None:
+        if rooms_system is None:
             embed = Embed(
                 title="Приватные комнаты",
                 description=f"На данный момент на этом сервере нет приватных комнат. Чтобы их включить, используйте "
                             f"команду `{ctx.prefix}setrooms enable`"
             )
         else:
-            voice = server.get_channel(int(settings.channel_id_creates_rooms))
-            category = voice.category
+            category = server.get_channel(rooms_system.category_id)
 
             embed = Embed(
                 title="Приватные комнаты",
@@ -41,8 +42,6 @@ class RoomsSettings(Cog, name="Настройки"):
 
         await ctx.send(embed=embed)
 
-        session.close()
-
     @rooms_settings.command(cls=Command, name="enable")
     @commands.has_permissions(administrator=True)
     async def create_rooms_system(self, ctx):
@@ -52,26 +51,24 @@ class RoomsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        settings = session.query(ServerSettingsOfRooms).filter_by(server_id=str(server.id)).first()
+        rooms_system = await get_rooms_system(server)
 
-        if settings is not None:
-            session.close()
+        if rooms_system is not None:
             raise CommandError("У вас уже есть приватные комнаты")
+        elif get_purger().progress(server.id, "rooms") is not None:
+            raise CommandError("Настройки прошлых приватных комнат ещё удаляются. Попробуйте включить их позже")
         else:
             message = SuccessfulMessage("Я успешно включил систему приватных комнат")
 
             category = await server.create_category_channel(name="Приватные комнаты")
             voice = await server.create_voice_channel(name="Создать комнату", category=category)
 
-            settings = ServerSettingsOfRooms(server_id=str(server.id), channel_id_creates_rooms=str(voice.id))
-            session.add(settings)
+            settings = ServerSettingsOfRooms(server_id=server.id, channel_id_creates_rooms=voice.id)
+            await run(lambda session: session.add(settings))
+            cache_rooms_system(server, voice)
 
         await ctx.send(embed=message)
 
-        session.commit()
-        session.close()
-
     @rooms_settings.command(cls=Command, name="disable")
     @commands.has_permissions(administrator=True)
     async def remove_rooms_system(self, ctx):
@@ -81,11 +78,9 @@ class RoomsSettings(Cog, name="Настройки"):
 
         server = ctx.guild
 
-        session = Session()
-        settings = session.query(ServerSettingsOfRooms).filter_by(server_id=str(server.id)).first()
+        rooms_system = await get_rooms_system(server)
 
-        if settings is None:
-            session.close()
+        if rooms_system is None:
             raise CommandError("На вашем сервере не поставлены приватные комнаты")
         else:
             emojis = {
@@ -93,8 +88,7 @@ class RoomsSettings(Cog, name="Настройки"):
                 "cancel": "🚫"
             }
 
-            voice = server.get_channel(int(settings.channel_id_creates_rooms))
-            category = voice.category
+            category = server.get_channel(rooms_system.category_id)
 
             embed = Embed(
                 title="Выключение приватных комнат",
@@ -122,8 +116,7 @@ class RoomsSettings(Cog, name="Настройки"):
                 if str(reaction) == emojis["accept"]:
                     embed = SuccessfulMessage("Я успешно выключил и удалил систему приватных комнат")
 
-                    voice = server.get_channel(int(settings.channel_id_creates_rooms))
-                    category = voice.category
+                    category = server.get_channel(rooms_system.category_id)
 
                     if len(category.voice_channels) != 0:
                         for channel in category.voice_channels:
@@ -131,7 +124,8 @@ class RoomsSettings(Cog, name="Настройки"):
 
                     await category.delete()
 
-                    session.delete(settings)
+                    await remove_server_settings(server)
+                    await get_purger().purge(server.id, "rooms")
                 else:
                     embed=Embed(
                         title=":x: Отменено",
@@ -141,6 +135,3 @@ class RoomsSettings(Cog, name="Настройки"):
 
                 await message.edit(embed=embed)
                 await message.clear_reactions()
-
-        session.commit()
-        session.close()
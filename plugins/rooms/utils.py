@@ -1,48 +1,149 @@
-from typing import Union, Any, List
+from collections import namedtuple
+from typing import Union, Any, List, Optional, Set, Iterable, Tuple
 
-from discord import Guild, Member, User
+from discord import Guild, Member, User, VoiceChannel
+from sqlalchemy import and_
 
 from core.database import ServerSettingsOfRooms, UserSettingsOfRoom, UserPermissionsOfRoom
+from core.metrics import metrics
+from core.storage import run
 from core.templates import PermissionsForRoom
-from main import Session
 
+# IDs of a voice channel that creates rooms and a category that contains rooms
+RoomsSystem = namedtuple("RoomsSystem", ["creator_id", "category_id"])
 
-def get_server_settings(session: Session, server: Guild) -> ServerSettingsOfRooms:
+# cache of rooms systems: server's ID -> RoomsSystem or None if the server doesn't have rooms
+_rooms_systems = {}
+
+
+async def get_server_settings(server: Guild) -> ServerSettingsOfRooms:
     """Request to database to get server's settings"""
-    return session.query(ServerSettingsOfRooms).filter_by(server_id=str(server.id)).first()
+    return await run(lambda session: session.query(ServerSettingsOfRooms).filter_by(server_id=server.id).first())
+
+
+async def remove_server_settings(server: Guild):
+    """Request to database to remove server's settings"""
+    _rooms_systems[server.id] = None
+    await run(lambda session: session.query(ServerSettingsOfRooms).filter_by(server_id=server.id).delete())
+
+
+async def get_rooms_system(server: Guild) -> Optional[RoomsSystem]:
+    """Get server's rooms system from cache, it's loaded from database on first call"""
+    metrics.count_cache("rooms_system", hit=server.id in _rooms_systems)
+
+    if server.id not in _rooms_systems:
+        settings = await get_server_settings(server)
+
+        if settings is None:
+            _rooms_systems.setdefault(server.id, None)
+        else:
+            creator = server.get_channel(settings.creator)
 
+            # if the voice channel doesn't exist or it doesn't have category, delete server's settings from database
+            if creator is None or creator.category is None:
+                await remove_server_settings(server)
+            else:
+                cache_rooms_system(server, creator)
 
-def get_user_settings(session: Session, server: Guild,
-                      user: Union[User, Member]) -> UserSettingsOfRoom:
+    return _rooms_systems[server.id]
+
+
+def cache_rooms_system(server: Guild, creator: VoiceChannel):
+    """Put server's rooms system to cache"""
+    _rooms_systems[server.id] = RoomsSystem(creator_id=creator.id, category_id=creator.category_id)
+
+
+def forget_rooms_system(server: Guild):
+    """Remove server's rooms system from cache"""
+    _rooms_systems.pop(server.id, None)
+
+
+async def get_user_settings(server: Guild, user: Union[User, Member]) -> UserSettingsOfRoom:
     """Request to database to get user's settings of room"""
-    return session.query(UserSettingsOfRoom).filter_by(server_id=str(server.id), owner_id=str(user.id)).first()
+    return await run(lambda session: session.query(UserSettingsOfRoom).filter_by(
+        server_id=server.id, owner_id=user.id
+    ).first())
+
+
+async def load_room_profile(server: Guild, user: Union[User, Member]) \
+        -> Tuple[UserSettingsOfRoom, List[UserPermissionsOfRoom]]:
+    """Request to database to get user's settings of room (created if they don't exist) with room's permissions"""
+    def load(session):
+        rows = session.query(UserSettingsOfRoom, UserPermissionsOfRoom).outerjoin(UserPermissionsOfRoom, and_(
+            UserPermissionsOfRoom.server_id == UserSettingsOfRoom.server_id,
+            UserPermissionsOfRoom.owner_id == UserSettingsOfRoom.owner_id
+        )).filter(UserSettingsOfRoom.server_id == server.id, UserSettingsOfRoom.owner_id == user.id).all()
 
+        if rows:
+            return rows[0][0], [perms for _, perms in rows if perms is not None]
 
-def add_user_settings(session: Session, server: Guild, user: Union[User, Member],
-                      **kwargs: Any) -> UserSettingsOfRoom:
-    """Request to database to add user's settings of room"""
-    user = UserSettingsOfRoom(server_id=str(server.id), owner_id=str(user.id), **kwargs)
-    session.add(user)
-    return user
+        settings = UserSettingsOfRoom(server_id=server.id, owner_id=user.id)
+        session.add(settings)
+        session.flush()
 
+        permissions = session.query(UserPermissionsOfRoom).filter_by(server_id=server.id, owner_id=user.id).all()
 
-def get_all_permissions(session: Session, server: Guild, user: Union[User, Member])\
-        -> List[UserPermissionsOfRoom]:
+        return settings, permissions
+
+    return await run(load)
+
+
+async def edit_user_settings(server: Guild, user: Union[User, Member], **values: Any):
+    """Request to database to change user's settings of room"""
+    await run(lambda session: session.query(UserSettingsOfRoom).filter_by(
+        server_id=server.id, owner_id=user.id
+    ).update(values))
+
+
+async def get_all_permissions(server: Guild, user: Union[User, Member]) -> List[UserPermissionsOfRoom]:
     """Request to database to get list of room's permissions of certain user"""
-    return session.query(UserPermissionsOfRoom).filter_by(server_id=str(server.id), owner_id=str(user.id)).all()
+    return await run(lambda session: session.query(UserPermissionsOfRoom).filter_by(
+        server_id=server.id, owner_id=user.id
+    ).all())
 
 
-def get_permissions(session: Session, server: Guild, owner: Union[User, Member], user: Union[User, Member])\
+async def get_permissions(server: Guild, owner: Union[User, Member], user: Union[User, Member])\
         -> UserPermissionsOfRoom:
     """Request to database to get room's permissions for certain user"""
-    return session.query(UserPermissionsOfRoom).filter_by(
-        server_id=str(server.id), owner_id=str(owner.id), user_id=str(user.id)
-    ).first()
+    return await run(lambda session: session.query(UserPermissionsOfRoom).filter_by(
+        server_id=server.id, owner_id=owner.id, user_id=user.id
+    ).first())
+
+
+async def set_permissions(server: Guild, owner: Union[User, Member], user: Union[User, Member],
+                          permission: PermissionsForRoom):
+    """Request to database to add or change room's permissions for certain user"""
+    await run(lambda session: session.merge(UserPermissionsOfRoom(
+        server_id=server.id, owner_id=owner.id, user_id=user.id, permissions=permission
+    )))
+
+
+async def remove_permissions(server: Guild, owner: Union[User, Member], *users: Union[User, Member, int]):
+    """Request to database to remove room's permissions for certain users (for all users if no users passed)"""
+    def remove(session):
+        query = session.query(UserPermissionsOfRoom).filter_by(server_id=server.id, owner_id=owner.id)
+
+        if users:
+            ids = [u if isinstance(u, int) else u.id for u in users]
+            query = query.filter(UserPermissionsOfRoom.user_id.in_(ids))
+
+        query.delete(synchronize_session=False)
+
+    await run(remove)
+
+
+async def get_users_with_permissions(server: Guild) -> Set[int]:
+    """Request to database to get IDs of all users who have room's permissions on the server"""
+    return await run(lambda session: {user_id for user_id, in session.query(UserPermissionsOfRoom.user_id).filter_by(
+        server_id=server.id
+    ).distinct()})
+
 
+async def remove_permissions_of_users(server: Guild, user_ids: Iterable[int]):
+    """Request to database to remove room's permissions of certain users in all rooms of the server"""
+    user_ids = list(user_ids)
 
-def add_permissions(session: Session, server: Guild, owner: Union[User, Member], user: Union[User, Member],
-                    permission: PermissionsForRoom):
-    """Request to database to add room's permissions for certain user"""
-    session.add(UserPermissionsOfRoom(
-        server_id=str(server.id), owner_id=str(owner.id), user_id=str(user.id), permissions=permission
-    ))
+    await run(lambda session: session.query(UserPermissionsOfRoom).filter(
+        UserPermissionsOfRoom.server_id == server.id,
+        UserPermissionsOfRoom.user_id.in_(user_ids)
+    ).delete(synchronize_session=False))
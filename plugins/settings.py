@@ -1,9 +1,11 @@
 from discord.ext import commands
 from discord.ext.commands import CommandError
 
-from main import Session, DEFAULT_PREFIX
+from core.app import DEFAULT_PREFIX
 from core.commands import Cog, Command
 from core.database import Server
+from core.prefixes import get_cached_prefix, set_cached_prefix
+from core.storage import run
 from core.templates import SuccessfulMessage
 
 
@@ -20,48 +22,31 @@ class Settings(Cog, name="Настройки"):
         """
 
         server = ctx.guild
-
-        session = Session()
-
-        db_kwargs = {
-            "server_id": str(server.id)
-        }
-
-        server_from_db = session.query(Server).filter_by(**db_kwargs).first()
-
-        if server_from_db is None:
-            server_from_db = Server(**db_kwargs)
-            session.add(server_from_db)
-
-        last_prefix = server_from_db.prefix if server_from_db.prefix is not None else DEFAULT_PREFIX
+        last_prefix = get_cached_prefix(server.id, DEFAULT_PREFIX)
 
         if prefix is not None:
             if len(prefix) > 32:
-                session.close()
                 raise CommandError("Я не могу поставить префикс, который больше 32 символов")
             elif prefix == last_prefix:
-                session.close()
                 raise CommandError("Вы уже используете данный префикс")
 
             if prefix == DEFAULT_PREFIX:
-                server_from_db.prefix = None
+                new_prefix = None
                 message = SuccessfulMessage("Я успешно сбросил префикс на стандартный")
             else:
-                server_from_db.prefix = prefix
+                new_prefix = prefix
                 message = SuccessfulMessage("Я успешно изменил префикс")
         else:
             if last_prefix == DEFAULT_PREFIX:
-                session.close()
                 raise CommandError("Вы не ввели префикс")
             else:
-                server_from_db.prefix = None
-
+                new_prefix = None
                 message = SuccessfulMessage("Я успешно сбросил префикс на стандартный")
 
-        await ctx.send(embed=message)
+        await run(lambda session: session.merge(Server(server_id=server.id, prefix=new_prefix)))
+        set_cached_prefix(server.id, new_prefix)
 
-        session.commit()
-        session.close()
+        await ctx.send(embed=message)
 
 
 def setup(bot):
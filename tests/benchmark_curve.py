@@ -0,0 +1,28 @@
+"""
+Сравнение скорости вычисления уровня по таблице порогов и прежнего вычисления через cmath
+
+Запуск: python tests/benchmark_curve.py
+"""
+
+import random
+import timeit
+
+from test_curve import curve, formula_level
+
+NUMBER = 200000  # вычислений на каждый вариант
+
+
+def main():
+    random.seed(0)
+    experiences = [random.randint(0, curve.THRESHOLDS[-1]) for _ in range(NUMBER)]
+
+    for name, function in (("cmath", formula_level), ("table", curve.get_level)):
+        duration = timeit.timeit(lambda: [function(exp) for exp in experiences], number=1)
+        print(f"{name}: {duration / NUMBER * 1e9:.0f} нс на вызов")
+
+    duration = timeit.timeit(lambda: curve.get_levels(experiences), number=1)
+    print(f"get_levels: {duration / NUMBER * 1e9:.0f} нс на значение")
+
+
+if __name__ == "__main__":
+    main()
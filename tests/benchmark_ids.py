@@ -0,0 +1,88 @@
+"""
+Сравнение размера индексов и скорости поиска по ID Discord, хранимым как VARCHAR(32) (до миграции b93e2d7f4c18) и
+как BIGINT. Таблицы повторяют users_level и создаются в отдельной схеме, которая удаляется после замера
+
+Запуск: DATABASE_URL=postgresql://... python tests/benchmark_ids.py
+"""
+
+import os
+import random
+import sys
+import time
+
+SCHEMA = "ice_cube_ids_benchmark"  # отдельная схема, чтобы не трогать данные бота
+
+SERVERS = 100
+USERS_PER_SERVER = 2000
+LOOKUPS = 5000  # запросов на каждый вариант
+
+# тип столбцов -> преобразование ID в значение параметра
+VARIANTS = {
+    "VARCHAR(32)": str,
+    "BIGINT": int
+}
+
+
+def snowflake(index):
+    # ID Discord - 18-значные числа
+    return 700000000000000000 + index * 4194304
+
+
+def main():
+    url = os.environ.get("DATABASE_URL")
+
+    if not url:
+        sys.exit("DATABASE_URL не задан")
+
+    import sqlalchemy
+
+    engine = sqlalchemy.create_engine(url)
+
+    with engine.connect() as connection:
+        connection.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        connection.execute(f"CREATE SCHEMA {SCHEMA}")
+        connection.execute(f"SET search_path TO {SCHEMA}")
+
+        try:
+            random.seed(0)
+
+            rows = [
+                (snowflake(server), snowflake(SERVERS + user), random.randint(0, 10 ** 6))
+                for server in range(SERVERS) for user in range(USERS_PER_SERVER)
+            ]
+            keys = random.sample([(server_id, user_id) for server_id, user_id, _ in rows], LOOKUPS)
+
+            for number, (type_, convert) in enumerate(VARIANTS.items()):
+                table = f"users_level_{number}"
+
+                connection.execute(
+                    f"CREATE TABLE {table} (server_id {type_}, user_id {type_}, experience INTEGER NOT NULL, "
+                    f"PRIMARY KEY (server_id, user_id))"
+                )
+                connection.execute(
+                    sqlalchemy.text(f"INSERT INTO {table} VALUES (:server_id, :user_id, :experience)"),
+                    [{"server_id": convert(s), "user_id": convert(u), "experience": e} for s, u, e in rows]
+                )
+                connection.execute(f"ANALYZE {table}")
+
+                size = connection.execute(f"SELECT pg_relation_size('{table}_pkey')").scalar()
+
+                statement = sqlalchemy.text(
+                    f"SELECT experience FROM {table} WHERE server_id = :server_id AND user_id = :user_id"
+                )
+                start = time.perf_counter()
+
+                for server_id, user_id in keys:
+                    connection.execute(statement, server_id=convert(server_id), user_id=convert(user_id)).scalar()
+
+                duration = time.perf_counter() - start
+
+                print(f"{type_}: индекс {size / 1024 / 1024:.1f} МБ, поиск {duration / LOOKUPS * 1e6:.0f} мкс")
+        finally:
+            connection.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import cmath
+import importlib.util
+import os
+
+import pytest
+
+# модуль загружается по пути, чтобы не импортировать весь плагин вместе с discord и подключением к базе данных
+_spec = importlib.util.spec_from_file_location(
+    "curve", os.path.join(os.path.dirname(__file__), os.pardir, "plugins", "levels", "curve.py")
+)
+curve = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(curve)
+
+
+def formula_level(exp):
+    """Прежнее вычисление уровня через корень квадратного уравнения 80x^2 + 20x - exp = 0"""
+
+    d = 20 ** 2 + 4 * 80 * exp
+    x = ((-20 + cmath.sqrt(d)) / (2 * 80)).real
+
+    return 0 if x < 0 else int(x)
+
+
+def formula_experience(level):
+    """Прежнее вычисление опыта, необходимого для уровня"""
+
+    return 0 if level <= 0 else 80 * level ** 2 + 20 * level
+
+
+def test_get_level_matches_formula_near_every_threshold():
+    for level in range(curve.MAX_LEVEL + 50):
+        threshold = formula_experience(level)
+
+        for exp in range(threshold - 3, threshold + 4):
+            assert curve.get_level(exp) == formula_level(exp), exp
+
+
+def test_get_level_matches_formula_over_range():
+    for exp in range(-100, curve.THRESHOLDS[-1] + 50000, 97):
+        assert curve.get_level(exp) == formula_level(exp), exp
+
+
+@pytest.mark.parametrize("level", [1, 2, 10, 999, 1000, 1001, 5000, 10 ** 6])
+def test_get_level_at_thresholds(level):
+    threshold = formula_experience(level)
+
+    assert curve.get_level(threshold - 1) == level - 1
+    assert curve.get_level(threshold) == level
+    assert curve.get_level(threshold + 1) == level
+
+
+@pytest.mark.parametrize("level", [-5, 0, 1, 50, 1000, 1001, 10 ** 6])
+def test_get_experience_matches_formula(level):
+    assert curve.get_experience(level) == formula_experience(level)
+
+
+def test_get_levels_matches_get_level():
+    experiences = [0, 99, 100, 12345, curve.THRESHOLDS[-1], curve.THRESHOLDS[-1] + 1, 10 ** 12]
+
+    assert curve.get_levels(experiences) == [formula_level(exp) for exp in experiences]
+    assert curve.get_levels(iter(experiences)) == [curve.get_level(exp) for exp in experiences]
@@ -0,0 +1,115 @@
+import os
+import random
+
+import pytest
+
+# тесты выполняются только с настоящей базой данных PostgreSQL
+pytestmark = pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="DATABASE_URL не задан")
+
+SCHEMA = "ice_cube_index_test"  # отдельная схема, чтобы не трогать данные бота
+
+SERVERS = 20
+USERS_PER_SERVER = 2000
+
+
+@pytest.fixture(scope="module")
+def session():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    from sqlalchemy.orm import Session
+
+    from core.database import Base, UserLevel, UserScoreToAnotherUser, ServerAwardOfLevels
+
+    engine = sqlalchemy.create_engine(os.environ["DATABASE_URL"])
+    connection = engine.connect()
+
+    connection.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    connection.execute(f"CREATE SCHEMA {SCHEMA}")
+    connection.execute(f"SET search_path TO {SCHEMA}")
+
+    Base.metadata.create_all(bind=connection)
+
+    random.seed(0)
+
+    connection.execute(UserLevel.__table__.insert(), [
+        {"server_id": server_id, "user_id": user_id, "experience": random.randint(0, 10 ** 6)}
+        for server_id in range(SERVERS) for user_id in range(USERS_PER_SERVER)
+    ])
+    connection.execute(UserScoreToAnotherUser.__table__.insert(), [
+        {"user_id": user_id, "rated_user_id": user_id % 500, "score": user_id % 3 != 0}
+        for user_id in range(SERVERS * USERS_PER_SERVER)
+    ])
+    connection.execute(ServerAwardOfLevels.__table__.insert(), [
+        {"server_id": server_id, "role_id": server_id * 1000 + level, "level": level}
+        for server_id in range(SERVERS * 100) for level in range(1, 11)
+    ])
+    connection.execute("ANALYZE")
+
+    yield Session(bind=connection)
+
+    connection.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    connection.close()
+    engine.dispose()
+
+
+def explain(session, query):
+    from sqlalchemy.dialects import postgresql
+
+    statement = query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+
+    return "\n".join(row[0] for row in session.execute(f"EXPLAIN {statement}"))
+
+
+def assert_index_scan(plan, index):
+    assert any(
+        ("Index Scan" in line or "Index Only Scan" in line) and index in line for line in plan.splitlines()
+    ), plan
+
+
+def test_top_uses_experience_index(session):
+    import sqlalchemy
+    from core.database import UserLevel
+
+    # тот же запрос, что get_leaders в plugins/levels/plugin.py
+    query = session.query(UserLevel.user_id, UserLevel.experience).filter_by(
+        server_id=3
+    ).order_by(sqlalchemy.desc(UserLevel.experience), UserLevel.user_id).offset(20).limit(16)
+
+    assert_index_scan(explain(session, query), "ix_users_level_server_id_experience")
+
+
+def test_rank_uses_experience_index(session):
+    import sqlalchemy
+    from core.database import UserLevel
+
+    # тот же запрос, что get_position в plugins/levels/plugin.py
+    query = session.query(sqlalchemy.func.count()).select_from(UserLevel).filter(
+        UserLevel.server_id == 3,
+        UserLevel.experience > 900000
+    )
+
+    assert_index_scan(explain(session, query), "ix_users_level_server_id_experience")
+
+
+def test_reputation_count_uses_score_index(session):
+    import sqlalchemy
+    from core.database import UserScoreToAnotherUser
+
+    # тот же запрос, что подсчёт репутации в профиле (plugins/information.py)
+    query = session.query(sqlalchemy.func.count()).select_from(UserScoreToAnotherUser).filter_by(
+        rated_user_id=42, score=True
+    )
+
+    assert_index_scan(explain(session, query), "ix_users_score_to_another_users_rated_user_id_score")
+
+
+def test_award_lookup_uses_level_index(session):
+    from core.database import ServerAwardOfLevels
+
+    # тот же запрос, что поиск наград при изменении уровня командой editlevel
+    query = session.query(ServerAwardOfLevels).filter(
+        ServerAwardOfLevels.server_id == 7,
+        ServerAwardOfLevels.level < 8,
+        ServerAwardOfLevels.level > 3
+    )
+
+    assert_index_scan(explain(session, query), "ix_servers_awards_of_levels_server_id_level")
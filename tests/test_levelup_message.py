@@ -0,0 +1,74 @@
+import importlib.util
+import os
+from string import Template
+from types import SimpleNamespace
+
+import pytest
+
+# модуль загружается по пути, чтобы не импортировать весь плагин вместе с discord и подключением к базе данных
+_spec = importlib.util.spec_from_file_location(
+    "message", os.path.join(os.path.dirname(__file__), os.pardir, "plugins", "levels", "message.py")
+)
+message = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(message)
+
+CTX = SimpleNamespace(
+    author=SimpleNamespace(display_name="Кубик", mention="<@123>"),
+    guild=SimpleNamespace(name="Ice Cube")
+)
+LEVEL = 7
+
+
+def safe_substitute(text):
+    """Прежнее форматирование сообщения через string.Template"""
+
+    return Template(text).safe_substitute(
+        member_name=CTX.author.display_name,
+        member_mention=CTX.author.mention,
+        server_name=CTX.guild.name,
+        level=LEVEL
+    )
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "Без ключевых слов",
+    message.DEFAULT_LEVELUP_MESSAGE_FOR_SERVER,
+    message.DEFAULT_LEVELUP_MESSAGE_FOR_DM,
+    "$member_name$level${level}",
+    "${member_mention} и $member_name на ${server_name}: $level",
+    "Цена: $$5, $$$level, $$${level}",
+    "Доллар в конце $",
+    "$ 5 и $1 и $-",
+])
+def test_render_matches_safe_substitute(text):
+    assert message.LevelupMessage(text).render(CTX, LEVEL) == safe_substitute(text)
+
+
+@pytest.mark.parametrize("text", ["$unknown", "${unknown}", "Уровень $level, $levels", "$Level"])
+def test_strict_rejects_unknown_placeholders(text):
+    with pytest.raises(message.LevelupMessageError):
+        message.LevelupMessage(text)
+
+
+@pytest.mark.parametrize("text", ["$unknown", "${unknown} $level", "$$unknown $levels"])
+def test_not_strict_keeps_unknown_placeholders(text):
+    assert message.LevelupMessage(text, strict=False).render(CTX, LEVEL) == safe_substitute(text)
+
+
+def test_escaped_dollar():
+    assert message.LevelupMessage("$$level").render(CTX, LEVEL) == "$level"
+    assert message.LevelupMessage("$$$$").render(CTX, LEVEL) == "$$"
+
+
+@pytest.mark.parametrize("text, expected", [("$", "$"), ("a $ b", "a $ b"), ("$1", "$1"), ("${", "${")])
+def test_bare_or_invalid_dollar_is_kept(text, expected):
+    assert message.LevelupMessage(text).render(CTX, LEVEL) == expected
+
+
+def test_only_used_placeholders_are_computed():
+    template = message.LevelupMessage("Уровень $level")
+
+    assert template.placeholders == frozenset({"level"})
+    # ctx без автора и сервера: значения других ключевых слов не вычисляются
+    assert template.render(SimpleNamespace(), LEVEL) == "Уровень 7"